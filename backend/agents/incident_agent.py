@@ -0,0 +1,150 @@
+# incident_agent.py: per-user incident state machine (coalesces repeated alerts)
+#
+#   idle --NOTIFY--> notified --AUTO_SOS/SOS--> escalated
+#     ^                 |                          |
+#     +---- resolved <--+--------------------------+   (quiet period or "I'm safe")
+#
+# Transitions only go up while an incident is open. Repeated triggers at the same
+# or a lower level are folded into the open incident (count/evidence updated in
+# place) and re-notify at most once per INCIDENT_REMIND_S. SOS always goes through.
+# All state-machine clocks are server time: fixes can carry a client ts (or be
+# replayed from /loc/batch hours later), which is kept only on the alerts row.
+import os, time, threading
+from collections import namedtuple
+from utils.storage import get_conn
+
+INCIDENT_REMIND_S  = int(os.getenv("INCIDENT_REMIND_S", "900"))   # re-notify an unchanged incident
+INCIDENT_RESOLVE_S = int(os.getenv("INCIDENT_RESOLVE_S", "600"))  # quiet time before auto-resolve
+INCIDENT_FLUSH_S   = int(os.getenv("INCIDENT_FLUSH_S", "60"))     # max staleness of coalesced counts on disk
+
+LEVELS = {"notified": 1, "escalated": 2}
+ACTION_LEVEL = {"NOTIFY": "notified", "AUTO_SOS": "escalated", "SOS": "escalated"}
+
+# transition: opened | escalated | coalesced | reminded | forced
+Decision = namedtuple("Decision", "incident_id state transition notify")
+
+class IncidentManager:
+    def __init__(self, db=get_conn, remind_s=INCIDENT_REMIND_S, resolve_s=INCIDENT_RESOLVE_S,
+                 flush_s=INCIDENT_FLUSH_S, clock=time.time):
+        self.db = db
+        self.clock = clock
+        self.remind_s = remind_s
+        self.resolve_s = resolve_s
+        self.flush_s = flush_s
+        self._open = {}                   # user -> incident dict (absent = not loaded, None = idle)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _user_lock(self, user):
+        with self._lock:
+            lk = self._locks.get(user)
+            if lk is None:
+                lk = self._locks[user] = threading.Lock()
+            return lk
+
+    def _load(self, user):
+        if user in self._open:
+            return self._open[user]
+        with self.db() as conn:
+            row = conn.execute(
+                "SELECT id, state, opened_at, updated_at, last_notified_at, trigger_count, reason, evidence "
+                "FROM incidents WHERE user=? AND state!='resolved' ORDER BY id DESC LIMIT 1", (user,)).fetchone()
+        inc = None
+        if row:
+            inc = dict(zip(("id", "state", "opened_at", "updated_at", "last_notified_at",
+                            "trigger_count", "reason", "evidence"), row))
+            inc["flushed_at"] = inc["updated_at"]
+        self._open[user] = inc
+        return inc
+
+    # ---------------- transitions ----------------
+    def trigger(self, user, action, alert_type, summary, reason="", evidence="", ts=None, force=False,
+                lat=None, lon=None):
+        """
+        Feed one NOTIFY / AUTO_SOS / SOS event. Writes an alerts row only when the
+        incident opens or escalates (always when force=True) and returns a Decision;
+        the caller sends a notification iff decision.notify. `ts` is the event's own
+        time and is only recorded on the alerts row; timing uses the server clock.
+        """
+        now = int(self.clock())
+        ts = now if ts is None else int(ts)
+        level = ACTION_LEVEL[action]
+        with self._user_lock(user):
+            inc = self._load(user)
+            if inc is None:
+                transition = "opened"
+            elif force:
+                transition = "forced"
+            elif LEVELS[level] > LEVELS[inc["state"]]:
+                transition = "escalated"
+            elif now - (inc["last_notified_at"] or 0) >= self.remind_s:
+                transition = "reminded"
+            else:
+                transition = "coalesced"
+
+            if transition == "coalesced":
+                inc["trigger_count"] += 1
+                inc["updated_at"] = now
+                inc["evidence"] = evidence or inc["evidence"]
+                if now - inc["flushed_at"] >= self.flush_s:
+                    with self.db() as conn:
+                        self._write_progress(conn, inc)
+                return Decision(inc["id"], inc["state"], transition, False)
+
+            with self.db() as conn:
+                if inc is None:
+                    cur = conn.execute(
+                        "INSERT INTO incidents(user, state, opened_at, updated_at, last_notified_at, "
+                        "trigger_count, reason, evidence) VALUES(?,?,?,?,?,?,?,?)",
+                        (user, level, now, now, now, 1, reason, evidence))
+                    inc = self._open[user] = {"id": cur.lastrowid, "state": level, "opened_at": now,
+                                              "updated_at": now, "last_notified_at": now, "trigger_count": 1,
+                                              "reason": reason, "evidence": evidence, "flushed_at": now}
+                else:
+                    if LEVELS[level] > LEVELS[inc["state"]]:
+                        inc["state"], inc["reason"] = level, reason
+                    inc["trigger_count"] += 1
+                    inc["updated_at"] = inc["last_notified_at"] = now
+                    inc["evidence"] = evidence or inc["evidence"]
+                    self._write_progress(conn, inc)
+                if transition != "reminded":
+                    conn.execute(
+                        "INSERT INTO alerts(user, ts, type, summary, reason, evidence, incident_id, lat, lon) "
+                        "VALUES(?,?,?,?,?,?,?,?,?)",
+                        (user, ts, alert_type, summary, reason, evidence, inc["id"], lat, lon))
+            return Decision(inc["id"], inc["state"], transition, True)
+
+    def _write_progress(self, conn, inc):
+        conn.execute("UPDATE incidents SET state=?, updated_at=?, last_notified_at=?, trigger_count=?, "
+                     "reason=?, evidence=? WHERE id=?",
+                     (inc["state"], inc["updated_at"], inc["last_notified_at"], inc["trigger_count"],
+                      inc["reason"], inc["evidence"], inc["id"]))
+        inc["flushed_at"] = inc["updated_at"]
+
+    def resolve(self, user, reason="manual"):
+        """Close the open incident (if any); returns its id or None."""
+        now = int(self.clock())
+        with self._user_lock(user):
+            inc = self._load(user)
+            if inc is None:
+                return None
+            with self.db() as conn:
+                self._write_progress(conn, inc)
+                conn.execute("UPDATE incidents SET state='resolved', resolved_at=?, resolved_reason=? WHERE id=?",
+                             (now, reason, inc["id"]))
+            self._open[user] = None
+            return inc["id"]
+
+    def settle(self, user):
+        """All-clear from an agent: resolve once nothing has re-triggered for resolve_s (server time)."""
+        inc = self._open.get(user, False)
+        if inc is False:
+            inc = self._load(user)
+        if inc is not None and self.clock() - inc["updated_at"] >= self.resolve_s:
+            return self.resolve(user, reason="quiet")
+        return None
+
+    def current(self, user):
+        with self._user_lock(user):
+            inc = self._load(user)
+            return None if inc is None else {k: v for k, v in inc.items() if k != "flushed_at"}
@@ -1,6 +1,12 @@
 # backend/agents/location_risk_agent.py
-import time, requests
+import os, time, requests
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from utils.poi_cache import PoiCache
+from utils.poi_index import PoiIndex
+from utils.storage import get_conn
+from utils.metrics import span, FAILURES, REGISTRY
 
 # Tunable thresholds
 VOICE_THR = 0.60     # if voice_prob >= this, count as distress
@@ -8,32 +14,45 @@ STAT_THR  = 180      # seconds stationary to consider "stuck"
 POI_THR   = 3        # <= this many POIs in radius -> considered isolated
 POI_RADIUS_M = 200   # check POIs in this radius (meters)
 
-# Overpass query helper (returns count of nearby amenity nodes)
-def poi_density(lat, lon, radius_m=POI_RADIUS_M, timeout=5):
+# POI sources: local index first (tools/build_poi_index.py), Overpass only as a fallback
+POI_INDEX_DIR = os.getenv("POI_INDEX_DIR",
+                          os.path.join(os.path.dirname(__file__), "..", "data", "poi_index"))
+POI_OVERPASS_FALLBACK = os.getenv("POI_OVERPASS_FALLBACK", "1") == "1"
+OVERPASS_URL = os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+
+def overpass_nodes(south, west, north, east, timeout=5):
+    """Amenity nodes in a bbox as [(lat, lon), ...]; raises on any failure."""
     q = f"""
     [out:json][timeout:{timeout}];
-    node(around:{radius_m},{lat},{lon})[amenity];
-    out count;
+    node({south},{west},{north},{east})[amenity];
+    out skel qt;
     """
-    url = "https://overpass-api.de/api/interpreter"
     try:
-        r = requests.post(url, data=q, timeout=timeout)
-        j = r.json()
-        # Overpass returns {'elements': [{'type':'count','tags':{'total':'N'}}]} for out count
-        # fallback to len(elements) if count not provided
-        if isinstance(j, dict) and j.get("elements"):
-            # try tags total
-            el0 = j["elements"][0]
-            if "tags" in el0 and "total" in el0["tags"]:
-                try:
-                    return int(el0["tags"]["total"])
-                except:
-                    pass
-            # fallback
-            return len(j.get("elements", []))
-        return 0
+        with span("overpass"):
+            r = requests.post(OVERPASS_URL, data=q, timeout=timeout)
+            r.raise_for_status()
+            j = r.json()
     except Exception:
-        return 0  # conservative fallback
+        FAILURES.inc(component="overpass")
+        raise
+    return [(el["lat"], el["lon"]) for el in j.get("elements", []) if "lat" in el]
+
+_poi_index = PoiIndex.open(POI_INDEX_DIR)
+_poi_cache = PoiCache(fetch_nodes=overpass_nodes, db=get_conn)
+print(f"[POI] index={'loaded (%d POIs)' % _poi_index.meta['count'] if _poi_index else 'none'}, "
+      f"overpass_fallback={POI_OVERPASS_FALLBACK}")
+
+# POI count (amenity nodes within radius_m). Returns None when unknown
+# (no source covers the point, or the lookup failed) - callers must not
+# treat that as "isolated".
+def poi_density(lat, lon, radius_m=POI_RADIUS_M, timeout=5):
+    if _poi_index is not None and _poi_index.covers(lat, lon):
+        with span("poi_index"):
+            return _poi_index.count(lat, lon, radius_m)
+    if POI_OVERPASS_FALLBACK:
+        with span("poi_cache"):
+            return _poi_cache.count(lat, lon, radius_m)
+    return None
 
 def is_night(ts=None, tz_offset_hours=5.5):
     if ts is None:
@@ -44,36 +63,161 @@ def is_night(ts=None, tz_offset_hours=5.5):
     # night = before 6am or after 8pm
     return (local_hour < 6) or (local_hour >= 20)
 
-def evaluate(user, lat, lon, stationary_seconds=0, ts=None, voice_prob=None):
+# -------------------------------------------------------------------
+# Signal providers
+# Each provider returns a Signal; value None means "unknown" (no data, failed or
+# timed out) and the decision below never treats unknown as risky.
+# -------------------------------------------------------------------
+Signal = namedtuple("Signal", "name value status")     # status: ok | unknown | timeout | error
+
+def _ok(name, value):
+    return Signal(name, value, "ok" if value is not None else "unknown")
+
+def _resolve(v):
+    return v() if callable(v) else v
+
+def night_signal(ctx):
+    return _ok("night", is_night(ctx["ts"]))
+
+def dwell_signal(ctx):
+    return _ok("dwell", _resolve(ctx["stationary_seconds"]))
+
+def poi_signal(ctx):
+    return _ok("poi", poi_density(ctx["lat"], ctx["lon"]))
+
+def voice_signal(ctx):
+    return _ok("voice", _resolve(ctx["voice_prob"]))
+
+def incident_signal(ctx):
+    return _ok("incident", _resolve(ctx["recent_alert"]))
+
+PROVIDERS = {"night": night_signal, "dwell": dwell_signal, "poi": poi_signal, "voice": voice_signal,
+             "incident": incident_signal}
+
+RISK_BUDGET_MS = float(os.getenv("RISK_BUDGET_MS", "150"))   # per-evaluation deadline
+RISK_WORKERS = int(os.getenv("RISK_WORKERS", "8"))
+_pool = ThreadPoolExecutor(max_workers=RISK_WORKERS, thread_name_prefix="risk-signal")
+SIGNALS = REGISTRY.counter("she_risk_signals_total", "Risk signal outcomes.", ("signal", "status"))
+
+def _run_provider(fn, ctx):
+    try:
+        return fn(ctx)
+    except Exception as e:
+        print(f"[WARN] risk signal {fn.__name__} failed:", e)
+        return Signal(fn.__name__.replace("_signal", ""), None, "error")
+
+# providers that may block on I/O; the rest are cheap and run on the caller's thread
+# so a pool full of stuck Overpass calls can never delay them
+BLOCKING = {"poi"}
+
+def collect_signals(ctx, names, budget_ms=RISK_BUDGET_MS):
+    """
+    Run the named providers concurrently and return {name: Signal} with whatever
+    finished within budget_ms. Stragglers keep running in the background (a slow
+    POI fetch still fills the cache for the next fix) but are reported as timeout.
+    """
+    deadline = time.perf_counter() + max(budget_ms, 0) / 1000
+    futures = {n: _pool.submit(_run_provider, PROVIDERS[n], ctx) for n in names if n in BLOCKING}
+    out = {n: _run_provider(PROVIDERS[n], ctx) for n in names if n not in BLOCKING}
+    done, _ = wait(futures.values(), timeout=max(deadline - time.perf_counter(), 0))
+    for n, fut in futures.items():
+        out[n] = fut.result() if fut in done else Signal(n, None, "timeout")
+    for n, sg in out.items():
+        SIGNALS.inc(signal=n, status=sg.status)
+    return out
+
+def _needs_poi(stationary_seconds):
+    # POI density only matters once the user has been stationary long enough;
+    # a lazily computed dwell can't be known up front, so fetch it then
+    return callable(stationary_seconds) or stationary_seconds is None or stationary_seconds >= STAT_THR
+
+# -------------------------------------------------------------------
+# Reporting cadence: how soon the client should send its next fix.
+# Dense while something is (or may soon be) wrong, sparse otherwise; the
+# server's ReportLimiter enforces the same numbers.
+# -------------------------------------------------------------------
+REPORT_FAST_S     = int(os.getenv("REPORT_FAST_S", "5"))       # alert: open incident, alerting fix, isolated at night
+REPORT_ELEVATED_S = int(os.getenv("REPORT_ELEVATED_S", "15"))  # night, dwelling, weak voice, unknown dwell
+REPORT_NORMAL_S   = int(os.getenv("REPORT_NORMAL_S", "60"))    # daytime and moving
+REPORT_ELEVATED_M = float(os.getenv("REPORT_ELEVATED_M", "10"))
+REPORT_NORMAL_M   = float(os.getenv("REPORT_NORMAL_M", "50"))
+
+def reporting_policy(action, signals):
     """
-    Returns a dict: { action: "NONE"|"NOTIFY"|"AUTO_SOS", reason: str, evidence: str }
-    Logic:
-      - If voice_prob >= VOICE_THR -> AUTO_SOS immediately (evidence includes voice_prob)
-      - Else if stationary_seconds >= STAT_THR AND is_night AND poi_density <= POI_THR -> AUTO_SOS
-      - Else if any weak signal present -> NOTIFY
-      - Else NONE
+    {tier, interval_s, min_distance_m}: report again after interval_s, or
+    earlier once moved min_distance_m. While dwelling the interval never
+    runs past the moment dwell would reach STAT_THR, so the stationary rule
+    fires no later than it would with dense sampling.
     """
+    dwell, night, pd = signals.get("dwell"), signals.get("night"), signals.get("poi")
+    voice, incident = signals.get("voice"), signals.get("incident")
+    if action != "NONE" or incident or (night and pd is not None and pd <= POI_THR):
+        tier, interval, dist = "alert", REPORT_FAST_S, 0.0
+    elif night or dwell is None or dwell >= STAT_THR // 3 or (voice is not None and voice > 0.2):
+        tier, interval, dist = "elevated", REPORT_ELEVATED_S, REPORT_ELEVATED_M
+    else:
+        tier, interval, dist = "normal", REPORT_NORMAL_S, REPORT_NORMAL_M
+    if dwell is not None and 0 < dwell < STAT_THR:
+        interval = max(REPORT_FAST_S, min(interval, STAT_THR - int(dwell)))
+    return {"tier": tier, "interval_s": int(interval), "min_distance_m": dist}
+
+def evaluate(user, lat, lon, stationary_seconds=0, ts=None, voice_prob=None, budget_ms=RISK_BUDGET_MS,
+             recent_alert=None):
+    """
+    Returns a dict: { action: "NONE"|"NOTIFY"|"AUTO_SOS", reason: str, evidence: str,
+                      signals: {name: value or None}, unknown: [names],
+                      report: {tier, interval_s, min_distance_m} }
+    stationary_seconds / voice_prob / recent_alert may be values or zero-arg callables.
+    Signals are gathered concurrently under budget_ms; decision on what arrived:
+      - voice_prob >= VOICE_THR -> AUTO_SOS
+      - stationary >= STAT_THR AND night AND poi_density <= POI_THR -> AUTO_SOS
+        (an unknown signal never escalates; it stays at NOTIFY)
+      - stationary >= STAT_THR, or voice_prob > 0.2 -> NOTIFY
+      - else NONE
+    report is reporting_policy() for the decision.
+    """
+    ts = int(time.time()) if ts is None else ts
+    ctx = {"user": user, "lat": lat, "lon": lon, "ts": ts,
+           "stationary_seconds": stationary_seconds, "voice_prob": voice_prob, "recent_alert": recent_alert}
+    names = ["night", "dwell"]
+    if voice_prob is not None:
+        names.append("voice")
+    if recent_alert is not None:
+        names.append("incident")
+    # at night density also sets the reporting cadence; tile-cached, so cheap after the first fix
+    if _needs_poi(stationary_seconds) or is_night(ts):
+        names.append("poi")
+    sig = collect_signals(ctx, names, budget_ms)
+    val = lambda n: sig[n].value if n in sig else None
+    unknown = [n for n, s in sig.items() if s.value is None and n not in ("voice", "incident")]
+
+    def result(action, reason, evidence):
+        signals = {n: s.value for n, s in sig.items()}
+        return {"action": action, "reason": reason, "evidence": ";".join(evidence),
+                "signals": signals, "unknown": unknown, "report": reporting_policy(action, signals)}
+
     reasons = []
+    voice, dwell = val("voice"), val("dwell")
     # voice check
-    if voice_prob is not None:
-        reasons.append(f"voice_prob={voice_prob:.2f}")
-        if voice_prob >= VOICE_THR:
-            return {"action": "AUTO_SOS", "reason": "voice_distress", "evidence": ";".join(reasons)}
+    if voice is not None:
+        reasons.append(f"voice_prob={voice:.2f}")
+        if voice >= VOICE_THR:
+            return result("AUTO_SOS", "voice_distress", reasons)
 
     # stationary + night + isolation check
-    if stationary_seconds >= STAT_THR:
-        reasons.append(f"stationary={stationary_seconds}s")
-        night = is_night(ts)
-        reasons.append(f"night={night}")
-        pd = poi_density(lat, lon)
-        reasons.append(f"poi_count={pd}")
-        if night and pd <= POI_THR:
-            return {"action": "AUTO_SOS", "reason": "stationary_night_low_poi", "evidence": ";".join(reasons)}
+    if dwell is not None and dwell >= STAT_THR:
+        night, pd = val("night"), val("poi")
+        reasons.append(f"stationary={dwell}s")
+        reasons.append(f"night={night if night is not None else 'unknown'}")
+        reasons.append(f"poi_count={pd if pd is not None else 'unknown'}"
+                       + (f"({sig['poi'].status})" if pd is None and "poi" in sig else ""))
+        if night and pd is not None and pd <= POI_THR:
+            return result("AUTO_SOS", "stationary_night_low_poi", reasons)
         # if stationary but not full conditions -> notify
-        return {"action": "NOTIFY", "reason": "stationary", "evidence": ";".join(reasons)}
+        return result("NOTIFY", "stationary", reasons)
 
     # if there is a voice_prob but below threshold: notify
-    if voice_prob is not None and voice_prob > 0.2:
-        return {"action": "NOTIFY", "reason": "possible_voice", "evidence": ";".join(reasons)}
+    if voice is not None and voice > 0.2:
+        return result("NOTIFY", "possible_voice", reasons)
 
-    return {"action": "NONE", "reason": "ok", "evidence": ""}
+    return result("NONE", "ok", [])
@@ -1,5 +1,211 @@
-# notifier_agent.py: sends alerts (Telegram/Email hooks can be added)
+# notifier_agent.py: sends alerts through a durable outbox + background workers
+# Request handlers only enqueue; delivery, rate limiting and retries happen here.
+import os, time, queue, random, threading
+import requests
+from requests.adapters import HTTPAdapter
+from utils.storage import get_conn
+from utils.metrics import span, FAILURES
+
+TELEGRAM_API_BASE   = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+NOTIFY_WORKERS      = int(os.getenv("NOTIFY_WORKERS", "2"))
+NOTIFY_QUEUE_MAX    = int(os.getenv("NOTIFY_QUEUE_MAX", "1000"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+NOTIFY_BACKOFF_S    = float(os.getenv("NOTIFY_BACKOFF_S", "1.0"))    # 1, 2, 4, ... seconds
+NOTIFY_BACKOFF_MAX  = float(os.getenv("NOTIFY_BACKOFF_MAX", "300"))
+NOTIFY_SWEEP_S      = float(os.getenv("NOTIFY_SWEEP_S", "2.0"))
+# Telegram limits: ~1 msg/s into one chat, ~30 msg/s overall per bot
+PER_CHAT_INTERVAL_S = float(os.getenv("NOTIFY_PER_CHAT_INTERVAL_S", "1.0"))
+GLOBAL_INTERVAL_S   = float(os.getenv("NOTIFY_GLOBAL_INTERVAL_S", str(1 / 30)))
+# queue lanes: lower is sent first
+PRIORITY_SOS, PRIORITY_NORMAL = 0, 1
+
+class RateLimiter:
+    """Reserves send slots so that messages to one key are spaced by `interval`."""
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, key=None, preempt=False):
+        """preempt: take the slot now and push the key's later reservations back."""
+        with self._lock:
+            now = time.monotonic()
+            slot = now if preempt else max(now, self._next.get(key, 0.0))
+            self._next[key] = max(slot, self._next.get(key, 0.0)) + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class TelegramError(Exception):
+    def __init__(self, msg, retry_after=None):
+        super().__init__(msg)
+        self.retry_after = retry_after
+
+class Dispatcher:
+    def __init__(self, token, default_chat_id, workers=NOTIFY_WORKERS,
+                 queue_max=NOTIFY_QUEUE_MAX, db=get_conn):
+        self.token = token
+        self.default_chat_id = default_chat_id
+        self.n_workers = workers
+        self.db = db
+        # two lanes: SOS messages never sit behind queued NOTIFY / voice alerts, and one
+        # worker serves only the SOS lane so it is free even while the others are pacing
+        self._q = queue.Queue(maxsize=queue_max)
+        self._sos_q = queue.Queue(maxsize=queue_max)
+        self._inflight = set()
+        self._inflight_lock = threading.Lock()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._chat_rl = RateLimiter(PER_CHAT_INTERVAL_S)
+        self._global_rl = RateLimiter(GLOBAL_INTERVAL_S)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1) + 1)   # + the SOS worker
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def configured(self):
+        return bool(self.token and self.default_chat_id)
+
+    # ---------------- producer side ----------------
+    def enqueue(self, text, chat_id=None, priority=PRIORITY_NORMAL):
+        """
+        Persist the message to the outbox and hand it to a worker. Never blocks on the network.
+        PRIORITY_SOS messages jump the queue and are not held back by per-chat pacing.
+        """
+        if not self.configured:
+            print("[WARN] Telegram credentials missing; printing alert:\n", text)
+            return None
+        chat_id = chat_id or self.default_chat_id
+        now = time.time()
+        with self.db() as conn:
+            cur = conn.execute(
+                "INSERT INTO outbox(chat_id, text, created_at, next_attempt_at, priority) VALUES(?,?,?,?,?)",
+                (str(chat_id), text, now, now, priority))
+            msg_id = cur.lastrowid
+        self.start()
+        self._offer(msg_id, str(chat_id), text, 0, priority)
+        return msg_id
+
+    def _offer(self, msg_id, chat_id, text, attempts, priority=PRIORITY_NORMAL):
+        with self._inflight_lock:
+            if msg_id in self._inflight:
+                return
+            self._inflight.add(msg_id)
+        try:
+            lane = self._sos_q if priority == PRIORITY_SOS else self._q
+            lane.put_nowait((msg_id, chat_id, text, attempts, priority))
+        except queue.Full:
+            # stays pending in the outbox; the sweeper picks it up later
+            with self._inflight_lock:
+                self._inflight.discard(msg_id)
+
+    # ---------------- lifecycle ----------------
+    def start(self):
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            # rows claimed by a process that died mid-send go back to pending
+            with self.db() as conn:
+                conn.execute("UPDATE outbox SET status='pending' WHERE status='sending'")
+            for i in range(self.n_workers):
+                threading.Thread(target=self._worker, name=f"notifier-{i}", daemon=True).start()
+            threading.Thread(target=self._worker, args=(True,), name="notifier-sos", daemon=True).start()
+            threading.Thread(target=self._sweeper, name="notifier-sweeper", daemon=True).start()
+            self._started = True
+
+    def stop(self):
+        self._stop.set()
+
+    def pending(self):
+        with self.db() as conn:
+            return conn.execute("SELECT COUNT(*) FROM outbox WHERE status='pending'").fetchone()[0]
+
+    # ---------------- consumer side ----------------
+    def _sweeper(self):
+        # re-offers due retries and anything left pending by a crash or a full queue
+        while not self._stop.is_set():
+            try:
+                with self.db() as conn:
+                    rows = conn.execute(
+                        "SELECT id, chat_id, text, attempts, priority FROM outbox "
+                        "WHERE status='pending' AND next_attempt_at<=? ORDER BY priority, id LIMIT ?",
+                        (time.time(), self._q.maxsize)).fetchall()
+                for row in rows:
+                    self._offer(*row)
+            except Exception as e:
+                print("[ERR] notifier sweep failed:", e)
+            self._stop.wait(NOTIFY_SWEEP_S)
+
+    def _next(self, sos_only):
+        # every worker drains the SOS lane first
+        try:
+            return self._sos_q, self._sos_q.get_nowait()
+        except queue.Empty:
+            pass
+        if sos_only:
+            return self._sos_q, self._sos_q.get(timeout=1)
+        return self._q, self._q.get(timeout=0.2)
+
+    def _worker(self, sos_only=False):
+        while not self._stop.is_set():
+            try:
+                lane, (msg_id, chat_id, text, attempts, priority) = self._next(sos_only)
+            except queue.Empty:
+                continue
+            try:
+                with self.db() as conn:
+                    claimed = conn.execute(
+                        "UPDATE outbox SET status='sending' WHERE id=? AND status='pending'",
+                        (msg_id,)).rowcount
+                if not claimed:
+                    continue        # already delivered/claimed via another path
+                self._global_rl.wait()
+                self._chat_rl.wait(chat_id, preempt=priority == PRIORITY_SOS)
+                with span("telegram_send"):
+                    self._send(chat_id, text)
+                with self.db() as conn:
+                    conn.execute("UPDATE outbox SET status='sent', sent_at=?, attempts=? WHERE id=?",
+                                 (time.time(), attempts + 1, msg_id))
+            except Exception as e:
+                try:
+                    self._record_failure(msg_id, attempts + 1, e)
+                except Exception as e2:
+                    # e.g. database locked: the row stays 'sending' and start() requeues it
+                    # after a restart; the worker itself must keep running
+                    print(f"[ERR] notifier could not record failure of message {msg_id}:", e2)
+            finally:
+                with self._inflight_lock:
+                    self._inflight.discard(msg_id)
+                lane.task_done()
+
+    def _record_failure(self, msg_id, attempts, err):
+        FAILURES.inc(component="telegram")
+        delay = getattr(err, "retry_after", None)
+        if delay is None:
+            delay = min(NOTIFY_BACKOFF_MAX, NOTIFY_BACKOFF_S * 2 ** (attempts - 1))
+            delay *= random.uniform(0.8, 1.2)
+        status = "failed" if attempts >= NOTIFY_MAX_ATTEMPTS else "pending"
+        print(f"[ERR] Telegram send failed (attempt {attempts}, {status}):", err)
+        with self.db() as conn:
+            conn.execute("UPDATE outbox SET attempts=?, next_attempt_at=?, status=?, last_error=? WHERE id=?",
+                         (attempts, time.time() + delay, status, str(err)[:500], msg_id))
+
+    def _send(self, chat_id, text):
+        url = f"{TELEGRAM_API_BASE}/bot{self.token}/sendMessage"
+        r = self.session.post(url, json={"chat_id": chat_id, "text": text}, timeout=6)
+        if r.status_code == 429:
+            try:
+                retry_after = float(r.json()["parameters"]["retry_after"])
+            except Exception:
+                retry_after = None
+            raise TelegramError("rate limited (429)", retry_after)
+        if r.status_code >= 400:
+            raise TelegramError(f"HTTP {r.status_code}: {r.text[:200]}")
+
 def send_alert(summary: str, contacts=None):
     print("[ALERT]", summary)
-    # This is a placeholder; real alerts are sent from server.py via Telegram.
+    # This is a placeholder; real alerts go through Dispatcher.enqueue (see server.py).
     # You can wire email/SMTP or WhatsApp APIs here if needed.
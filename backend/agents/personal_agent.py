@@ -6,13 +6,11 @@ def detect_anomaly(recent_points, stop_threshold_sec=180, radius_m=15):
     """
     if len(recent_points) < 2:
         return False, None
-    # naive: if last ~10 points within radius and time span > threshold -> stopped_long
-    from . import notifier_agent  # optional use
-    from ..utils.helpers import haversine
-    pts = recent_points[-10:]
-    lat0, lon0 = pts[-1]['lat'], pts[-1]['lon']
-    span = pts[-1]['ts'] - pts[0]['ts']
-    within = all(haversine(lat0, lon0, p['lat'], p['lon']) < radius_m for p in pts)
-    if within and span > stop_threshold_sec:
+    # same anchor + dwell logic the server runs per fix (utils/trajectory.py)
+    from utils.trajectory import Trajectory
+    tr = Trajectory(capacity=len(recent_points), radius_m=radius_m)
+    for p in recent_points:
+        tr.append(p['ts'], p['lat'], p['lon'])
+    if tr.dwell_seconds() > stop_threshold_sec:
         return True, "stopped_long"
     return False, None
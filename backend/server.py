@@ -1,211 +1,415 @@
 # backend/server.py
 # SHE-Guardian: Flask backend (agents + alerts + voice endpoint)
-import os, io, time, sqlite3, requests, tempfile, logging, traceback
-from math import radians, sin, cos, asin, sqrt
-from flask import Flask, request, jsonify
-import joblib, numpy as np, librosa, soundfile as sf
-from pydub import AudioSegment  # pip install pydub
-
-# --- Try to load TensorFlow (optional, skip if not available) ---
-try:
-    from tensorflow.keras.models import load_model
-    tf_available = True
-except Exception as e:
-    print("Using classic joblib model only.", e)
-    tf_available = False
+import os, time, uuid, logging, threading, multiprocessing
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import Flask, request, jsonify, g, Response
+import numpy as np
 
 # --- Location Risk Agent ---
-from agents.location_risk_agent import evaluate as evaluate_location_risk
+from agents.location_risk_agent import evaluate as evaluate_location_risk, reporting_policy
+
+# --- Storage (pooled WAL connections + migrations) ---
+from utils.storage import get_conn as db, init_db
+from utils.trajectory import TrajectoryStore
+from utils.retention import RetentionJob, history as locs_history
+from utils.spatial import users_within, alerts_in_bbox
+
+# --- Audio decoding (in-memory; soundfile / PyAV) ---
+from utils.audio import decode_audio
+from utils.features import mfcc_stats_batch, stack_clips, CLIP_SECONDS
+from utils.vad import detect as vad_detect, select_window, VAD_ENABLED
+from utils.streaming import VoiceStream
+from utils.inference_pool import InferencePool, PoolBusy, VOICE_WORKERS
+from utils.model_registry import ModelRegistry
+from utils.result_cache import LruCache, IdempotencyStore, InFlight, content_hash
+from utils.report_limiter import ReportLimiter
+
+# --- Notifier Agent (outbox + background Telegram workers) ---
+from agents.notifier_agent import Dispatcher, PRIORITY_SOS, PRIORITY_NORMAL
+
+# --- Incident Agent (coalesces repeated alerts per user) ---
+from agents.incident_agent import IncidentManager
+
+# --- Instrumentation (spans, counters, /metrics) ---
+from utils import metrics
+from utils.metrics import span, ALERTS, FAILURES, HTTP_SECONDS
+VOICE_GATED = metrics.REGISTRY.counter("she_voice_gated_total", "Clips short-circuited by the VAD gate.",
+                                       ("reason",))
 
 app = Flask(__name__)
 app.logger.setLevel(logging.INFO)
-DB_PATH = os.path.join(os.path.dirname(__file__), "database", "events.db")
 
 # --- Telegram config ---
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN", "")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
+notifier = Dispatcher(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID)
+incidents = IncidentManager(db=db)
 
 # -------------------------------------------------------------------
 # Utilities
 # -------------------------------------------------------------------
-def send_telegram(msg: str):
-    if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
-        print("[WARN] Telegram credentials missing; printing alert:\n", msg)
-        return
-    try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-        requests.post(url, json={"chat_id": TELEGRAM_CHAT_ID, "text": msg}, timeout=6)
-    except Exception as e:
-        print("[ERR] Telegram send failed:", e)
-
-def db():
-    return sqlite3.connect(DB_PATH)
-
-def init_db():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = db()
-    conn.execute("""CREATE TABLE IF NOT EXISTS locs(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user TEXT, ts INTEGER, lat REAL, lon REAL, acc REAL
-    )""")
-    conn.execute("""CREATE TABLE IF NOT EXISTS alerts(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user TEXT, ts INTEGER, type TEXT,
-        summary TEXT, reason TEXT, evidence TEXT
-    )""")
-    conn.commit(); conn.close()
-
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000
-    phi1, phi2 = radians(lat1), radians(lat2)
-    dphi = radians(lat2 - lat1)
-    dl = radians(lon2 - lon1)
-    a = sin(dphi / 2) ** 2 + cos(phi1) * cos(phi2) * sin(dl / 2) ** 2
-    return 2 * R * asin(sqrt(a))
+def send_telegram(msg: str, sos=False):
+    # durable + asynchronous: written to the outbox, delivered by notifier workers;
+    # SOS messages go ahead of queued NOTIFY / voice alerts
+    with span("outbox_enqueue"):
+        notifier.enqueue(msg, priority=PRIORITY_SOS if sos else PRIORITY_NORMAL)
+
+def _load_recent_fixes(user, n):
+    with db() as conn:
+        rows = conn.execute(
+            "SELECT ts, lat, lon FROM locs WHERE user=? ORDER BY ts DESC LIMIT ?", (user, n)
+        ).fetchall()
+    return rows[::-1]
+
+# per-user ring buffers; warmed lazily from locs after a restart
+trajectories = TrajectoryStore(loader=_load_recent_fixes)
+# hot window / downsampling / npz archive for locs (started in __main__)
+retention = RetentionJob(db=db)
 
 def stationary_time_seconds(user: str):
-    conn = db()
-    rows = conn.execute(
-        "SELECT ts, lat, lon FROM locs WHERE user=? ORDER BY ts DESC LIMIT 10", (user,)
-    ).fetchall()
-    conn.close()
-    if len(rows) < 2:
-        return 0
-    lat0, lon0 = rows[0][1], rows[0][2]
-    span = rows[0][0] - rows[-1][0]
-    within = all(haversine(lat0, lon0, r[1], r[2]) < 15 for r in rows)
-    return span if within else 0
+    return trajectories.dwell_seconds(user)
 
 # -------------------------------------------------------------------
 # Helper: Get last known location
 # -------------------------------------------------------------------
 def get_last_location(user: str):
-    conn = db()
-    row = conn.execute(
-        "SELECT lat, lon FROM locs WHERE user=? ORDER BY ts DESC LIMIT 1", (user,)
-    ).fetchone()
-    conn.close()
+    last = trajectories.last(user)
+    if last:
+        return last[1], last[2]
+    with db() as conn:
+        row = conn.execute(
+            "SELECT lat, lon FROM locs WHERE user=? ORDER BY ts DESC LIMIT 1", (user,)
+        ).fetchone()
     if row:
         return float(row[0]), float(row[1])
     return None, None
 
 # -------------------------------------------------------------------
 # Voice model loader
+# Heavy libraries (librosa, joblib, TensorFlow) are imported by the registry's
+# background thread, so /loc and /sos serve immediately after start-up.
 # -------------------------------------------------------------------
-print("🔄 Loading voice models...", flush=True)
-ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), "..", "voice_model", "artifacts")
-CUSTOM_MODEL_PATH = os.path.join(ARTIFACT_DIR, "voice_clf.joblib")
-CUSTOM_SCALER_PATH = os.path.join(ARTIFACT_DIR, "scaler_final_v3.joblib")
-CUSTOM_FEAT_PATH = os.path.join(ARTIFACT_DIR, "feat_cfg.npy")
-CREMA_MODEL_PATH = os.path.join(ARTIFACT_DIR, "voice_clf_final_v3.h5")
-CREMA_SCALER_PATH = os.path.join(ARTIFACT_DIR, "scaler_final_v3.joblib")
-
-voice_model_custom = None
-voice_model_cremad = None
-scaler_custom = None
-scaler_cremad = None
-n_mfcc, sr_target = 20, 16000
-
-try:
-    if os.path.exists(CUSTOM_MODEL_PATH):
-        voice_model_custom = joblib.load(CUSTOM_MODEL_PATH)
-        print(f"✅ Loaded CUSTOM voice model: {CUSTOM_MODEL_PATH}")
-    if os.path.exists(CUSTOM_SCALER_PATH):
-        scaler_custom = joblib.load(CUSTOM_SCALER_PATH)
-        print(f"✅ Loaded CUSTOM scaler: {CUSTOM_SCALER_PATH}")
-    if os.path.exists(CUSTOM_FEAT_PATH):
-        n_mfcc, sr_target = [int(x) for x in np.load(CUSTOM_FEAT_PATH)]
-except Exception as e:
-    print("⚠️ Custom model load failed:", e)
-    traceback.print_exc()
-
-if tf_available and os.path.exists(CREMA_MODEL_PATH):
-    try:
-        voice_model_cremad = load_model(CREMA_MODEL_PATH)
-        scaler_cremad = joblib.load(CREMA_SCALER_PATH)
-        print(f"✅ Loaded CREMA-D backup model: {CREMA_MODEL_PATH}")
-    except Exception as e:
-        print("⚠️ Failed to load CREMA-D:", e)
+voice_pool = None
 
-if voice_model_custom is not None:
-    active_model, active_scaler, active_flag = voice_model_custom, scaler_custom, "CUSTOM"
-elif voice_model_cremad is not None:
-    active_model, active_scaler, active_flag = voice_model_cremad, scaler_cremad, "CREMA-D"
-else:
-    active_model, active_scaler, active_flag = None, None, "NONE"
-
-print(f"[VOICE] Active model: {active_flag}, n_mfcc={n_mfcc}, sr={sr_target}", flush=True)
+def _on_model_swap(vm):
+    # CPU-bound scoring runs in worker processes (each loads the active model once)
+    global voice_pool
+    if VOICE_WORKERS <= 0:
+        return
+    if voice_pool is None:
+        voice_pool = InferencePool(vm.spec)
+        print(f"[VOICE] Inference pool: {VOICE_WORKERS} worker process(es)", flush=True)
+    else:
+        voice_pool.respawn(vm.spec)
+
+models = ModelRegistry(on_swap=_on_model_swap)
+metrics.REGISTRY.gauge("she_voice_model_ready", "1 once a voice model is loaded.", lambda: int(models.ready))
+metrics.REGISTRY.gauge("she_outbox_pending", "Notifications waiting in the outbox.",
+                       lambda: notifier.pending() if notifier.configured else None)
+# (spawned pool workers re-import this module as __mp_main__; only the parent loads/watches)
+if multiprocessing.parent_process() is None:
+    models.start()
 
 # -------------------------------------------------------------------
 # Voice utilities
 # -------------------------------------------------------------------
-def convert_to_wav_bytes(input_path):
-    audio = AudioSegment.from_file(input_path)
-    audio = audio.set_frame_rate(sr_target).set_channels(1).set_sample_width(2)
-    out_buf = io.BytesIO()
-    audio.export(out_buf, format="wav")
-    return out_buf.getvalue()
-
-def _featurize_wav_bytes(wav_bytes):
-    y, sr = sf.read(io.BytesIO(wav_bytes), dtype="float32", always_2d=False)
-    if sr != sr_target:
-        y = librosa.resample(y, orig_sr=sr, target_sr=sr_target)
-    if y.ndim > 1:
-        y = np.mean(y, axis=1)
-    target_len = sr_target * 4
-    y = np.pad(y, (0, max(0, target_len - len(y))))[:target_len]
-    mfcc = librosa.feature.mfcc(y=y, sr=sr_target, n_mfcc=n_mfcc)
-    feats = np.hstack([mfcc.mean(1), mfcc.std(1), mfcc.min(1), mfcc.max(1)])
-    return feats.reshape(1, -1)
+def _score_signals(vm, signals):
+    """Decoded clips -> (N,) probabilities, via the worker pool when enabled."""
+    try:
+        if voice_pool is not None:
+            with span("inference_pool"):
+                return voice_pool.score(signals)
+        with span("mfcc"):
+            feats = mfcc_stats_batch(stack_clips(signals, vm.sr), vm.sr, vm.n_mfcc)
+        with span("model"):
+            return vm.predict_proba(feats)
+    except PoolBusy:
+        FAILURES.inc(component="voice_pool_busy")
+        raise
+    except Exception:
+        FAILURES.inc(component="model")
+        raise
+
+# Retried uploads: identical bytes are scored once per model version, and a retry
+# of the same request (Idempotency-Key, or same user + same bytes) replays the
+# first response without re-running alerts.
+voice_results = LruCache()     # (hash, model version) -> probability
+voice_feats = LruCache()       # (hash, sr, n_mfcc) -> MFCC stats row (in-process scoring only)
+voice_idem = IdempotencyStore()
+
+def _voice_cache_stats():
+    out = {f"result_{k}": v for k, v in voice_results.stats.items()}
+    out.update({f"feature_{k}": v for k, v in voice_feats.stats.items()})
+    out.update({f"idem_{k}": v for k, v in voice_idem.stats.items()})
+    return out
+
+metrics.REGISTRY.gauge("she_voice_cache_events", "Voice score/feature cache counters.",
+                       _voice_cache_stats, labelname="kind")
+
+# server-chosen GPS cadence (location_risk_agent.reporting_policy), enforced per user on /loc
+report_limiter = ReportLimiter()
+metrics.REGISTRY.gauge("she_loc_reports", "Single /loc fixes accepted vs rejected as early.",
+                       lambda: dict(report_limiter.stats), labelname="kind")
+
+def _gate(y, sr):
+    """VAD pre-gate: (window to score, "ok") or (None, reason) for clips with no speech."""
+    if not VAD_ENABLED:
+        return y, "ok"
+    with span("vad"):
+        v = vad_detect(y, sr)
+        if not v.active:
+            VOICE_GATED.inc(reason=v.reason)
+            return None, v.reason
+        return select_window(y, sr, CLIP_SECONDS, v), "ok"
+
+def _score_cached(vm, buf, suffix, h):
+    """
+    Probability for one upload -> (prob, source, gate); source is result|feature|computed,
+    gate is "ok" or the VAD reason the clip was short-circuited to normal (prob 0).
+    """
+    key = (h, models.version)
+    hit = voice_results.get(key)
+    if hit is not None:
+        return hit[0], "result", hit[1]
+    fkey = (h, vm.sr, vm.n_mfcc)
+    feats = voice_feats.get(fkey)
+    source = "feature"
+    if feats is None:
+        y, gate = _gate(_decode(buf, suffix, vm.sr), vm.sr)
+        if y is None:
+            voice_results.put(key, (0.0, gate))
+            return 0.0, "computed", gate
+        if voice_pool is not None:
+            prob = float(_score_signals(vm, [y])[0])
+            voice_results.put(key, (prob, "ok"))
+            return prob, "computed", "ok"
+        with span("mfcc"):
+            feats = mfcc_stats_batch(stack_clips([y], vm.sr), vm.sr, vm.n_mfcc)
+        voice_feats.put(fkey, feats)
+        source = "computed"
+    try:
+        with span("model"):
+            prob = float(vm.predict_proba(feats)[0])
+    except Exception:
+        FAILURES.inc(component="model")
+        raise
+    voice_results.put(key, (prob, "ok"))
+    return prob, source, "ok"
+
+def _decode(buf, suffix, sr):
+    with span("decode"):
+        try:
+            return decode_audio(buf, suffix, sr)
+        except Exception:
+            FAILURES.inc(component="decode")
+            raise
+
+def _busy_response(e):
+    resp = jsonify({"ok": False, "msg": str(e), "retry_after": e.retry_after})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+def _model_unavailable():
+    info = models.info()
+    msg = "Voice model warming up" if info["status"] in ("idle", "loading") else "Voice model not loaded"
+    resp = jsonify({"ok": False, "msg": msg, "model": info})
+    resp.status_code = 503
+    if info["status"] in ("idle", "loading"):
+        resp.headers["Retry-After"] = "2"
+    return resp
 
 # -------------------------------------------------------------------
-# Routes
+# Location helpers
 # -------------------------------------------------------------------
-@app.post("/loc")
-def loc():
-    data = request.get_json(force=True)
-    user = data.get("user", "user")
-    lat, lon = float(data.get("lat", 0)), float(data.get("lon", 0))
-    acc = float(data.get("acc", 0))
-    ts = int(data.get("ts", time.time()))
-    print(f"[LOC] {user} lat={lat} lon={lon} acc={acc} ts={ts}")
-
-    conn = db()
-    conn.execute("INSERT INTO locs(user, ts, lat, lon, acc) VALUES(?,?,?,?,?)",
-                 (user, ts, lat, lon, acc))
-    conn.commit(); conn.close()
-
+def _apply_location_risk(user, lat, lon, ts):
+    """Run the location risk agent for one fix and raise alerts; returns the risk dict."""
     st = stationary_time_seconds(user)
     try:
-        risk = evaluate_location_risk(user=user, lat=lat, lon=lon,
-                                      stationary_seconds=st, ts=ts, voice_prob=None)
+        with span("risk_eval"):
+            risk = evaluate_location_risk(user=user, lat=lat, lon=lon,
+                                          stationary_seconds=st, ts=ts, voice_prob=None,
+                                          recent_alert=lambda: incidents.current(user) is not None)
     except Exception as e:
+        FAILURES.inc(component="risk_agent")
         risk = {"action": "NONE", "reason": "agent_error", "evidence": str(e)}
+    # no signals -> dwell unknown -> the elevated cadence, never the sparse one
+    risk.setdefault("report", reporting_policy(risk.get("action", "NONE"), {}))
+    report_limiter.grant(user, lat, lon, risk["report"])
 
     action = risk.get("action", "NONE")
     reason = risk.get("reason", "")
     evidence = risk.get("evidence", "")
 
     if action in ("AUTO_SOS", "NOTIFY"):
-        conn = db()
         summary = f"{action} (location) for {user} at {lat},{lon} — reason={reason}"
-        conn.execute("INSERT INTO alerts(user, ts, type, summary, reason, evidence) VALUES(?,?,?,?,?,?)",
-                     (user, ts, action, summary, reason, evidence))
-        conn.commit(); conn.close()
-
+        with span("incident"):
+            d = incidents.trigger(user, action, action, summary, reason, evidence, ts, lat=lat, lon=lon)
+        risk["incident"] = {"id": d.incident_id, "state": d.state, "transition": d.transition}
+        if d.transition not in ("coalesced", "reminded"):
+            ALERTS.inc(type=action)
+        if not d.notify:
+            return risk
+
+        again = " (still active)" if d.transition == "reminded" else ""
         if action == "AUTO_SOS":
-            send_telegram(f"🚨 AUTO-SOS triggered by location for {user}\n{summary}\n"
-                          f"https://www.openstreetmap.org/?mlat={lat}&mlon={lon}#map=18/{lat}/{lon}")
+            send_telegram(f"🚨 AUTO-SOS triggered by location for {user}{again}\n{summary}\n"
+                          f"https://www.openstreetmap.org/?mlat={lat}&mlon={lon}#map=18/{lat}/{lon}", sos=True)
         elif action == "NOTIFY":
-            send_telegram(f"ℹ️ Location notify for {user}\n{summary}")
+            send_telegram(f"ℹ️ Location notify for {user}{again}\n{summary}")
+    elif action == "NONE":
+        incidents.settle(user)
+
+    return risk
+
+def _parse_fix(data, default_user="user"):
+    user = data.get("user", default_user)
+    lat, lon = float(data.get("lat", 0)), float(data.get("lon", 0))
+    acc = float(data.get("acc", 0))
+    ts = int(data.get("ts", time.time()))
+    return user, ts, lat, lon, acc
 
-    return jsonify({"ok": True, "risk_action": action, "reason": reason, "evidence": evidence})
+# -------------------------------------------------------------------
+# Voice alerts
+# -------------------------------------------------------------------
+def _record_voice_result(user, prob, lat=None, lon=None, source="voice"):
+    """
+    Run the distress / AUTO-SOS side effects for one voice score; returns the label.
+    Normal results write nothing. Distress goes through the user's incident (so a
+    burst of distress clips is one alert); a confident score is an SOS and always sent.
+    """
+    label = "distress" if prob >= 0.6 else "normal"
+    if label == "normal":
+        return label
+
+    latf, lonf = None, None
+    try:
+        if lat and lon:
+            latf, lonf = float(lat), float(lon)
+        else:
+            latf, lonf = get_last_location(user)
+    except:
+        pass
+    osm = f"\nhttps://www.openstreetmap.org/?mlat={latf}&mlon={lonf}#map=18/{latf}/{lonf}" if latf and lonf else ""
+    via = "" if source == "voice" else f" via {source}"
+    ts = int(time.time())
+
+    # an alert should tighten the cadence now, not after the last granted interval
+    report_limiter.reset(user)
+    if prob >= 0.75:
+        summary = f"AUTO-SOS ({source}) for {user} at {latf},{lonf} (p={prob:.2f})"
+        with span("incident"):
+            incidents.trigger(user, "SOS", "SOS", summary, "voice_confident", f"p={prob:.2f}", ts,
+                              force=True, lat=latf, lon=lonf)
+        ALERTS.inc(type="SOS")
+        send_telegram(f"🚨 {summary}{osm}", sos=True)
+        return label
+
+    with span("incident"):
+        d = incidents.trigger(user, "NOTIFY", "VOICE", f"Voice inference: distress (p={prob:.2f}){via}",
+                              "voice_distress", f"p={prob:.2f}", ts, lat=latf, lon=lonf)
+    if d.transition not in ("coalesced", "reminded"):
+        ALERTS.inc(type="VOICE")
+    if d.notify:
+        send_telegram(f"🗣️ Voice distress detected for {user} (p={prob:.2f}){osm}")
+    return label
+
+# -------------------------------------------------------------------
+# Request timing
+# -------------------------------------------------------------------
+@app.before_request
+def _start_timer():
+    g.t0 = time.perf_counter()
+
+@app.after_request
+def _record_timing(resp):
+    t0 = g.get("t0")
+    if t0 is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - t0, route=route, method=request.method,
+                             status=resp.status_code)
+    return resp
+
+# -------------------------------------------------------------------
+# Routes
+# -------------------------------------------------------------------
+@app.post("/loc")
+def loc():
+    data = request.get_json(force=True)
+    user, ts, lat, lon, acc = _parse_fix(data)
+    ok, retry_after = report_limiter.check(user, lat, lon)
+    if not ok:
+        # early and not moved far enough: nothing new for the risk rules, skip the write
+        resp = jsonify({"ok": False, "msg": "Fix sent before the granted report interval",
+                        "retry_after": retry_after, "report": report_limiter.policy(user)})
+        resp.status_code = 429
+        resp.headers["Retry-After"] = str(retry_after)
+        return resp
+    print(f"[LOC] {user} lat={lat} lon={lon} acc={acc} ts={ts}")
+
+    with span("trajectory"):
+        trajectories.append(user, ts, lat, lon)
+    with span("db_locs"), db() as conn:
+        conn.execute("INSERT INTO locs(user, ts, lat, lon, acc) VALUES(?,?,?,?,?)",
+                     (user, ts, lat, lon, acc))
+
+    risk = _apply_location_risk(user, lat, lon, ts)
+    return jsonify({"ok": True, "risk_action": risk.get("action", "NONE"),
+                    "reason": risk.get("reason", ""), "evidence": risk.get("evidence", ""),
+                    "unknown": risk.get("unknown", []), "report": risk["report"]})
+
+@app.post("/loc/batch")
+def loc_batch():
+    """
+    Bulk ingest of buffered fixes.
+    Body: {"user": "...", "fixes": [{user?, lat, lon, acc, ts}, ...]} or a bare list of fixes.
+    All rows are written in one transaction; risk is evaluated once per user on the newest fix.
+    Buffered fixes are not rate limited; the newest one sets the user's next report cadence.
+    """
+    data = request.get_json(force=True, silent=True)
+    if isinstance(data, dict):
+        default_user = data.get("user", "user")
+        fixes = data.get("fixes")
+    else:
+        default_user, fixes = "user", data
+    if not isinstance(fixes, list) or not fixes:
+        return jsonify({"ok": False, "msg": "Send JSON with a non-empty 'fixes' array"}), 400
+
+    rows, bad = [], 0
+    for fx in fixes:
+        try:
+            rows.append(_parse_fix(fx, default_user))
+        except (TypeError, ValueError, AttributeError):
+            bad += 1
+    if not rows:
+        return jsonify({"ok": False, "msg": "No valid fixes", "rejected": bad}), 400
+
+    with span("trajectory"):
+        for user, ts, lat, lon, acc in sorted(rows, key=lambda r: r[1]):
+            trajectories.append(user, ts, lat, lon)
+    with span("db_locs"), db() as conn:
+        conn.executemany("INSERT INTO locs(user, ts, lat, lon, acc) VALUES(?,?,?,?,?)", rows)
+
+    newest = {}
+    for user, ts, lat, lon, acc in rows:
+        if user not in newest or ts >= newest[user][0]:
+            newest[user] = (ts, lat, lon)
+    print(f"[LOC/BATCH] {len(rows)} fixes for {len(newest)} user(s), rejected={bad}")
+
+    results = {}
+    for user, (ts, lat, lon) in newest.items():
+        risk = _apply_location_risk(user, lat, lon, ts)
+        results[user] = {"risk_action": risk.get("action", "NONE"),
+                         "reason": risk.get("reason", ""), "evidence": risk.get("evidence", ""),
+                         "report": risk["report"]}
+
+    return jsonify({"ok": True, "accepted": len(rows), "rejected": bad, "users": results})
 
 @app.post("/voice_score")
 def voice_score():
-    global active_model, active_scaler, active_flag
-    if active_model is None:
-        return jsonify({"ok": False, "msg": "Voice model not loaded"}), 503
+    vm = models.get()
+    if vm is None:
+        return _model_unavailable()
     if "audio" not in request.files:
         return jsonify({"ok": False, "msg": "Send form-data with key 'audio'"}), 400
 
@@ -215,53 +419,186 @@ def voice_score():
     try:
         f = request.files["audio"]
         suffix = os.path.splitext(f.filename or "upload")[1].lower()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(f.read()); tmp.flush(); tmp_path = tmp.name
+        buf = f.read()
+        h = content_hash(buf)
+        idem_key = (request.headers.get("Idempotency-Key") or request.form.get("idempotency_key")
+                    or f"{user}:{h}")
+
+        def score_and_alert():
+            prob, source, gate = _score_cached(vm, buf, suffix, h)
+            label = _record_voice_result(user, prob, lat, lon)
+            return {"ok": True, "distress_prob": prob, "distress_label": label, "cache": source, "gate": gate}
+
+        body, replayed = voice_idem.run(f"{user}|{idem_key}", score_and_alert)
+        return jsonify({**body, "replayed": replayed})
+
+    except PoolBusy as e:
+        return _busy_response(e)
+    except InFlight as e:
+        # only the idempotency wait means "duplicate still running"
+        return jsonify({"ok": False, "msg": str(e)}), 409
+    except (TimeoutError, FutureTimeout):     # distinct classes before Python 3.11
+        # a slow inference (pool future / decode): the server is overloaded, not the request duplicated
+        resp = jsonify({"ok": False, "msg": "Voice scoring timed out", "retry_after": 2})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = "2"
+        return resp
+    except Exception as e:
+        app.logger.exception("Error in /voice_score")
+        return jsonify({"ok": False, "msg": str(e)}), 500
+
+VOICE_BATCH_MAX_FILES = int(os.getenv("VOICE_BATCH_MAX_FILES", "64"))   # 'audio' parts per request
+
+@app.post("/voice_score/batch")
+def voice_score_batch():
+    """
+    Score many clips in one multipart request (repeat the 'audio' key).
+    Clips are decoded individually, featurized as one padded (N, 4*sr) batch
+    and scored with a single model call (in a pool worker when enabled).
+    Pure scoring: no alerts are recorded.
+    """
+    vm = models.get()
+    if vm is None:
+        return _model_unavailable()
+    files = request.files.getlist("audio")
+    if not files:
+        return jsonify({"ok": False, "msg": "Send form-data with one or more 'audio' parts"}), 400
+    if len(files) > VOICE_BATCH_MAX_FILES:
+        return jsonify({"ok": False, "msg": f"At most {VOICE_BATCH_MAX_FILES} 'audio' parts per request"}), 413
+    try:
+        thr = float(request.form.get("threshold", 0.6))
+    except ValueError:
+        return jsonify({"ok": False, "msg": "threshold must be a number"}), 400
+
+    results, signals, idx, keys = [], [], [], []
+    version = models.version
+    for i, f in enumerate(files):
+        name = f.filename or f"clip_{i}"
+        results.append({"file": name, "ok": True})
+        try:
+            buf = f.read()
+            key = (content_hash(buf), version)
+            cached = voice_results.get(key)
+            if cached is not None:
+                results[-1].update(distress_prob=cached[0], gate=cached[1],
+                                   distress_label="distress" if cached[0] >= thr else "normal")
+                continue
+            y, gate = _gate(_decode(buf, os.path.splitext(name)[1].lower(), vm.sr), vm.sr)
+            if y is None:
+                voice_results.put(key, (0.0, gate))
+                results[-1].update(distress_prob=0.0, distress_label="normal", gate=gate)
+                continue
+            signals.append(y)
+            idx.append(i)
+            keys.append(key)
+        except Exception as e:
+            results[-1] = {"file": name, "ok": False, "msg": str(e)}
+
+    if signals:
         try:
-            wav_bytes = convert_to_wav_bytes(tmp_path)
+            probs = _score_signals(vm, signals)
+        except PoolBusy as e:
+            return _busy_response(e)
         except Exception as e:
-            app.logger.error("Conversion failed: %s", e)
-            with open(tmp_path, "rb") as fh: wav_bytes = fh.read()
-        os.unlink(tmp_path)
-
-        feats = _featurize_wav_bytes(wav_bytes)
-        prob = float(active_model.predict_proba(feats)[0, 1]) if active_flag == "CUSTOM" \
-            else float(active_model.predict(active_scaler.transform(feats), verbose=0)[0][0])
-        label = "distress" if prob >= 0.6 else "normal"
-
-        ts = int(time.time())
-        conn = db()
-        conn.execute("INSERT INTO alerts(user, ts, type, summary) VALUES(?,?,?,?)",
-                     (user, ts, "VOICE", f"Voice inference: {label} (p={prob:.2f})"))
-        conn.commit(); conn.close()
-
-        if label == "distress":
-            latf, lonf = None, None
-            try:
-                if lat and lon:
-                    latf, lonf = float(lat), float(lon)
-                else:
-                    latf, lonf = get_last_location(user)
-            except:
-                pass
-            osm = f"\nhttps://www.openstreetmap.org/?mlat={latf}&mlon={lonf}#map=18/{latf}/{lonf}" if latf and lonf else ""
-            send_telegram(f"🗣️ Voice distress detected for {user} (p={prob:.2f}){osm}")
-
-            if prob >= 0.75:
-                ts2 = int(time.time())
-                summary2 = f"AUTO-SOS (voice) for {user} at {latf},{lonf} (p={prob:.2f})"
-                conn = db()
-                conn.execute("INSERT INTO alerts(user, ts, type, summary, reason, evidence) VALUES(?,?,?,?,?,?)",
-                             (user, ts2, "SOS", summary2, "voice_confident", f"p={prob:.2f}"))
-                conn.commit(); conn.close()
-                send_telegram(f"🚨 {summary2}{osm}")
-
-        return jsonify({"ok": True, "distress_prob": prob, "distress_label": label})
+            app.logger.exception("Error in /voice_score/batch")
+            return jsonify({"ok": False, "msg": str(e)}), 500
+        for i, p, key in zip(idx, probs, keys):
+            voice_results.put(key, (float(p), "ok"))
+            results[i]["gate"] = "ok"
+            results[i]["distress_prob"] = float(p)
+            results[i]["distress_label"] = "distress" if p >= thr else "normal"
+
+    return jsonify({"ok": True, "count": len(results), "results": results})
 
+# -------------------------------------------------------------------
+# Streaming voice: chunked upload, sliding 4 s windows
+#   POST /voice_stream/start            form: user, lat, lon   -> {stream_id}
+#   POST /voice_stream/<id>/chunk       body: raw PCM16 mono at the model rate
+#                                       (?format=pcm16, default) or any decodable clip
+#   POST /voice_stream/<id>/end         -> summary
+# -------------------------------------------------------------------
+STREAM_STEP_S = float(os.getenv("VOICE_STREAM_STEP_S", "1.0"))
+STREAM_IDLE_S = int(os.getenv("VOICE_STREAM_IDLE_S", "120"))
+STREAM_MAX    = int(os.getenv("VOICE_STREAM_MAX", "64"))      # open streams; each holds ~5 s of audio + frames
+_streams = {}
+_streams_lock = threading.Lock()
+
+def _expire_streams(now):
+    with _streams_lock:
+        for sid in [k for k, st in _streams.items() if now - st["last_seen"] > STREAM_IDLE_S]:
+            _streams.pop(sid, None)
+
+def _stream_chunk_signal(body, fmt, sr):
+    if fmt == "pcm16":
+        return np.frombuffer(body[:len(body) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+    if fmt == "f32":
+        return np.frombuffer(body[:len(body) // 4 * 4], dtype="<f4")
+    return _decode(body, "." + fmt if fmt else "", sr)
+
+@app.post("/voice_stream/start")
+def voice_stream_start():
+    vm = models.get()
+    if vm is None:
+        return _model_unavailable()
+    now = time.time()
+    _expire_streams(now)
+    sid = uuid.uuid4().hex
+    with _streams_lock:
+        if len(_streams) >= STREAM_MAX:
+            resp = jsonify({"ok": False, "msg": "Too many open voice streams", "retry_after": 5})
+            resp.status_code = 503
+            resp.headers["Retry-After"] = "5"
+            return resp
+        _streams[sid] = {
+            "user": request.form.get("user", "user"),
+            "lat": request.form.get("lat"), "lon": request.form.get("lon"),
+            "stream": VoiceStream(vm.sr, vm.n_mfcc, vm.predict_proba, step_s=STREAM_STEP_S),
+            "fired": False, "last_seen": now, "lock": threading.Lock(),
+        }
+    return jsonify({"ok": True, "stream_id": sid, "sr": vm.sr, "format": "pcm16"})
+
+def _stream_windows(st, new):
+    # fire the distress path on the first window over threshold
+    if new and not st["fired"]:
+        best = max(p for _, p in new)
+        if best >= 0.6:
+            st["fired"] = True
+            _record_voice_result(st["user"], best, st["lat"], st["lon"], source="voice-stream")
+    return [{"t": t, "distress_prob": p} for t, p in new]
+
+@app.post("/voice_stream/<sid>/chunk")
+def voice_stream_chunk(sid):
+    with _streams_lock:
+        st = _streams.get(sid)
+    if st is None:
+        return jsonify({"ok": False, "msg": "Unknown or expired stream"}), 404
+    try:
+        y = _stream_chunk_signal(request.get_data(), request.args.get("format", "pcm16").lower(),
+                                 st["stream"].sr)
+        with st["lock"]:
+            st["last_seen"] = time.time()
+            windows = _stream_windows(st, st["stream"].push(y))
+            return jsonify({"ok": True, "windows": windows, "alerted": st["fired"]})
     except Exception as e:
-        app.logger.exception("Error in /voice_score")
+        app.logger.exception("Error in /voice_stream chunk")
         return jsonify({"ok": False, "msg": str(e)}), 500
 
+@app.post("/voice_stream/<sid>/end")
+def voice_stream_end(sid):
+    with _streams_lock:
+        st = _streams.pop(sid, None)
+    if st is None:
+        return jsonify({"ok": False, "msg": "Unknown or expired stream"}), 404
+    with st["lock"]:
+        vs = st["stream"]
+        windows = _stream_windows(st, vs.finish())
+        prob = vs.max_prob
+        if not st["fired"] and prob is not None:
+            _record_voice_result(st["user"], prob, st["lat"], st["lon"], source="voice-stream")
+    label = "distress" if prob is not None and prob >= 0.6 else "normal"
+    return jsonify({"ok": True, "windows": windows, "n_windows": len(vs.windows),
+                    "distress_prob": prob, "distress_label": label, "alerted": st["fired"]})
+
 @app.post("/sos")
 def manual_sos():
     data = request.get_json(force=True, silent=True) or {}
@@ -277,14 +614,132 @@ def manual_sos():
     summary = f"🚨 Manual SOS from {user} at {lat},{lon}" if lat and lon else f"🚨 Manual SOS from {user} (no location)"
     print(f"[MANUAL SOS] {summary}")
 
-    conn = db()
-    conn.execute("INSERT INTO alerts(user, ts, type, summary, reason, evidence) VALUES(?,?,?,?,?,?)",
-                 (user, ts, "SOS", summary, "manual_trigger", f"lat={lat},lon={lon}"))
-    conn.commit(); conn.close()
+    # manual SOS is never coalesced: always a new alerts row and a message
+    with span("incident"):
+        incidents.trigger(user, "SOS", "SOS", summary, "manual_trigger", f"lat={lat},lon={lon}", ts,
+                          force=True, lat=lat, lon=lon)
+    ALERTS.inc(type="SOS")
+    report_limiter.reset(user)
 
     osm = f"\nhttps://www.openstreetmap.org/?mlat={lat}&mlon={lon}#map=18/{lat}/{lon}" if lat and lon else ""
-    send_telegram(f"{summary}{osm}")
-    return jsonify({"ok": True, "msg": "SOS sent", "lat": lat, "lon": lon})
+    send_telegram(f"{summary}{osm}", sos=True)
+    return jsonify({"ok": True, "msg": "SOS sent", "lat": lat, "lon": lon,
+                    "report": reporting_policy("SOS", {})})
+
+@app.get("/history/<user>")
+def loc_history(user):
+    """Fixes in [start, end] (unix seconds; default last 24 h), SQLite + archive stitched."""
+    try:
+        end = int(request.args.get("end", time.time()))
+        start = int(request.args.get("start", end - 24 * 3600))
+    except ValueError:
+        return jsonify({"ok": False, "msg": "start and end must be unix seconds"}), 400
+    ts, lat, lon, acc = locs_history(user, start, end)
+    return jsonify({"ok": True, "user": user, "count": int(len(ts)),
+                    "fixes": [{"ts": int(t), "lat": float(a), "lon": float(o), "acc": float(c)}
+                              for t, a, o, c in zip(ts, lat, lon, acc)]})
+
+@app.get("/nearby")
+def nearby():
+    """Users whose latest fix is within `radius` m of lat/lon (e.g. responders near an SOS)."""
+    try:
+        lat, lon = float(request.args["lat"]), float(request.args["lon"])
+    except (KeyError, ValueError):
+        return jsonify({"ok": False, "msg": "lat and lon are required"}), 400
+    try:
+        radius = min(float(request.args.get("radius", 500)), 50000)
+        max_age = request.args.get("max_age")
+        max_age = float(max_age) if max_age else None
+        limit = int(request.args.get("limit", 200))
+    except ValueError:
+        return jsonify({"ok": False, "msg": "radius, max_age and limit must be numbers"}), 400
+    with db() as conn:
+        users = users_within(conn, lat, lon, radius, max_age_s=max_age,
+                             exclude=request.args.get("exclude"), limit=limit)
+    return jsonify({"ok": True, "count": len(users), "users": users})
+
+@app.get("/alerts/area")
+def alerts_area():
+    """Alerts inside south/west/north/east, optionally within start..end and of ?type=A,B."""
+    try:
+        s, w, n, e = (float(request.args[k]) for k in ("south", "west", "north", "east"))
+    except (KeyError, ValueError):
+        return jsonify({"ok": False, "msg": "south, west, north and east are required"}), 400
+    try:
+        start, end = (int(request.args[k]) if request.args.get(k) else None for k in ("start", "end"))
+        limit = int(request.args.get("limit", 1000))
+    except ValueError:
+        return jsonify({"ok": False, "msg": "start, end and limit must be integers"}), 400
+    types = [t for t in request.args.get("type", "").split(",") if t]
+    with db() as conn:
+        rows = alerts_in_bbox(conn, s, w, n, e, start=start, end=end, types=types, limit=limit)
+    return jsonify({"ok": True, "count": len(rows), "alerts": rows})
+
+@app.get("/incidents/<user>")
+def incident_current(user):
+    return jsonify({"ok": True, "incident": incidents.current(user)})
+
+@app.post("/incidents/<user>/resolve")
+def incident_resolve(user):
+    # "I'm safe" from the app, or a guardian closing the incident
+    data = request.get_json(force=True, silent=True) or {}
+    closed = incidents.resolve(user, reason=data.get("reason", "manual"))
+    return jsonify({"ok": True, "resolved": closed})
+
+@app.get("/healthz")
+def healthz():
+    # liveness: the process is up and serving; says nothing about the voice model
+    return jsonify({"ok": True})
+
+@app.get("/readyz")
+def readyz():
+    info = models.info()
+    info["pool_workers"] = VOICE_WORKERS if voice_pool is not None else 0
+    return jsonify({"ok": info["ready"], "model": info}), (200 if info["ready"] else 503)
+
+MODEL_RELOAD_MIN_S = float(os.getenv("MODEL_RELOAD_MIN_S", "30"))   # min spacing of forced reloads
+_last_reload = [0.0]
+_reload_lock = threading.Lock()
+
+def models_reload():
+    # a forced check can reload the model and respawn the inference pool: one per MODEL_RELOAD_MIN_S
+    with _reload_lock:
+        wait = _last_reload[0] + MODEL_RELOAD_MIN_S - time.monotonic()
+        if wait > 0:
+            retry_after = int(wait) + 1
+            resp = jsonify({"ok": False, "msg": "Reload rate limited", "retry_after": retry_after})
+            resp.status_code = 429
+            resp.headers["Retry-After"] = str(retry_after)
+            return resp
+        _last_reload[0] = time.monotonic()
+    swapped = models.reload(force=bool(request.args.get("force")))
+    return jsonify({"ok": models.ready, "swapped": swapped, "model": models.info()})
+
+# unauthenticated operator endpoint (the file poller covers normal deploys): opt-in per host
+if os.getenv("SHE_MODEL_RELOAD_API", "0") == "1":
+    app.add_url_rule("/models/reload", view_func=models_reload, methods=["POST"])
+
+@app.get("/metrics")
+def metrics_text():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+def debug_profile():
+    """
+    POST ?on=1 starts the sampling profiler, ?on=0 stops it.
+    GET returns folded stacks (?top=N), ready for flamegraph.pl / speedscope.
+    """
+    if request.method == "POST":
+        if request.args.get("on", "1") == "1":
+            changed = metrics.profiler.start(reset=request.args.get("reset", "1") == "1")
+        else:
+            changed = metrics.profiler.stop()
+        return jsonify({"ok": True, "running": metrics.profiler.running, "changed": changed,
+                        "samples": metrics.profiler.samples})
+    return Response(metrics.profiler.folded(int(request.args.get("top", 0))), mimetype="text/plain")
+
+# exposes stack internals and is unauthenticated: only registered when a host opts in
+if os.getenv("SHE_DEBUG_PROFILE", "0") == "1":
+    app.add_url_rule("/debug/profile", view_func=debug_profile, methods=["GET", "POST"])
 
 @app.get("/alert_test")
 def alert_test():
@@ -294,6 +749,9 @@ def alert_test():
 if __name__ == "__main__":
     print("🚀 Running server.py from:", os.path.abspath(__file__), flush=True)
     init_db()
+    if notifier.configured:
+        notifier.start()    # also resumes anything left in the outbox
+    retention.start()
     for rule in app.url_map.iter_rules():
         print(f"{rule.methods}  {rule}", flush=True)
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=os.getenv("FLASK_DEBUG", "1") == "1")
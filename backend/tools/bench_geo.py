@@ -0,0 +1,71 @@
+# bench_geo.py: scalar math-loop vs utils/geo vectorized distance maths on a synthetic trajectory
+#   python tools/bench_geo.py --n 10000
+import os, sys, time, argparse
+from math import radians, sin, cos, asin, sqrt
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils import geo
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    # the pre-geo.py implementation, called once per point
+    R = 6371000
+    phi1, phi2 = radians(lat1), radians(lat2)
+    dphi = radians(lat2 - lat1)
+    dl = radians(lon2 - lon1)
+    a = sin(dphi / 2) ** 2 + cos(phi1) * cos(phi2) * sin(dl / 2) ** 2
+    return 2 * R * asin(sqrt(a))
+
+def synthetic_trace(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = 23.64748 + np.cumsum(rng.normal(0, 2e-5, n))
+    lon = 88.12385 + np.cumsum(rng.normal(0, 2e-5, n))
+    ts = np.arange(n) * 3
+    return ts, lat, lon
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter(); out = fn(); best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main():
+    p = argparse.ArgumentParser(description="Microbenchmark for utils/geo.py")
+    p.add_argument("--n", type=int, default=10000, help="Trajectory length")
+    p.add_argument("--repeat", type=int, default=5)
+    args = p.parse_args()
+    ts, lat, lon = synthetic_trace(args.n)
+    la, lo = lat.tolist(), lon.tolist()
+
+    cases = [
+        ("point-to-many haversine",
+         lambda: [scalar_haversine(la[-1], lo[-1], a, b) for a, b in zip(la, lo)],
+         lambda: geo.haversine_to_many(lat[-1], lon[-1], lat, lon)),
+        ("equirect point-to-many", None,
+         lambda: geo.equirect_distance(lat[-1], lon[-1], lat, lon)),
+        ("radius count (200 m)",
+         lambda: sum(1 for a, b in zip(la, lo) if scalar_haversine(la[0], lo[0], a, b) <= 200),
+         lambda: geo.count_within(lat[0], lon[0], lat, lon, 200)),
+        ("dwell-from-end (15 m)",
+         lambda: next((int(ts[-1] - ts[i + 1]) for i in range(len(la) - 1, -1, -1)
+                       if scalar_haversine(la[-1], lo[-1], la[i], lo[i]) >= 15), int(ts[-1] - ts[0])),
+         lambda: geo.dwell_from_end(ts, lat, lon, 15)),
+        ("dwell radius", None, lambda: geo.dwell_radius(lat, lon)),
+    ]
+    print(f"📏 geo microbenchmark: n={args.n}, best of {args.repeat}\n")
+    print(f"{'case':28s} {'scalar loop':>12s} {'vectorized':>12s} {'speed-up':>9s}")
+    for name, slow, fast in cases:
+        tf, _ = timeit(fast, args.repeat)
+        if slow is None:
+            print(f"{name:28s} {'-':>12s} {tf * 1e3:10.3f}ms {'-':>9s}")
+            continue
+        ts_, _ = timeit(slow, args.repeat)
+        print(f"{name:28s} {ts_ * 1e3:10.3f}ms {tf * 1e3:10.3f}ms {ts_ / tf:8.1f}x")
+
+    d_h = geo.haversine_to_many(lat[-1], lon[-1], lat, lon)
+    d_e = geo.equirect_distance(lat[-1], lon[-1], lat, lon)
+    ok = d_h > 1
+    print(f"\nequirect max relative error vs haversine: {np.max(np.abs(d_e[ok] - d_h[ok]) / d_h[ok]):.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# build_poi_index.py: build the offline POI index from a local OSM extract
+#   python tools/build_poi_index.py data/fixtures/pois_sample.geojson data/poi_index
+#   python tools/build_poi_index.py india-latest.osm.pbf data/poi_index   (needs pyosmium)
+import os, sys, json, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils.poi_index import build_index, POI_CELL_DEG
+
+def read_geojson(path, any_tag=False):
+    with open(path, encoding="utf-8") as fh:
+        gj = json.load(fh)
+    feats = gj.get("features", []) if gj.get("type") == "FeatureCollection" else [gj]
+    lat, lon = [], []
+    for ft in feats:
+        props = ft.get("properties") or {}
+        if not any_tag and "amenity" not in props:
+            continue
+        geom = ft.get("geometry") or {}
+        if geom.get("type") == "Point":
+            coords = [geom["coordinates"]]
+        elif geom.get("type") == "MultiPoint":
+            coords = geom["coordinates"]
+        else:
+            continue
+        for x, y in (c[:2] for c in coords):
+            lon.append(float(x)); lat.append(float(y))
+    return lat, lon
+
+def read_pbf(path):
+    try:
+        import osmium  # pip install osmium
+    except ImportError:
+        sys.exit("Reading .pbf needs pyosmium (pip install osmium); or export amenity nodes to GeoJSON.")
+
+    class AmenityNodes(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.lat, self.lon = [], []
+
+        def node(self, n):
+            if "amenity" in n.tags and n.location.valid():
+                self.lat.append(n.location.lat); self.lon.append(n.location.lon)
+
+    h = AmenityNodes()
+    h.apply_file(path)
+    return h.lat, h.lon
+
+def main():
+    p = argparse.ArgumentParser(description="Build the offline amenity index used by poi_density.")
+    p.add_argument("src", help="OSM extract: .geojson/.json or .osm.pbf")
+    p.add_argument("out", help="Output index directory (POI_INDEX_DIR)")
+    p.add_argument("--cell-deg", type=float, default=POI_CELL_DEG, help="Grid cell size in degrees")
+    p.add_argument("--any-tag", action="store_true", help="GeoJSON: keep points without an 'amenity' property")
+    args = p.parse_args()
+
+    if args.src.endswith(".pbf"):
+        lat, lon = read_pbf(args.src)
+    else:
+        lat, lon = read_geojson(args.src, args.any_tag)
+    meta = build_index(lat, lon, args.out, cell_deg=args.cell_deg, source=os.path.basename(args.src))
+    print(f"✅ Indexed {meta['count']} POIs -> {args.out}  bbox={meta['bbox']}")
+
+if __name__ == "__main__":
+    main()
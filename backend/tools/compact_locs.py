@@ -0,0 +1,26 @@
+# compact_locs.py: run one locs retention pass by hand (same job the server runs hourly)
+#   python tools/compact_locs.py                 # archive > 30 d, downsample > 24 h, vacuum
+#   python tools/compact_locs.py --hot-h 6 --archive-d 7
+#   python tools/compact_locs.py --enable-incremental-vacuum   # one-off, server stopped
+import os, sys, json, argparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.retention import RetentionJob, LOCS_HOT_S, LOCS_ARCHIVE_S, RETAIN_DP_EPS_M, enable_incremental_vacuum
+from utils.storage import DB_PATH
+
+def main():
+    p = argparse.ArgumentParser(description="Downsample and archive old rows of the locs table.")
+    p.add_argument("--hot-h", type=float, default=LOCS_HOT_S / 3600, help="Full-resolution window (hours)")
+    p.add_argument("--archive-d", type=float, default=LOCS_ARCHIVE_S / 86400, help="Archive rows older than (days)")
+    p.add_argument("--eps-m", type=float, default=RETAIN_DP_EPS_M, help="Douglas-Peucker tolerance (m)")
+    p.add_argument("--enable-incremental-vacuum", action="store_true",
+                   help="Switch an older database to incremental auto_vacuum (full VACUUM; stop the server first)")
+    a = p.parse_args()
+    if a.enable_incremental_vacuum:
+        print(f"[DB] full VACUUM of {DB_PATH} ...", flush=True)
+        mode = enable_incremental_vacuum(DB_PATH)
+        print(f"[DB] auto_vacuum={mode} (2 = INCREMENTAL)")
+    job = RetentionJob(hot_s=int(a.hot_h * 3600), archive_s=int(a.archive_d * 86400), eps_m=a.eps_m)
+    print(json.dumps(job.run_once(), indent=2))
+
+if __name__ == "__main__":
+    main()
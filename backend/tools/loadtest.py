@@ -0,0 +1,328 @@
+# loadtest.py: concurrent load + latency benchmark for the backend
+# Spawns server.py against local Telegram/Overpass stubs (or targets --url), drives
+# /loc, /loc/batch, /voice_score, /voice_score/batch and /sos at fixed arrival rates,
+# and reports p50/p95/p99 latency of 2xx replies, throughput and error rate (every
+# non-2xx; 429/503 are also counted per code under "rejected") as diffable JSON.
+#   python tools/loadtest.py --duration 30 --loc-rps 200 --voice-rps 5 --sos-rps 1 --out bench.json
+#   python tools/loadtest.py --compare old.json new.json
+import os, sys, io, re, json, math, time, wave, random, signal, argparse, tempfile, threading, subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# -------------------------------------------------------------------
+# Stub services
+# -------------------------------------------------------------------
+class _Stub(BaseHTTPRequestHandler):
+    def log_message(self, *a):
+        pass
+
+    def _reply(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+        st = self.server.state
+        if st["delay_s"]:
+            time.sleep(st["delay_s"])
+        if "/sendMessage" in self.path:
+            now = time.perf_counter()
+            text = json.loads(raw or b"{}").get("text", "")
+            with st["lock"]:
+                st["messages"] += 1
+                for marker in re.findall(r"lt-sos-[0-9a-f]+", text):
+                    st["received"].setdefault(marker, now)
+            return self._reply(200, {"ok": True, "result": {}})
+        if "interpreter" in self.path:
+            # a handful of amenity nodes scattered around the query bbox
+            m = re.search(r"node\(([-\d.]+),([-\d.]+),([-\d.]+),([-\d.]+)\)", raw.decode(errors="replace"))
+            els = []
+            if m:
+                s, w, n, e = map(float, m.groups())
+                els = [{"type": "node", "lat": random.uniform(s, n), "lon": random.uniform(w, e)}
+                       for _ in range(random.randint(0, 12))]
+            return self._reply(200, {"elements": els})
+        self._reply(404, {"ok": False})
+
+def start_stub(delay_s=0.0):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    srv.state = {"lock": threading.Lock(), "messages": 0, "received": {}, "delay_s": delay_s}
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}"
+
+# -------------------------------------------------------------------
+# Synthetic inputs
+# -------------------------------------------------------------------
+class GpsWalker:
+    """Random walk that alternates between moving and standing still."""
+    def __init__(self, user, lat=23.64748, lon=88.12385):
+        self.user, self.lat, self.lon = user, lat + random.uniform(-0.01, 0.01), lon + random.uniform(-0.01, 0.01)
+        self.still_until = 0
+
+    def fix(self):
+        now = time.time()
+        if now >= self.still_until:
+            if random.random() < 0.05:
+                self.still_until = now + random.uniform(30, 300)
+            else:
+                self.lat += random.gauss(0, 5e-5); self.lon += random.gauss(0, 5e-5)
+        return {"user": self.user, "lat": self.lat + random.gauss(0, 2e-6), "lon": self.lon + random.gauss(0, 2e-6),
+                "acc": random.uniform(3, 25), "ts": int(now)}
+
+def synth_wav(seconds=3.0, sr=16000, loud=False):
+    """Mono PCM16 WAV: noise floor plus a few tone bursts (louder/harsher when `loud`)."""
+    n = int(seconds * sr)
+    amp = 0.6 if loud else 0.15
+    f0 = random.uniform(180, 320) * (1.6 if loud else 1.0)
+    frames = bytearray()
+    for i in range(n):
+        burst = 1.0 if (i // (sr // 4)) % 2 == 0 else 0.2
+        v = amp * burst * math.sin(2 * math.pi * f0 * i / sr) + random.gauss(0, 0.01)
+        frames += int(max(-1.0, min(1.0, v)) * 32767).to_bytes(2, "little", signed=True)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1); w.setsampwidth(2); w.setframerate(sr); w.writeframes(bytes(frames))
+    return buf.getvalue()
+
+# -------------------------------------------------------------------
+# Load driver
+# -------------------------------------------------------------------
+_tls = threading.local()
+
+def _session():
+    s = getattr(_tls, "s", None)
+    if s is None:
+        s = _tls.s = requests.Session()
+    return s
+
+REJECT_CODES = (429, 503)    # load shedding / not ready: reported apart from other errors
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}    # name -> [(latency_s, status)]; status None = no HTTP reply
+
+    def add(self, name, latency, status):
+        with self.lock:
+            self.samples.setdefault(name, []).append((latency, status))
+
+def _pct(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, max(0, int(math.ceil(q / 100 * len(sorted_vals))) - 1))
+    return sorted_vals[k]
+
+def summarize(samples, duration):
+    out = {}
+    for name, rows in sorted(samples.items()):
+        # percentiles over 2xx replies only: a fast 429/503 is not a fast request
+        lat = sorted(l for l, st in rows if st is not None and 200 <= st < 300)
+        errors = len(rows) - len(lat)
+        rejected = {}
+        for _, st in rows:
+            if st in REJECT_CODES:
+                rejected[str(st)] = rejected.get(str(st), 0) + 1
+        out[name] = {
+            "requests": len(rows), "errors": errors, "rejected": rejected,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "throughput_rps": round(len(rows) / duration, 2),
+            "p50_ms": _ms(_pct(lat, 50)), "p95_ms": _ms(_pct(lat, 95)),
+            "p99_ms": _ms(_pct(lat, 99)), "max_ms": _ms(lat[-1] if lat else None),
+        }
+    return out
+
+def _ms(v):
+    return None if v is None else round(v * 1000, 2)
+
+def run_load(base, args, stub):
+    rec = Recorder()
+    walkers = [GpsWalker(f"lt-user-{i}") for i in range(args.users)]
+    clips = [synth_wav(loud=(i % 3 == 0)) for i in range(8)]
+    sos_sent = {}
+
+    def call(name, fn):
+        t0 = time.perf_counter()
+        try:
+            status = fn().status_code
+        except Exception:
+            status = None
+        rec.add(name, time.perf_counter() - t0, status)
+
+    def do_loc():
+        call("loc", lambda: _session().post(f"{base}/loc", json=random.choice(walkers).fix(), timeout=30))
+
+    def do_loc_batch():
+        w = random.choice(walkers)
+        fixes = [w.fix() for _ in range(args.batch_size)]
+        call("loc_batch", lambda: _session().post(f"{base}/loc/batch", json={"user": w.user, "fixes": fixes}, timeout=30))
+
+    def do_voice():
+        call("voice_score", lambda: _session().post(
+            f"{base}/voice_score", files={"audio": ("clip.wav", random.choice(clips), "audio/wav")},
+            data={"user": random.choice(walkers).user}, timeout=60))
+
+    def do_voice_batch():
+        files = [("audio", (f"c{i}.wav", random.choice(clips), "audio/wav")) for i in range(args.batch_size)]
+        call("voice_batch", lambda: _session().post(f"{base}/voice_score/batch", files=files, timeout=120))
+
+    def do_sos():
+        marker = f"lt-sos-{random.getrandbits(48):012x}"
+        w = random.choice(walkers)
+        sos_sent[marker] = time.perf_counter()
+        call("sos", lambda: _session().post(
+            f"{base}/sos", json={"user": marker, "coords": {"latitude": w.lat, "longitude": w.lon}}, timeout=30))
+
+    plan = [(do_loc, args.loc_rps), (do_loc_batch, args.loc_batch_rps), (do_voice, args.voice_rps),
+            (do_voice_batch, args.voice_batch_rps), (do_sos, args.sos_rps)]
+    plan = [(fn, rps) for fn, rps in plan if rps > 0]
+
+    pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    stop_at = time.perf_counter() + args.duration
+
+    def schedule(fn, rps):
+        # open-loop arrivals (Poisson), so a slow server can't throttle the offered load
+        nxt = time.perf_counter()
+        while nxt < stop_at:
+            now = time.perf_counter()
+            if nxt > now:
+                time.sleep(nxt - now)
+            pool.submit(fn)
+            nxt += random.expovariate(rps)
+
+    threads = [threading.Thread(target=schedule, args=p, daemon=True) for p in plan]
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    pool.shutdown(wait=True)
+    elapsed = time.perf_counter() - t0
+
+    # wait for queued SOS Telegram deliveries before computing end-to-end latency
+    deadline = time.perf_counter() + args.drain_s
+    while stub is not None and time.perf_counter() < deadline:
+        with stub.state["lock"]:
+            if all(m in stub.state["received"] for m in sos_sent):
+                break
+        time.sleep(0.1)
+
+    summary = summarize(rec.samples, elapsed)
+    if stub is not None and sos_sent:
+        with stub.state["lock"]:
+            got = stub.state["received"]
+            e2e = sorted(got[m] - t for m, t in sos_sent.items() if m in got)
+            msgs = stub.state["messages"]
+        summary["sos_end_to_end"] = {
+            "sent": len(sos_sent), "delivered": len(e2e),
+            "p50_ms": _ms(_pct(e2e, 50)), "p95_ms": _ms(_pct(e2e, 95)),
+            "p99_ms": _ms(_pct(e2e, 99)), "max_ms": _ms(e2e[-1] if e2e else None),
+        }
+        summary["telegram_messages"] = msgs
+    return summary, elapsed
+
+# -------------------------------------------------------------------
+# Server lifecycle
+# -------------------------------------------------------------------
+def spawn_server(port, stub_url, extra_env):
+    tmp = tempfile.mkdtemp(prefix="she-loadtest-")
+    env = dict(os.environ,
+               SHE_DB_PATH=os.path.join(tmp, "events.db"),
+               TELEGRAM_TOKEN="loadtest", TELEGRAM_CHAT_ID="1",
+               TELEGRAM_API_BASE=stub_url, OVERPASS_URL=f"{stub_url}/api/interpreter",
+               PORT=str(port), FLASK_DEBUG="0")
+    # walkers post at a fixed rate to measure the ingest path; the per-user
+    # report limiter would turn most of that into cheap 429s (--env REPORT_ENFORCE=1 to include it)
+    env.update({"REPORT_ENFORCE": "0", **extra_env})
+    proc = subprocess.Popen([sys.executable, "server.py"], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    live = False
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            sys.exit("server exited during start-up")
+        try:
+            if not live:
+                live = requests.get(f"{base}/healthz", timeout=1).status_code == 200
+            # voice endpoints 503 until the model is loaded; give it a while, then go anyway
+            elif requests.get(f"{base}/readyz", timeout=1).status_code == 200 or time.time() > deadline - 90:
+                return proc, base
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    if live:
+        return proc, base
+    proc.terminate()
+    sys.exit("server did not come up within 120 s")
+
+def compare(old_path, new_path):
+    old, new = (json.load(open(p, encoding="utf-8"))["results"] for p in (old_path, new_path))
+    print(f"{'endpoint':16s} {'metric':15s} {'old':>10s} {'new':>10s} {'delta':>8s}")
+    for name in sorted(set(old) | set(new)):
+        o, n = old.get(name, {}), new.get(name, {})
+        if not isinstance(o, dict) and not isinstance(n, dict):
+            continue
+        for k in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "error_rate"):
+            a, b = (o or {}).get(k), (n or {}).get(k)
+            if a is None and b is None:
+                continue
+            d = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else "-"
+            print(f"{name:16s} {k:15s} {str(a):>10s} {str(b):>10s} {d:>8s}")
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Concurrent load + latency benchmark for SHE-Guardian.")
+    p.add_argument("--url", default="", help="Target a running server instead of spawning one (stubs then unused)")
+    p.add_argument("--port", type=int, default=5055, help="Port for the spawned server")
+    p.add_argument("--duration", type=float, default=20, help="Seconds of load")
+    p.add_argument("--users", type=int, default=50, help="Simulated users")
+    p.add_argument("--concurrency", type=int, default=64, help="Client threads")
+    p.add_argument("--loc-rps", type=float, default=100)
+    p.add_argument("--loc-batch-rps", type=float, default=0)
+    p.add_argument("--voice-rps", type=float, default=2)
+    p.add_argument("--voice-batch-rps", type=float, default=0)
+    p.add_argument("--sos-rps", type=float, default=1)
+    p.add_argument("--batch-size", type=int, default=20, help="Fixes / clips per batch request")
+    p.add_argument("--stub-delay-ms", type=float, default=0, help="Artificial latency of the Telegram/Overpass stubs")
+    p.add_argument("--drain-s", type=float, default=30, help="Max wait for queued SOS deliveries")
+    p.add_argument("--env", action="append", default=[], help="Extra KEY=VALUE for the spawned server")
+    p.add_argument("--out", default="", help="Write JSON results here")
+    p.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Diff two result files and exit")
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    if args.compare:
+        return compare(*args.compare)
+
+    stub, proc = None, None
+    if args.url:
+        base = args.url.rstrip("/")
+    else:
+        stub, stub_url = start_stub(args.stub_delay_ms / 1000)
+        extra = dict(kv.split("=", 1) for kv in args.env)
+        proc, base = spawn_server(args.port, stub_url, extra)
+    print(f"🏋️ load: {args.duration}s against {base}  loc={args.loc_rps}/s batch={args.loc_batch_rps}/s "
+          f"voice={args.voice_rps}/s voice_batch={args.voice_batch_rps}/s sos={args.sos_rps}/s")
+    try:
+        results, elapsed = run_load(base, args, stub)
+    finally:
+        if proc is not None:
+            proc.send_signal(signal.SIGINT); proc.wait(timeout=10)
+
+    for name, r in results.items():
+        if isinstance(r, dict):
+            print(f"  {name:16s} " + "  ".join(f"{k}={v}" for k, v in r.items()))
+    report = {"config": {k: v for k, v in vars(args).items() if k not in ("compare", "out")},
+              "elapsed_s": round(elapsed, 2), "results": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+        print(f"\n📝 Saved results to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# replay_traces.py: offline replay of recorded GPS traces through the location risk rules
+# Vectorized over whole trajectories (no Flask, no DB, no Telegram); sweeps a
+# threshold grid across cores and reports alerts, time-to-alert and false alarms.
+#   python tools/replay_traces.py traces.csv --truth incidents.csv \
+#       --grid STAT_THR=120,180,300 --grid POI_THR=1,3,5 --poi-index data/poi_index --out sweep.json
+#
+# traces:  CSV/Parquet with user, ts, lat, lon [, voice_prob] [, poi_count]
+# truth:   CSV with user, start, end (unix seconds) for known real incidents
+import os, sys, csv, json, time, argparse, itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.geo import anchor_dwell
+from utils.trajectory import DWELL_RADIUS_M
+from utils.poi_cache import tile_of, tile_center, POI_TILE_DEG
+from agents import location_risk_agent as lra
+
+DEFAULTS = {"STAT_THR": lra.STAT_THR, "POI_THR": lra.POI_THR,
+            "POI_RADIUS_M": lra.POI_RADIUS_M, "VOICE_THR": lra.VOICE_THR}
+NONE, NOTIFY, AUTO_SOS = 0, 1, 2
+
+# -------------------------------------------------------------------
+# Inputs
+# -------------------------------------------------------------------
+def _read_rows(path):
+    if path.endswith((".parquet", ".pq")):
+        try:
+            import pandas as pd
+        except ImportError:
+            sys.exit("Parquet input needs pandas + pyarrow (pip install pandas pyarrow); or use CSV")
+        df = pd.read_parquet(path)
+        return {c: df[c].to_numpy() for c in df.columns}
+    with open(path, newline="", encoding="utf-8") as fh:
+        rows = list(csv.DictReader(fh))
+    if not rows:
+        sys.exit(f"{path}: no rows")
+    num = lambda v: np.asarray([float(x) if x not in ("", None) else np.nan for x in v])
+    return {c: np.asarray([r[c] for r in rows]) if c == "user" else num([r[c] for r in rows])
+            for c in rows[0]}
+
+class Trace:
+    __slots__ = ("user", "ts", "lat", "lon", "voice", "poi", "dwell", "night")
+
+def load_traces(path, dwell_radius_m=DWELL_RADIUS_M):
+    cols = _read_rows(path)
+    for c in ("user", "ts", "lat", "lon"):
+        if c not in cols:
+            sys.exit(f"{path}: missing column '{c}'")
+    users = np.asarray(cols["user"]).astype(str)
+    out = []
+    for u in np.unique(users):
+        m = users == u
+        ts = np.asarray(cols["ts"][m], dtype=np.int64)
+        o = np.argsort(ts, kind="stable")
+        t = Trace()
+        t.user, t.ts = u, ts[o]
+        t.lat = np.asarray(cols["lat"][m], dtype=np.float64)[o]
+        t.lon = np.asarray(cols["lon"][m], dtype=np.float64)[o]
+        t.voice = np.asarray(cols["voice_prob"][m], dtype=np.float64)[o] if "voice_prob" in cols \
+            else np.full(len(o), np.nan)
+        t.poi = np.asarray(cols["poi_count"][m], dtype=np.float64)[o] if "poi_count" in cols else None
+        # dwell and night do not depend on the swept thresholds: compute once
+        t.dwell = anchor_dwell(t.ts, t.lat, t.lon, dwell_radius_m)
+        local_hour = ((t.ts // 3600) % 24 + 5) % 24          # same +5 h shift as lra.is_night
+        t.night = (local_hour < 6) | (local_hour >= 20)
+        out.append(t)
+    return out
+
+def load_truth(path):
+    truth = {}
+    if not path:
+        return truth
+    with open(path, newline="", encoding="utf-8") as fh:
+        for r in csv.DictReader(fh):
+            truth.setdefault(r["user"], []).append((int(float(r["start"])), int(float(r["end"]))))
+    return truth
+
+class StubPoi:
+    """
+    POI counts without network: trace column, offline PoiIndex, or a constant
+    (None = unknown). Index answers are memoised per (tile, radius) exactly like
+    the live PoiCache, so a sweep only pays once per tile.
+    """
+    def __init__(self, index_dir=None, default=None, tile_deg=POI_TILE_DEG):
+        self.index = None
+        if index_dir:
+            from utils.poi_index import PoiIndex
+            self.index = PoiIndex.open(index_dir)
+            if self.index is None:
+                sys.exit(f"no POI index at {index_dir}")
+        self.default = default
+        self.tile_deg = tile_deg
+        self._memo = {}
+
+    def counts(self, trace, idx, radius_m):
+        if trace.poi is not None:
+            return trace.poi[idx]
+        if self.index is None:
+            return np.full(len(idx), np.nan if self.default is None else float(self.default))
+        out = np.empty(len(idx))
+        for k, i in enumerate(idx):
+            iy, ix = tile_of(trace.lat[i], trace.lon[i], self.tile_deg)
+            key = (iy, ix, int(radius_m))
+            c = self._memo.get(key)
+            if c is None:
+                clat, clon = tile_center(iy, ix, self.tile_deg)
+                c = self._memo[key] = (self.index.count(clat, clon, radius_m)
+                                       if self.index.covers(clat, clon) else np.nan)
+            out[k] = c
+        return out
+
+# -------------------------------------------------------------------
+# Vectorized evaluation (mirrors location_risk_agent.evaluate)
+# -------------------------------------------------------------------
+def evaluate_trace(t, p, poi):
+    """(N,) int8 actions for every fix of one trace under thresholds p."""
+    voice = t.voice
+    with np.errstate(invalid="ignore"):
+        voice_sos = voice >= p["VOICE_THR"]
+        weak_voice = voice > 0.2
+    stat = t.dwell >= p["STAT_THR"]
+    need = np.flatnonzero(stat & t.night & ~voice_sos)
+    isolated = np.zeros(len(t.ts), dtype=bool)
+    if need.size:
+        pd = poi.counts(t, need, p["POI_RADIUS_M"])
+        with np.errstate(invalid="ignore"):
+            isolated[need] = ~np.isnan(pd) & (pd <= p["POI_THR"])   # unknown never escalates
+    act = np.zeros(len(t.ts), dtype=np.int8)
+    act[stat | weak_voice] = NOTIFY
+    act[voice_sos | isolated] = AUTO_SOS
+    return act
+
+def _rising(mask):
+    return np.flatnonzero(mask & ~np.concatenate([[False], mask[:-1]]))
+
+def score(traces, truth, p, poi):
+    """Aggregate metrics for one configuration."""
+    fixes = alert_fixes = episodes = sos_episodes = false_eps = 0
+    hours = 0.0
+    windows = detected = sos_detected = 0
+    tta, tta_sos = [], []
+    for t in traces:
+        act = evaluate_trace(t, p, poi)
+        fixes += len(act)
+        hours += (t.ts[-1] - t.ts[0]) / 3600 if len(t.ts) > 1 else 0
+        alert = act > NONE
+        alert_fixes += int(alert.sum())
+        # an episode is a run of alerting fixes: what the incident agent turns into one incident
+        starts = _rising(alert)
+        episodes += len(starts)
+        sos_episodes += len(_rising(act == AUTO_SOS))
+        wins = truth.get(t.user, [])
+        in_any = np.zeros(len(starts), dtype=bool)
+        for s, e in wins:
+            windows += 1
+            in_any |= (t.ts[starts] >= s) & (t.ts[starts] <= e)
+            w = (t.ts >= s) & (t.ts <= e)
+            hit = np.flatnonzero(w & alert)
+            if hit.size:
+                detected += 1
+                tta.append(int(t.ts[hit[0]] - s))
+            hit = np.flatnonzero(w & (act == AUTO_SOS))
+            if hit.size:
+                sos_detected += 1
+                tta_sos.append(int(t.ts[hit[0]] - s))
+        false_eps += int((~in_any).sum())
+
+    med = lambda v: float(np.median(v)) if v else None
+    res = {"params": p, "fixes": fixes, "alert_fixes": alert_fixes, "episodes": episodes,
+           "auto_sos_episodes": sos_episodes, "episodes_per_user_hour": round(episodes / hours, 4) if hours else None}
+    if truth:
+        res.update({
+            "incidents": windows, "detected": detected, "recall": round(detected / windows, 4) if windows else None,
+            "auto_sos_recall": round(sos_detected / windows, 4) if windows else None,
+            "time_to_alert_median_s": med(tta), "time_to_auto_sos_median_s": med(tta_sos),
+            "false_alarms": false_eps,
+            "false_alarm_rate": round(false_eps / episodes, 4) if episodes else 0.0,
+            "false_alarms_per_user_hour": round(false_eps / hours, 4) if hours else None,
+        })
+    return res
+
+# -------------------------------------------------------------------
+# Parallel sweep (each worker loads the traces once)
+# -------------------------------------------------------------------
+_W = {}
+
+def _init_worker(traces_path, truth_path, poi_index, poi_default):
+    _W["traces"] = load_traces(traces_path)
+    _W["truth"] = load_truth(truth_path)
+    _W["poi"] = StubPoi(poi_index, poi_default)
+
+def _run_config(p):
+    return score(_W["traces"], _W["truth"], p, _W["poi"])
+
+def parse_grid(items):
+    grid = {k: [v] for k, v in DEFAULTS.items()}
+    for item in items:
+        k, _, vals = item.partition("=")
+        if k not in DEFAULTS:
+            sys.exit(f"unknown parameter {k}; choose from {', '.join(DEFAULTS)}")
+        grid[k] = [float(v) for v in vals.split(",") if v]
+    keys = list(grid)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(grid[k] for k in keys))]
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay GPS traces through the risk rules over a threshold grid.")
+    ap.add_argument("traces", help="CSV or Parquet: user, ts, lat, lon [, voice_prob, poi_count]")
+    ap.add_argument("--truth", default="", help="CSV of real incidents: user, start, end")
+    ap.add_argument("--grid", action="append", default=[], help="PARAM=v1,v2,... (repeatable)")
+    ap.add_argument("--poi-index", default="", help="Offline POI index dir (tools/build_poi_index.py)")
+    ap.add_argument("--poi-default", type=float, default=None, help="Constant POI count when no index/column")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--out", default="", help="Write JSON results here")
+    args = ap.parse_args()
+
+    configs = parse_grid(args.grid)
+    init = (args.traces, args.truth, args.poi_index or None, args.poi_default)
+    t0 = time.perf_counter()
+    if args.workers <= 1 or len(configs) == 1:
+        _init_worker(*init)
+        results = [_run_config(p) for p in configs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(configs)),
+                                 initializer=_init_worker, initargs=init) as ex:
+            results = list(ex.map(_run_config, configs, chunksize=max(1, len(configs) // (4 * args.workers))))
+    dt = time.perf_counter() - t0
+
+    keys = ["episodes", "auto_sos_episodes"] + (["recall", "time_to_alert_median_s", "false_alarm_rate"]
+                                                if args.truth else [])
+    print(f"{len(configs)} configuration(s) in {dt:.2f}s")
+    print("  ".join(f"{k:>12s}" for k in DEFAULTS) + "  " + "  ".join(f"{k:>12s}" for k in keys))
+    for r in results:
+        print("  ".join(f"{r['params'][k]:>12g}" for k in DEFAULTS) + "  " +
+              "  ".join(f"{str(r.get(k)):>12s}" for k in keys))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"traces": args.traces, "seconds": round(dt, 2), "results": results}, fh, indent=2)
+        print(f"\n📝 Saved results to {args.out}")
+
+if __name__ == "__main__":
+    main()
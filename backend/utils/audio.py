@@ -0,0 +1,83 @@
+# audio.py: decode uploaded audio straight from memory to mono float32 at the model rate
+import io, shutil, subprocess, importlib.util
+import numpy as np
+import soundfile as sf
+
+# containers libsndfile reads natively; everything else goes to the compressed-audio decoder
+SNDFILE_EXTS = {".wav", ".flac", ".ogg", ".oga", ".aiff", ".aif"}
+
+# PyAV: in-process FFmpeg libraries, no subprocess per request (imported on first use)
+av_available = importlib.util.find_spec("av") is not None
+
+FFMPEG_BIN = shutil.which("ffmpeg")
+
+class DecodeError(Exception):
+    pass
+
+def _resample(y, sr, sr_target):
+    if sr == sr_target:
+        return y
+    import librosa
+    return librosa.resample(y, orig_sr=sr, target_sr=sr_target).astype(np.float32, copy=False)
+
+def _decode_sndfile(buf, sr_target):
+    # soundfile parses the request buffer directly; BytesIO over bytes does not copy
+    y, sr = sf.read(io.BytesIO(buf), dtype="float32", always_2d=False)
+    if y.ndim > 1:
+        y = y.mean(axis=1, dtype=np.float32)
+    return _resample(y, sr, sr_target)
+
+def _decode_av(buf, sr_target):
+    # one resampler does downmix + rate conversion + float32 in a single pass
+    import av
+    chunks = []
+    with av.open(io.BytesIO(buf), mode="r") as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=sr_target)
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                chunks.append(out.to_ndarray().reshape(-1))
+        for out in resampler.resample(None):    # flush
+            chunks.append(out.to_ndarray().reshape(-1))
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32, copy=False)
+
+def _decode_ffmpeg_pipe(buf, sr_target):
+    cmd = [FFMPEG_BIN, "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+           "-f", "f32le", "-ac", "1", "-ar", str(sr_target), "pipe:1"]
+    p = subprocess.run(cmd, input=buf, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30)
+    if p.returncode != 0:
+        raise DecodeError(p.stderr.decode(errors="replace")[-300:])
+    return np.frombuffer(p.stdout, dtype=np.float32)
+
+def decode_audio(buf, suffix, sr_target):
+    """
+    bytes -> mono float32 at sr_target, resampled at most once.
+    WAV/FLAC/OGG go through soundfile; compressed formats (m4a/aac/mp3/caf ...)
+    through PyAV, or an ffmpeg pipe if PyAV is not installed.
+    """
+    suffix = (suffix or "").lower()
+    errors = []
+    if suffix in SNDFILE_EXTS or not suffix:
+        try:
+            return _decode_sndfile(buf, sr_target)
+        except Exception as e:
+            errors.append(f"soundfile: {e}")
+    if av_available:
+        try:
+            return _decode_av(buf, sr_target)
+        except Exception as e:
+            errors.append(f"av: {e}")
+    elif FFMPEG_BIN:
+        try:
+            return _decode_ffmpeg_pipe(buf, sr_target)
+        except Exception as e:
+            errors.append(f"ffmpeg: {e}")
+    if suffix not in SNDFILE_EXTS and suffix:
+        # mislabelled upload (e.g. WAV named .m4a): let libsndfile sniff it
+        try:
+            return _decode_sndfile(buf, sr_target)
+        except Exception as e:
+            errors.append(f"soundfile: {e}")
+    raise DecodeError("could not decode audio (" + "; ".join(errors or ["no decoder available"]) + ")")
@@ -0,0 +1,148 @@
+# compiled_model.py: dependency-free voice classifier (flat NumPy weights, no sklearn / TensorFlow)
+#
+# Artifact (.npz):
+#   kind       "linear" | "mlp"
+#   W0, b0 ... per layer; the feature scaler is folded into the first layer
+#   act        activation per layer (linear | relu | sigmoid | tanh | softmax | elu)
+#   q0 ...     per-output-column scales when the weights are int8-quantized
+#   out_index  output unit holding the distress probability
+#   meta       JSON (flag, n_mfcc, sr, source, exported_at)
+import os, json, time
+import numpy as np
+
+def _sigmoid(z):
+    return 0.5 * (1.0 + np.tanh(0.5 * z))          # overflow-free logistic
+
+def _softmax(z):
+    e = np.exp(z - z.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+ACTIVATIONS = {
+    "linear": lambda z: z,
+    "relu": lambda z: np.maximum(z, 0.0),
+    "sigmoid": _sigmoid,
+    "tanh": np.tanh,
+    "softmax": _softmax,
+    "elu": lambda z: np.where(z > 0, z, np.expm1(np.minimum(z, 0.0))),
+}
+
+def _fold_scaler(W, b, mean, scale):
+    """Dense(scaler(x)) == Dense'(x): W' = W / scale (per input row), b' = b - (mean/scale) @ W.
+    mean / scale may each be None (StandardScaler with_mean / with_std off)."""
+    if mean is None and scale is None:
+        return W, b
+    scale = np.ones(W.shape[0]) if scale is None else np.where(np.asarray(scale) == 0, 1.0, scale)
+    mean = np.zeros(W.shape[0]) if mean is None else np.asarray(mean)
+    return W / scale[:, None], b - (mean / scale) @ W
+
+def _scaler_params(scaler):
+    # StandardScaler leaves mean_ / scale_ as None when with_mean / with_std is off
+    mean = getattr(scaler, "mean_", None) if getattr(scaler, "with_mean", True) else None
+    scale = getattr(scaler, "scale_", None) if getattr(scaler, "with_std", True) else None
+    return mean, scale
+
+def _quantize(W):
+    """Symmetric per-column int8: W ~= Wq * q."""
+    q = np.abs(W).max(axis=0) / 127.0
+    q = np.where(q == 0, 1.0, q)
+    return np.clip(np.round(W / q), -127, 127).astype(np.int8), q.astype(np.float32)
+
+def _save(path, layers, kind, out_index, meta, quantize):
+    arrays = {"kind": np.array(kind), "out_index": np.array(out_index),
+              "act": np.array([a for _, _, a in layers]),
+              "meta": np.array(json.dumps({**meta, "exported_at": int(time.time()), "int8": bool(quantize)}))}
+    for i, (W, b, _) in enumerate(layers):
+        W = np.asarray(W, dtype=np.float64)
+        if quantize:
+            arrays[f"W{i}"], arrays[f"q{i}"] = _quantize(W)
+        else:
+            arrays[f"W{i}"] = W.astype(np.float32)
+        arrays[f"b{i}"] = np.asarray(b, dtype=np.float32)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)      # the registry may be polling this file
+    return path
+
+def export_linear(model, path, meta=None):
+    """sklearn Pipeline(StandardScaler, LogisticRegression) or a bare binary LogisticRegression."""
+    scaler, clf = None, model
+    if hasattr(model, "steps"):
+        steps = [s for _, s in model.steps]
+        clf = steps[-1]
+        scalers = steps[:-1]
+        if len(scalers) > 1 or (scalers and not hasattr(scalers[0], "scale_")):
+            raise ValueError("only Pipeline(StandardScaler, linear classifier) can be exported")
+        scaler = scalers[0] if scalers else None
+    coef = np.asarray(clf.coef_, dtype=np.float64)
+    if coef.shape[0] != 1:
+        raise ValueError("expected a binary classifier")
+    W, b = coef.T, np.asarray(clf.intercept_, dtype=np.float64)
+    if scaler is not None:
+        W, b = _fold_scaler(W, b, *_scaler_params(scaler))
+    # predict_proba[:, 1] of a binary LR is sigmoid(x @ coef + intercept)
+    return _save(path, [(W, b, "sigmoid")], "linear", 0, meta or {}, quantize=False)
+
+def export_keras(model, path, scaler=None, quantize=False, out_index=0, meta=None):
+    """Sequential stack of Dense (+ Dropout / BatchNormalization / Activation) layers."""
+    layers = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind in ("InputLayer", "Dropout", "Flatten", "GaussianNoise"):
+            continue
+        if kind == "Dense":
+            W, b = layer.get_weights() if layer.use_bias else (layer.get_weights()[0], None)
+            b = np.zeros(W.shape[1]) if b is None else b
+            layers.append([np.asarray(W, np.float64), np.asarray(b, np.float64), layer.get_config()["activation"]])
+        elif kind == "BatchNormalization" and layers and layers[-1][2] == "linear":
+            gamma, beta, mu, var = (np.asarray(w, np.float64) for w in layer.get_weights())
+            k = gamma / np.sqrt(var + layer.epsilon)
+            layers[-1][0] = layers[-1][0] * k
+            layers[-1][1] = (layers[-1][1] - mu) * k + beta
+        elif kind == "Activation" and layers and layers[-1][2] == "linear":
+            layers[-1][2] = layer.get_config()["activation"]
+        else:
+            raise ValueError(f"cannot export layer {layer.name} ({kind})")
+    if not layers:
+        raise ValueError("no Dense layers found")
+    for _, _, act in layers:
+        if act not in ACTIVATIONS:
+            raise ValueError(f"unsupported activation {act}")
+    if scaler is not None:
+        layers[0][0], layers[0][1] = _fold_scaler(layers[0][0], layers[0][1], *_scaler_params(scaler))
+    return _save(path, [tuple(l) for l in layers], "mlp", out_index, meta or {}, quantize)
+
+class CompiledModel:
+    """Forward pass over the exported arrays; loads in milliseconds, no framework imports."""
+    def __init__(self, path):
+        with np.load(path, allow_pickle=False) as z:
+            self.kind = str(z["kind"])
+            self.out_index = int(z["out_index"])
+            self.meta = json.loads(str(z["meta"]))
+            acts = [str(a) for a in z["act"]]
+            self.layers = []
+            for i, act in enumerate(acts):
+                W = z[f"W{i}"]
+                if f"q{i}" in z:
+                    # dequantize once at load: int8 storage, float32 compute
+                    W = W.astype(np.float32) * z[f"q{i}"]
+                self.layers.append((np.ascontiguousarray(W, dtype=np.float32),
+                                    z[f"b{i}"].astype(np.float32), ACTIVATIONS[act]))
+        self.n_features = self.layers[0][0].shape[0]
+
+    def forward(self, feats):
+        x = np.asarray(feats, dtype=np.float32)
+        if x.ndim == 1:
+            x = x[None, :]
+        for W, b, act in self.layers:
+            x = act(x @ W + b)
+        return x
+
+    def predict_proba(self, feats):
+        """(N, F) features -> (N,) distress probabilities."""
+        return self.forward(feats)[:, self.out_index].astype(float)
+
+def parity(reference, compiled, X):
+    """Max |reference(X) - compiled(X)| over rows of X; both callables return (N,) probabilities."""
+    a = np.asarray(reference(X), dtype=np.float64).ravel()
+    b = np.asarray(compiled(X), dtype=np.float64).ravel()
+    return float(np.abs(a - b).max()) if len(a) else 0.0
@@ -0,0 +1,59 @@
+# features.py: MFCC summary features shared by the server and voice_model training
+import numpy as np
+
+CLIP_SECONDS = 4     # model input window; shorter clips are zero-padded, longer ones cut
+TOP_DB = 80.0        # librosa.power_to_db default dynamic range
+
+def fix_length(y, n):
+    """Zero-pad or truncate the last axis to exactly n samples."""
+    y = np.asarray(y, dtype=np.float32)
+    if y.shape[-1] >= n:
+        return y[..., :n]
+    pad = [(0, 0)] * (y.ndim - 1) + [(0, n - y.shape[-1])]
+    return np.pad(y, pad)
+
+def stack_clips(signals, sr, seconds=CLIP_SECONDS):
+    """List of 1-D signals -> one (N, seconds*sr) float32 array, padded/truncated per row."""
+    n = sr * seconds
+    out = np.zeros((len(signals), n), dtype=np.float32)
+    for i, y in enumerate(signals):
+        m = min(n, len(y))
+        out[i, :m] = y[:m]
+    return out
+
+def mfcc_stats_batch(Y, sr, n_mfcc):
+    """
+    (N, L) equal-length signals -> (N, 4*n_mfcc) [mean|std|min|max] of the MFCCs.
+    librosa computes the STFT, mel projection and DCT over the leading batch axis
+    in one pass, so N clips cost a handful of large array ops instead of N loops.
+    The top_db floor is applied per clip: each row equals mfcc_stats() of that
+    clip alone, whatever else shares the batch.
+    """
+    import librosa    # heavy import; deferred until the first clip is featurized
+    S = librosa.feature.melspectrogram(y=np.asarray(Y, dtype=np.float32), sr=sr)          # (N, n_mels, T)
+    # power_to_db's top_db clamp takes the max over the whole array; on a batch
+    # that would be the loudest clip, so clamp each clip against its own max
+    S = librosa.power_to_db(S, top_db=None)
+    S = np.maximum(S, S.max(axis=(-2, -1), keepdims=True) - TOP_DB)
+    mfcc = librosa.feature.mfcc(S=S, sr=sr, n_mfcc=n_mfcc)                                 # (N, n_mfcc, T)
+    return np.concatenate([mfcc.mean(-1), mfcc.std(-1), mfcc.min(-1), mfcc.max(-1)], axis=-1)
+
+def mfcc_stats(y, sr, n_mfcc, seconds=CLIP_SECONDS):
+    """One mono signal -> (4*n_mfcc,) feature vector on a fixed-length window."""
+    y = fix_length(y, sr * seconds)
+    return mfcc_stats_batch(y[np.newaxis, :], sr, n_mfcc)[0]
+
+def model_window(y, sr, seconds=CLIP_SECONDS):
+    """The samples the model scores: the VAD-trimmed active region (utils/vad.py)."""
+    from utils.vad import select_window, VAD_ENABLED
+    return select_window(y, sr, seconds) if VAD_ENABLED else y[:sr * seconds]
+
+def featurize_bytes(buf, suffix, sr, n_mfcc):
+    """
+    Encoded audio bytes -> (4*n_mfcc,) features, via the same decode_audio +
+    active-window + fixed-length MFCC steps the server scores with.
+    voice_model/train_voice.py featurizes through this, so train and serve
+    features cannot drift.
+    """
+    from utils.audio import decode_audio
+    return mfcc_stats(model_window(decode_audio(buf, suffix, sr), sr), sr, n_mfcc)
@@ -0,0 +1,189 @@
+# inference_pool.py: voice scoring in worker processes (shared-memory input, micro-batching)
+# Keeps MFCC + model CPU work off the Flask request threads so /loc and /sos
+# never queue behind voice jobs.
+import os, sys, math, time, atexit, threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+import numpy as np
+
+VOICE_WORKERS   = int(os.getenv("VOICE_WORKERS", "2"))       # 0 = score in-process
+VOICE_QUEUE_MAX = int(os.getenv("VOICE_QUEUE_MAX", "32"))    # clips waiting or running
+VOICE_BATCH_MS  = float(os.getenv("VOICE_BATCH_MS", "10"))   # micro-batch collection window
+VOICE_MAX_BATCH = int(os.getenv("VOICE_MAX_BATCH", "16"))
+
+class PoolBusy(Exception):
+    def __init__(self, retry_after=1):
+        super().__init__(f"voice workers busy; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+# ---------------- worker process side ----------------
+_worker = {}
+
+def _init_worker(spec):
+    from utils.voice_model import load_voice_model
+    from utils.model_registry import warm_up
+    _worker["model"] = load_voice_model(**spec)
+    warm_up(_worker["model"])
+    print(f"[VOICE-WORKER {os.getpid()}] loaded {spec['flag']}", flush=True)
+
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    if sys.version_info < (3, 13):
+        # the parent owns (and unlinks) the block; don't let this process' tracker claim it
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def _score_shared(name, shape):
+    from utils.features import mfcc_stats_batch
+    m = _worker["model"]
+    shm = _attach(name)
+    try:
+        Y = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        # rows may belong to different users; features are computed per clip
+        # (mfcc_stats_batch clamps each row on its own), so they cannot interact
+        feats = mfcc_stats_batch(Y, m.sr, m.n_mfcc)
+        del Y
+    finally:
+        shm.close()
+    return m.predict_proba(feats)
+
+# ---------------- parent side ----------------
+class InferencePool:
+    """
+    submit(signals) queues mono float32 clips (already at the model rate); a
+    dispatcher thread merges requests that arrive within VOICE_BATCH_MS into one
+    shared-memory (N, 4*sr) block and hands it to a worker.
+    """
+    def __init__(self, spec, workers=VOICE_WORKERS, max_queue=VOICE_QUEUE_MAX,
+                 batch_ms=VOICE_BATCH_MS, max_batch=VOICE_MAX_BATCH, clip_seconds=4):
+        self.spec = spec
+        self.n_workers = workers
+        self.max_queue = max_queue
+        self.batch_s = batch_ms / 1000.0
+        self.max_batch = max_batch
+        self.clip_seconds = clip_seconds
+        self.clip_len = spec["sr"] * clip_seconds
+        self._items = []                  # [(signals, future)]
+        self._pending = 0                 # clips accepted but not finished
+        self._clip_s = 0.05               # EWMA seconds per clip, for Retry-After
+        self._cv = threading.Condition()
+        self._swap_lock = threading.Lock()
+        self._executor = self._new_executor(spec)
+        threading.Thread(target=self._dispatch, name="voice-dispatch", daemon=True).start()
+        atexit.register(lambda: self._executor.shutdown(wait=False, cancel_futures=True))
+
+    def _new_executor(self, spec):
+        return ProcessPoolExecutor(max_workers=self.n_workers, mp_context=get_context("spawn"),
+                                   initializer=_init_worker, initargs=(spec,))
+
+    def respawn(self, spec):
+        """Swap in workers for a new model; jobs already running finish on the old ones."""
+        old, self._executor = self._executor, self._new_executor(spec)
+        self.spec = spec
+        self.clip_len = spec["sr"] * self.clip_seconds
+        old.shutdown(wait=False)
+
+    def _replace_broken(self, broken):
+        """A worker died (OOM, segfault): the executor is unusable until replaced."""
+        with self._swap_lock:
+            if self._executor is broken:
+                print("[VOICE-POOL] worker process died; restarting the pool", flush=True)
+                self._executor = self._new_executor(self.spec)
+                broken.shutdown(wait=False)
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def retry_after(self):
+        return max(1, math.ceil(self._pending * self._clip_s / max(self.n_workers, 1)))
+
+    def submit(self, signals):
+        n = len(signals)
+        with self._cv:
+            if self._pending and self._pending + n > self.max_queue:
+                raise PoolBusy(self.retry_after())
+            self._pending += n
+            fut = Future()
+            self._items.append((signals, fut))
+            self._cv.notify()
+        return fut
+
+    def score(self, signals, timeout=60):
+        return self.submit(signals).result(timeout)
+
+    def _dispatch(self):
+        while True:
+            with self._cv:
+                while not self._items:
+                    self._cv.wait()
+                deadline = time.monotonic() + self.batch_s
+                while sum(len(s) for s, _ in self._items) < self.max_batch:
+                    rem = deadline - time.monotonic()
+                    if rem <= 0:
+                        break
+                    self._cv.wait(rem)
+                batch, n = [], 0
+                while self._items and (not batch or n + len(self._items[0][0]) <= self.max_batch):
+                    sigs, fut = self._items.pop(0)
+                    batch.append((sigs, fut)); n += len(sigs)
+            try:
+                self._launch(batch, n)
+            except Exception as e:
+                self._finish(batch, n, error=e)
+
+    def _launch(self, batch, n, attempt=0):
+        shm = shared_memory.SharedMemory(create=True, size=max(1, n * self.clip_len * 4))
+        Y = np.ndarray((n, self.clip_len), dtype=np.float32, buffer=shm.buf)
+        Y[:] = 0
+        i = 0
+        for sigs, _ in batch:
+            for y in sigs:
+                m = min(self.clip_len, len(y))
+                Y[i, :m] = y[:m]; i += 1
+        del Y
+        t0 = time.perf_counter()
+        executor = self._executor
+        try:
+            job = executor.submit(_score_shared, shm.name, (n, self.clip_len))
+        except BrokenProcessPool:
+            shm.close(); shm.unlink()
+            self._replace_broken(executor)
+            if attempt:
+                raise
+            return self._launch(batch, n, attempt + 1)
+        except Exception:
+            shm.close(); shm.unlink()
+            raise
+
+        def done(job):
+            shm.close(); shm.unlink()
+            try:
+                probs = job.result()
+            except BrokenProcessPool as e:
+                # the batch may itself have killed the worker: retry it once on fresh workers
+                self._replace_broken(executor)
+                if attempt:
+                    return self._finish(batch, n, error=e)
+                try:
+                    return self._launch(batch, n, attempt + 1)
+                except Exception as e2:
+                    return self._finish(batch, n, error=e2)
+            except Exception as e:
+                return self._finish(batch, n, error=e)
+            self._clip_s = 0.8 * self._clip_s + 0.2 * (time.perf_counter() - t0) / n
+            self._finish(batch, n, probs=probs)
+        job.add_done_callback(done)
+
+    def _finish(self, batch, n, probs=None, error=None):
+        with self._cv:
+            self._pending -= n
+        i = 0
+        for sigs, fut in batch:
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(np.asarray(probs[i:i + len(sigs)], dtype=float))
+            i += len(sigs)
@@ -0,0 +1,212 @@
+# metrics.py: in-process counters, histograms and timing spans (Prometheus text format)
+# No client library: everything lives in this process and is rendered on GET /metrics.
+import os, sys, time, threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+# seconds; covers sub-ms ring-buffer work up to multi-second Overpass/model stalls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_INTERVAL_S = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+def _esc(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in pairs) + "}"
+
+def _num(v):
+    return "+Inf" if v == float("inf") else repr(float(v))
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, n=1, **labels):
+        key = tuple(str(labels.get(k, "")) for k in self.labelnames)
+        with self._lock:
+            self._values[key] += n
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(k, "")) for k in self.labelnames), 0.0)
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        out += [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+        return out
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}          # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, v, **labels):
+        key = tuple(str(labels.get(k, "")) for k in self.labelnames)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if v <= b:
+                    s[i] += 1
+                    break
+            s[-2] += v
+            s[-1] += 1
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(s)) for k, s in self._series.items())
+        for key, s in items:
+            cum = 0
+            for b, c in zip(self.buckets, s):
+                cum += c
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _num(b))])} {cum}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(s[-2])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {s[-1]}")
+        return out
+
+class Gauge:
+    """Value read at scrape time from fn() -> number or {label_value: number}."""
+    def __init__(self, name, help, fn, labelname=None):
+        self.name, self.help, self.fn, self.labelname = name, help, fn, labelname
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            v = self.fn()
+        except Exception:
+            return out
+        if isinstance(v, dict):
+            out += [f"{self.name}{_labels((self.labelname,), (k,))} {_num(x)}" for k, x in sorted(v.items())]
+        elif v is not None:
+            out.append(f"{self.name} {_num(v)}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, m):
+        with self._lock:
+            return self._metrics.setdefault(m.name, m)
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, fn, labelname=None):
+        with self._lock:                 # gauges re-bind (e.g. a pool replaced on model swap)
+            self._metrics[name] = Gauge(name, help, fn, labelname)
+            return self._metrics[name]
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for m in metrics:
+            lines += m.render()
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("she_stage_seconds", "Time spent in one pipeline stage.", ("stage",))
+HTTP_SECONDS = REGISTRY.histogram("she_http_request_seconds", "HTTP request latency.", ("route", "method", "status"))
+ALERTS = REGISTRY.counter("she_alerts_total", "Alert rows written, by alert type.", ("type",))
+FAILURES = REGISTRY.counter("she_failures_total", "Failures of models and external services.", ("component",))
+
+@contextmanager
+def span(stage):
+    """Time a block into she_stage_seconds{stage=...} (recorded even if it raises)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage=stage)
+
+def render():
+    return REGISTRY.render()
+
+# -------------------------------------------------------------------
+# Sampling profiler (off by default; toggled at runtime)
+# -------------------------------------------------------------------
+class SamplingProfiler:
+    """
+    Samples every thread's stack each `interval` seconds and keeps counts of
+    folded stacks ("file:func;file:func ..."), the input format of flamegraph
+    tools. Costs nothing while stopped.
+    """
+    def __init__(self, interval=PROFILE_INTERVAL_S, max_depth=48):
+        self.interval, self.max_depth = interval, max_depth
+        self.counts = defaultdict(int)
+        self.samples = 0
+        self.started_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()          # start/stop
+        self._data_lock = threading.Lock()     # counts/samples, shared with the sampler thread
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, reset=True):
+        with self._lock:
+            if self.running:
+                return False
+            if reset:
+                with self._data_lock:
+                    self.counts.clear()
+                    self.samples = 0
+            self._stop.clear()
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return False
+            self._stop.set()
+            self._thread.join()
+            return True
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    co = frame.f_code
+                    stack.append(f"{os.path.basename(co.co_filename)}:{co.co_name}")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(stack)))
+            with self._data_lock:
+                for s in stacks:
+                    self.counts[s] += 1
+                self.samples += 1
+
+    def folded(self, top=0):
+        with self._data_lock:
+            snapshot = dict(self.counts)
+        items = sorted(snapshot.items(), key=lambda kv: -kv[1])
+        if top:
+            items = items[:top]
+        return "\n".join(f"{stack} {n}" for stack, n in items) + "\n"
+
+profiler = SamplingProfiler()
@@ -0,0 +1,156 @@
+# model_registry.py: lazy, hot-swappable voice model (load in background, warm up, watch artifacts)
+import os, time, threading, traceback
+from utils.metrics import FAILURES
+
+ARTIFACT_DIR = os.path.abspath(os.getenv(
+    "VOICE_ARTIFACT_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "voice_model", "artifacts")))
+MODEL_RELOAD_POLL_S = float(os.getenv("MODEL_RELOAD_POLL_S", "5"))   # 0 disables hot reload
+VOICE_COMPILED = os.getenv("VOICE_COMPILED", "1") == "1"              # prefer .npz exports when fresh
+
+def artifact_paths(artifact_dir=ARTIFACT_DIR):
+    j = lambda name: os.path.join(artifact_dir, name)
+    return {
+        "custom_model": j("voice_clf.joblib"),
+        "custom_compiled": j("voice_clf.npz"),
+        "feat_cfg": j("feat_cfg.npy"),
+        "crema_model": j("voice_clf_final_v3.h5"),
+        "crema_scaler": j("scaler_final_v3.joblib"),
+        "crema_compiled": j("voice_clf_final_v3.npz"),
+    }
+
+def _tf_importable():
+    import importlib.util
+    return importlib.util.find_spec("tensorflow") is not None
+
+def _fresh_export(compiled, source):
+    # an export only counts while it is at least as new as the artifact it came from
+    if not VOICE_COMPILED or not os.path.exists(compiled):
+        return False
+    return not os.path.exists(source) or os.stat(compiled).st_mtime_ns >= os.stat(source).st_mtime_ns
+
+def select_spec(artifact_dir=ARTIFACT_DIR):
+    """Spec for the model that should be active (CUSTOM first, CREMA-D backup), or None."""
+    p = artifact_paths(artifact_dir)
+    n_mfcc, sr = 20, 16000
+    if os.path.exists(p["feat_cfg"]):
+        import numpy as np
+        n_mfcc, sr = [int(x) for x in np.load(p["feat_cfg"])]
+    if _fresh_export(p["custom_compiled"], p["custom_model"]):
+        return {"flag": "CUSTOM", "model_path": p["custom_compiled"], "scaler_path": None,
+                "n_mfcc": n_mfcc, "sr": sr}
+    if os.path.exists(p["custom_model"]):
+        return {"flag": "CUSTOM", "model_path": p["custom_model"], "scaler_path": None,
+                "n_mfcc": n_mfcc, "sr": sr}
+    if _fresh_export(p["crema_compiled"], p["crema_model"]):
+        return {"flag": "CREMA-D", "model_path": p["crema_compiled"], "scaler_path": None,
+                "n_mfcc": n_mfcc, "sr": sr}
+    if os.path.exists(p["crema_model"]) and _tf_importable():
+        return {"flag": "CREMA-D", "model_path": p["crema_model"], "scaler_path": p["crema_scaler"],
+                "n_mfcc": n_mfcc, "sr": sr}
+    return None
+
+def _fingerprint(spec):
+    if spec is None:
+        return None
+    parts = [spec["flag"], spec["n_mfcc"], spec["sr"]]
+    for k in ("model_path", "scaler_path"):
+        if spec.get(k) and os.path.exists(spec[k]):
+            st = os.stat(spec[k])
+            parts += [st.st_mtime_ns, st.st_size]
+    return tuple(parts)
+
+def warm_up(vm):
+    """One dummy inference so the first real request doesn't pay for JIT/graph setup."""
+    import numpy as np
+    from utils.features import mfcc_stats_batch
+    vm.predict_proba(mfcc_stats_batch(np.zeros((1, vm.sr * 4), dtype=np.float32), vm.sr, vm.n_mfcc))
+
+class ModelRegistry:
+    """
+    Liveness does not depend on this; readiness is `ready`.
+    start() loads the active model in a background thread, warms it up and then
+    polls the artifact files, swapping in a new model when they change.
+    on_swap(vm) is called after every successful (re)load.
+    """
+    def __init__(self, artifact_dir=ARTIFACT_DIR, poll_s=MODEL_RELOAD_POLL_S, on_swap=None):
+        self.artifact_dir = artifact_dir
+        self.poll_s = poll_s
+        self.on_swap = on_swap
+        self.model = None
+        self.version = None
+        self.status = "idle"          # idle | loading | ready | unavailable | error
+        self.error = None
+        self.loaded_at = None
+        self._fp = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._started = False
+
+    @property
+    def ready(self):
+        return self.model is not None
+
+    def get(self):
+        return self.model
+
+    def info(self):
+        vm = self.model
+        return {"status": self.status, "ready": self.ready, "flag": vm.flag if vm else "NONE",
+                "version": self.version, "engine": vm.engine if vm else None, "n_mfcc": vm.n_mfcc if vm else None,
+                "sr": vm.sr if vm else None, "loaded_at": self.loaded_at, "error": self.error}
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name="model-registry", daemon=True).start()
+
+    def reload(self, force=False):
+        """Load the currently selected artifact if it changed (or force). Returns True on swap."""
+        with self._reload_lock:
+            return self._reload(force)
+
+    def _reload(self, force):
+        spec = select_spec(self.artifact_dir)
+        fp = _fingerprint(spec)
+        if not force and fp == self._fp:
+            return False
+        if spec is None:
+            self.status = "unavailable" if self.model is None else self.status
+            self._fp = fp
+            return False
+        from utils.voice_model import load_voice_model
+        self.status = "loading" if self.model is None else self.status
+        t0 = time.perf_counter()
+        try:
+            vm = load_voice_model(**spec)
+            warm_up(vm)
+        except Exception as e:
+            FAILURES.inc(component="model_load")
+            self.error = str(e)
+            self.status = "error" if self.model is None else self.status
+            print("⚠️ Voice model load failed (keeping previous):", e)
+            traceback.print_exc()
+            self._fp = fp     # don't retry a broken artifact until it changes again
+            return False
+        self.model, self._fp, self.error = vm, fp, None
+        self.version = f"{spec['flag']}:{fp[3] if len(fp) > 3 else 0}"
+        self.status, self.loaded_at = "ready", time.time()
+        print(f"✅ [VOICE] Active model: {spec['flag']} n_mfcc={vm.n_mfcc} sr={vm.sr} "
+              f"({time.perf_counter() - t0:.2f}s incl. warm-up)", flush=True)
+        if self.on_swap is not None:
+            try:
+                self.on_swap(vm)
+            except Exception as e:
+                print("⚠️ on_swap failed:", e)
+        return True
+
+    def _run(self):
+        self.reload(force=True)
+        while self.poll_s > 0:
+            time.sleep(self.poll_s)
+            try:
+                self.reload()
+            except Exception as e:
+                print("⚠️ model watch failed:", e)
@@ -0,0 +1,147 @@
+# poi_cache.py: tiled, TTL + LRU cache of POI counts (memory in front of SQLite)
+import os, time, threading
+from math import cos, radians, floor
+from collections import OrderedDict
+import numpy as np
+from utils.geo import count_within, M_PER_DEG
+
+POI_TILE_DEG  = float(os.getenv("POI_TILE_DEG", "0.001"))       # ~110 m tiles
+POI_TTL_S     = int(os.getenv("POI_TTL_S", str(7 * 24 * 3600))) # amenities change slowly
+POI_CACHE_MAX = int(os.getenv("POI_CACHE_MAX", "20000"))        # in-memory entries
+POI_PREFETCH  = int(os.getenv("POI_PREFETCH", "1"))             # ring of neighbour tiles per fetch
+
+def tile_of(lat, lon, tile_deg=POI_TILE_DEG):
+    return int(floor(lat / tile_deg)), int(floor(lon / tile_deg))
+
+def tile_center(iy, ix, tile_deg=POI_TILE_DEG):
+    return (iy + 0.5) * tile_deg, (ix + 0.5) * tile_deg
+
+class PoiCache:
+    """
+    Counts are keyed by (tile, radius) and computed at the tile centre, so every
+    point inside a tile shares one answer. A miss fetches the nodes for the whole
+    (2*POI_PREFETCH+1)^2 block of tiles in one request and fills all of them.
+    Concurrent misses on the same tile share one in-flight fetch.
+
+    fetch_nodes(south, west, north, east) -> [(lat, lon), ...] must RAISE on
+    failure; failures are returned as None and never cached.
+    """
+    def __init__(self, fetch_nodes, db=None, ttl_s=POI_TTL_S, max_entries=POI_CACHE_MAX,
+                 tile_deg=POI_TILE_DEG, prefetch=POI_PREFETCH):
+        self.fetch_nodes = fetch_nodes
+        self.db = db                      # callable returning a sqlite3 connection, or None
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.tile_deg = tile_deg
+        self.prefetch = prefetch
+        self._mem = OrderedDict()         # (iy, ix, r) -> (count, fetched_at)
+        self._lock = threading.Lock()
+        self._inflight = {}               # key -> Event set when its block fetch finishes
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "errors": 0, "joined": 0}
+
+    # ---- memory LRU ----
+    def _mem_get(self, key, now):
+        with self._lock:
+            v = self._mem.get(key)
+            if v is None:
+                return None
+            if now - v[1] > self.ttl_s:
+                del self._mem[key]
+                return None
+            self._mem.move_to_end(key)
+            return v[0]
+
+    def _mem_put(self, key, count, fetched_at):
+        with self._lock:
+            self._mem[key] = (count, fetched_at)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+
+    # ---- disk ----
+    def _disk_get(self, key, now):
+        if self.db is None:
+            return None
+        iy, ix, r = key
+        with self.db() as conn:
+            row = conn.execute(
+                "SELECT count, fetched_at FROM poi_cache WHERE tile_deg=? AND iy=? AND ix=? AND radius=?",
+                (self.tile_deg, iy, ix, r)).fetchone()
+        if row is None or now - row[1] > self.ttl_s:
+            return None
+        self._mem_put(key, row[0], row[1])
+        return row[0]
+
+    def _disk_put_many(self, items, fetched_at):
+        if self.db is None:
+            return
+        with self.db() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO poi_cache(tile_deg, iy, ix, radius, count, fetched_at) "
+                "VALUES(?,?,?,?,?,?)",
+                [(self.tile_deg, iy, ix, r, c, fetched_at) for (iy, ix, r), c in items])
+
+    # ---- public ----
+    def count(self, lat, lon, radius_m):
+        now = int(time.time())
+        iy, ix = tile_of(lat, lon, self.tile_deg)
+        key = (iy, ix, int(radius_m))
+        c = self._mem_get(key, now)
+        if c is not None:
+            self.stats["hits"] += 1
+            return c
+        try:
+            c = self._disk_get(key, now)
+        except Exception as e:
+            print("[WARN] poi_cache disk read failed:", e)
+            c = None
+        if c is not None:
+            self.stats["disk_hits"] += 1
+            return c
+
+        with self._lock:
+            ev = self._inflight.get(key)
+            leader = ev is None
+            if leader:
+                ev = self._inflight[key] = threading.Event()
+        if not leader:
+            # someone is already fetching this tile; use their answer (None if it failed)
+            self.stats["joined"] += 1
+            ev.wait()
+            return self._mem_get(key, int(time.time()))
+
+        self.stats["misses"] += 1
+        try:
+            filled = self._fetch_block(iy, ix, int(radius_m))
+        except Exception as e:
+            self.stats["errors"] += 1
+            print("[WARN] POI lookup failed (not cached):", e)
+            return None
+        else:
+            for k, v in filled.items():
+                self._mem_put(k, v, now)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            ev.set()
+        try:
+            self._disk_put_many(filled.items(), now)
+        except Exception as e:
+            print("[WARN] poi_cache disk write failed:", e)
+        return filled[key]
+
+    def _fetch_block(self, iy, ix, r):
+        k, td = self.prefetch, self.tile_deg
+        lat_c = (iy + 0.5) * td
+        pad_lat = r / M_PER_DEG
+        pad_lon = r / (M_PER_DEG * max(cos(radians(lat_c)), 1e-6))
+        south, north = (iy - k) * td - pad_lat, (iy + k + 1) * td + pad_lat
+        west, east = (ix - k) * td - pad_lon, (ix + k + 1) * td + pad_lon
+        nodes = np.asarray(self.fetch_nodes(south, west, north, east), dtype=np.float64).reshape(-1, 2)
+
+        out = {}
+        for dy in range(-k, k + 1):
+            for dx in range(-k, k + 1):
+                clat, clon = tile_center(iy + dy, ix + dx, td)
+                out[(iy + dy, ix + dx, r)] = count_within(clat, clon, nodes[:, 0], nodes[:, 1], r)
+        return out
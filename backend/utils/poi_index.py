@@ -0,0 +1,93 @@
+# poi_index.py: offline amenity index (grid-sorted points, memory-mapped .npy files)
+import os, json
+from math import floor
+import numpy as np
+from utils.geo import haversine_to_many, bbox_around
+
+POI_CELL_DEG = 0.002          # ~220 m grid cells
+
+# On-disk layout of an index directory:
+#   points.npy        (N, 2) float32 lat/lon, sorted by cell key
+#   cell_keys.npy     (M,)   int64 sorted unique cell keys
+#   cell_offsets.npy  (M+1,) int64 start of each cell's run in points.npy
+#   meta.json         cell_deg, bbox, count, source
+
+def _n_cols(cell_deg):
+    return int(np.ceil(360.0 / cell_deg)) + 1
+
+def _cell_keys(lat, lon, cell_deg):
+    iy = np.floor((np.asarray(lat) + 90.0) / cell_deg).astype(np.int64)
+    ix = np.floor((np.asarray(lon) + 180.0) / cell_deg).astype(np.int64)
+    return iy * _n_cols(cell_deg) + ix
+
+def build_index(lat, lon, out_dir, cell_deg=POI_CELL_DEG, source=""):
+    """Write an index for the given point arrays into out_dir; returns the meta dict."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if lat.size == 0:
+        raise ValueError("no POIs to index")
+    keys = _cell_keys(lat, lon, cell_deg)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    pts = np.column_stack([lat[order], lon[order]]).astype(np.float32)
+    uniq, starts = np.unique(keys, return_index=True)
+    offsets = np.append(starts, len(keys)).astype(np.int64)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "points.npy"), pts)
+    np.save(os.path.join(out_dir, "cell_keys.npy"), uniq.astype(np.int64))
+    np.save(os.path.join(out_dir, "cell_offsets.npy"), offsets)
+    meta = {"cell_deg": cell_deg, "count": int(len(pts)), "source": source,
+            "bbox": [float(lat.min()), float(lon.min()), float(lat.max()), float(lon.max())]}
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, indent=2)
+    return meta
+
+class PoiIndex:
+    """Read-only view over an index directory; arrays are memory-mapped, not loaded."""
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as fh:
+            self.meta = json.load(fh)
+        self.cell_deg = float(self.meta["cell_deg"])
+        self.n_cols = _n_cols(self.cell_deg)
+        self.points = np.load(os.path.join(path, "points.npy"), mmap_mode="r")
+        self.keys = np.load(os.path.join(path, "cell_keys.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "cell_offsets.npy"), mmap_mode="r")
+
+    @classmethod
+    def open(cls, path):
+        """Return a PoiIndex, or None if no index has been built at path."""
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        try:
+            return cls(path)
+        except Exception as e:
+            print("[WARN] POI index unreadable:", path, e)
+            return None
+
+    def covers(self, lat, lon, margin_deg=0.01):
+        s, w, n, e = self.meta["bbox"]
+        return (s - margin_deg) <= lat <= (n + margin_deg) and (w - margin_deg) <= lon <= (e + margin_deg)
+
+    def _candidates(self, lat, lon, radius_m):
+        # points in the cells overlapping the query bbox; cells of one grid row
+        # are contiguous in key order, so each row is a single slice
+        s, w, n, e = bbox_around(lat, lon, radius_m)
+        cd = self.cell_deg
+        iy0, iy1 = floor((s + 90.0) / cd), floor((n + 90.0) / cd)
+        ix0, ix1 = floor((w + 180.0) / cd), floor((e + 180.0) / cd)
+        chunks = []
+        for iy in range(iy0, iy1 + 1):
+            lo = np.searchsorted(self.keys, iy * self.n_cols + ix0, side="left")
+            hi = np.searchsorted(self.keys, iy * self.n_cols + ix1, side="right")
+            if hi > lo:
+                chunks.append(self.points[self.offsets[lo]:self.offsets[hi]])
+        if not chunks:
+            return np.empty((0, 2), dtype=np.float32)
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+    def count(self, lat, lon, radius_m):
+        pts = self._candidates(lat, lon, radius_m).astype(np.float64)
+        if not len(pts):
+            return 0
+        return int(np.count_nonzero(haversine_to_many(lat, lon, pts[:, 0], pts[:, 1]) <= radius_m))
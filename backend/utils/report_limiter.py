@@ -0,0 +1,63 @@
+# report_limiter.py: per-user enforcement of the server-chosen GPS reporting cadence
+import os, time, threading
+from collections import OrderedDict
+from utils.geo import haversine
+
+REPORT_ENFORCE   = os.getenv("REPORT_ENFORCE", "1") == "1"
+REPORT_SLACK     = float(os.getenv("REPORT_SLACK", "0.8"))      # accept after this share of the interval (timer jitter)
+REPORT_MAX_USERS = int(os.getenv("REPORT_MAX_USERS", "100000"))
+
+class ReportLimiter:
+    """
+    Remembers, per user, the last accepted fix and the cadence granted with it.
+    A fix is accepted once slack * interval_s has passed, or as soon as it is
+    min_distance_m away from the last accepted one; anything else is early.
+    Users without a grant (new, evicted, or reset after an incident) are
+    always accepted. Timing uses the server's monotonic clock, not client ts.
+    """
+    def __init__(self, enforce=REPORT_ENFORCE, slack=REPORT_SLACK, max_users=REPORT_MAX_USERS):
+        self.enforce = enforce
+        self.slack = slack
+        self.max_users = max_users
+        self._grants = OrderedDict()     # user -> (accepted_at, lat, lon, policy)
+        self._lock = threading.Lock()
+        self.stats = {"accepted": 0, "early": 0}
+
+    def check(self, user, lat, lon):
+        """(True, 0) to ingest the fix, or (False, retry_after_s) when it came too early."""
+        now = time.monotonic()
+        with self._lock:
+            g = self._grants.get(user)
+        if not self.enforce or g is None:
+            self.stats["accepted"] += 1
+            return True, 0
+        at, plat, plon, policy = g
+        interval, dist = policy["interval_s"], policy["min_distance_m"]
+        wait = at + self.slack * interval - now
+        if wait <= 0 or (dist > 0 and haversine(plat, plon, lat, lon) >= dist):
+            self.stats["accepted"] += 1
+            return True, 0
+        self.stats["early"] += 1
+        return False, max(1, int(wait + 0.999))
+
+    def grant(self, user, lat, lon, policy):
+        """Record an accepted fix together with the cadence returned to the client."""
+        with self._lock:
+            self._grants[user] = (time.monotonic(), lat, lon, policy)
+            self._grants.move_to_end(user)
+            while len(self._grants) > self.max_users:
+                self._grants.popitem(last=False)
+
+    def policy(self, user):
+        """The cadence last granted to user, or None."""
+        with self._lock:
+            g = self._grants.get(user)
+        return g[3] if g else None
+
+    def reset(self, user):
+        """Drop the user's grant so the next fix is accepted immediately (e.g. a new incident)."""
+        with self._lock:
+            self._grants.pop(user, None)
+
+    def __len__(self):
+        return len(self._grants)
@@ -0,0 +1,85 @@
+# result_cache.py: content-hash LRU for voice scores + idempotent request replay
+import os, time, hashlib, threading
+from collections import OrderedDict
+
+VOICE_CACHE_MAX     = int(os.getenv("VOICE_CACHE_MAX", "2048"))      # entries per cache
+VOICE_CACHE_TTL_S   = int(os.getenv("VOICE_CACHE_TTL_S", "3600"))
+IDEMPOTENCY_TTL_S   = int(os.getenv("IDEMPOTENCY_TTL_S", "600"))    # how long a retry replays
+IDEMPOTENCY_WAIT_S  = float(os.getenv("IDEMPOTENCY_WAIT_S", "30"))   # a retry racing the original waits this long
+
+class InFlight(Exception):
+    """An identical request is still running after IDEMPOTENCY_WAIT_S."""
+
+def content_hash(buf):
+    return hashlib.blake2b(buf, digest_size=16).hexdigest()
+
+class LruCache:
+    """Bounded, TTL'd, thread-safe mapping with hit/miss counters."""
+    def __init__(self, max_entries=VOICE_CACHE_MAX, ttl_s=VOICE_CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._d = OrderedDict()       # key -> (value, stored_at)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            v = self._d.get(key)
+            if v is None or now - v[1] > self.ttl_s:
+                if v is not None:
+                    del self._d[key]
+                self.stats["misses"] += 1
+                return None
+            self._d.move_to_end(key)
+            self.stats["hits"] += 1
+            return v[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._d[key] = (value, time.monotonic())
+            self._d.move_to_end(key)
+            while len(self._d) > self.max_entries:
+                self._d.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def __len__(self):
+        return len(self._d)
+
+class IdempotencyStore:
+    """
+    run(key, fn) executes fn() once per key within ttl_s and replays its result
+    for every later call with the same key; a call that races an in-flight one
+    waits for it instead of running fn again. Exceptions are not remembered.
+    """
+    def __init__(self, max_entries=VOICE_CACHE_MAX, ttl_s=IDEMPOTENCY_TTL_S, wait_s=IDEMPOTENCY_WAIT_S):
+        self._done = LruCache(max_entries, ttl_s)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.wait_s = wait_s
+        self.stats = {"replayed": 0, "joined": 0}
+
+    def run(self, key, fn):
+        """Returns (result, replayed)."""
+        while True:
+            with self._lock:
+                res = self._done.get(key)
+                if res is not None:
+                    self.stats["replayed"] += 1
+                    return res, True
+                ev = self._inflight.get(key)
+                if ev is None:
+                    ev = self._inflight[key] = threading.Event()
+                    break
+            self.stats["joined"] += 1
+            if not ev.wait(self.wait_s):
+                raise InFlight("an identical request is still being processed")
+            # loop: replay its result, or run ourselves if it failed
+        try:
+            res = fn()
+            self._done.put(key, res)
+            return res, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            ev.set()
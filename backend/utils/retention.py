@@ -0,0 +1,226 @@
+# retention.py: bounded locs table (hot window, downsampled warm tier, npz archive)
+#
+#   age < LOCS_HOT_S              full resolution in SQLite
+#   LOCS_HOT_S .. LOCS_ARCHIVE_S  Douglas-Peucker simplified in SQLite
+#   age > LOCS_ARCHIVE_S          moved to ARCHIVE_DIR/<user>/<YYYY-MM-DD>.npz
+#
+# history() stitches archive files and the table back together for incident review.
+import os, time, threading
+from urllib.parse import quote
+from datetime import datetime, timezone, timedelta
+import numpy as np
+from utils.geo import douglas_peucker
+from utils.storage import get_conn, DB_PATH
+
+LOCS_HOT_S        = int(os.getenv("LOCS_HOT_S", str(24 * 3600)))
+LOCS_ARCHIVE_S    = int(os.getenv("LOCS_ARCHIVE_S", str(30 * 24 * 3600)))
+RETAIN_DP_EPS_M   = float(os.getenv("RETAIN_DP_EPS_M", "10"))     # max deviation of dropped fixes
+RETAIN_MAX_GAP_S  = int(os.getenv("RETAIN_MAX_GAP_S", "300"))     # keep >= 1 fix per gap (dwell timing survives)
+RETAIN_INTERVAL_S = int(os.getenv("RETAIN_INTERVAL_S", "3600"))
+RETAIN_CHUNK      = int(os.getenv("RETAIN_CHUNK", "50000"))       # rows per transaction
+VACUUM_PAGES      = int(os.getenv("RETAIN_VACUUM_PAGES", "2000")) # freed pages returned per run
+VACUUM_STEP       = int(os.getenv("RETAIN_VACUUM_STEP", "200"))   # ... per write transaction
+ARCHIVE_DIR = os.path.abspath(os.getenv("LOCS_ARCHIVE_DIR", os.path.join(os.path.dirname(DB_PATH), "archive")))
+
+def _user_dir(user, archive_dir):
+    # reversible percent-escape: distinct user ids never share a directory
+    # ("a/b" -> a%2Fb, "a_b" -> a_b); dots are escaped too so "." / ".." stay
+    # inside archive_dir, and "" maps to a bare "%" that quote() never produces
+    return os.path.join(archive_dir, quote(user, safe="").replace(".", "%2E") or "%")
+
+def _day(ts):
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime("%Y-%m-%d")
+
+def downsample_mask(ts, lats, lons, eps_m=RETAIN_DP_EPS_M, max_gap_s=RETAIN_MAX_GAP_S):
+    """Douglas-Peucker keep-mask plus the first fix of every max_gap_s bucket."""
+    keep = douglas_peucker(lats, lons, eps_m)
+    if max_gap_s > 0 and len(ts):
+        b = np.asarray(ts) // max_gap_s
+        keep[np.flatnonzero(np.diff(b)) + 1] = True
+        keep[0] = True
+    return keep
+
+# -------------------------------------------------------------------
+# Archive files
+# -------------------------------------------------------------------
+def _write_day(path, ts, lat, lon, acc):
+    # merge with what is already archived for that day, dedupe on ts, atomic replace
+    if os.path.exists(path):
+        with np.load(path) as z:
+            ts, lat, lon, acc = (np.concatenate([z[k], v]) for k, v in
+                                 (("ts", ts), ("lat", lat), ("lon", lon), ("acc", acc)))
+    ts, idx = np.unique(ts, return_index=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, ts=ts.astype(np.int64), lat=lat[idx].astype(np.float64),
+                        lon=lon[idx].astype(np.float64), acc=acc[idx].astype(np.float32))
+    os.replace(tmp, path)
+
+def read_archive(user, start, end, archive_dir=ARCHIVE_DIR):
+    """Archived fixes for user with start <= ts <= end as (ts, lat, lon, acc) arrays."""
+    d = _user_dir(user, archive_dir)
+    parts = []
+    if os.path.isdir(d):
+        day = datetime.fromtimestamp(int(start), tz=timezone.utc).date()
+        last = datetime.fromtimestamp(int(end), tz=timezone.utc).date()
+        while day <= last:
+            path = os.path.join(d, f"{day.isoformat()}.npz")
+            if os.path.exists(path):
+                with np.load(path) as z:
+                    m = (z["ts"] >= start) & (z["ts"] <= end)
+                    parts.append([z[k][m] for k in ("ts", "lat", "lon", "acc")])
+            day += timedelta(days=1)
+    if not parts:
+        return np.empty(0, np.int64), np.empty(0), np.empty(0), np.empty(0, np.float32)
+    return tuple(np.concatenate(c) for c in zip(*parts))
+
+def history(user, start, end, db=get_conn, archive_dir=ARCHIVE_DIR):
+    """Hot + warm rows from SQLite stitched with archived days; sorted by ts, deduped."""
+    a_ts, a_lat, a_lon, a_acc = read_archive(user, start, end, archive_dir)
+    with db() as conn:
+        rows = conn.execute("SELECT ts, lat, lon, acc FROM locs WHERE user=? AND ts BETWEEN ? AND ? ORDER BY ts",
+                            (user, int(start), int(end))).fetchall()
+    if rows:
+        r = np.asarray(rows, dtype=np.float64)
+        a_ts = np.concatenate([a_ts, r[:, 0].astype(np.int64)])
+        a_lat, a_lon = np.concatenate([a_lat, r[:, 1]]), np.concatenate([a_lon, r[:, 2]])
+        a_acc = np.concatenate([a_acc, np.nan_to_num(r[:, 3]).astype(np.float32)])
+    ts, idx = np.unique(a_ts, return_index=True)
+    return ts, a_lat[idx], a_lon[idx], a_acc[idx]
+
+# -------------------------------------------------------------------
+# Compaction job
+# -------------------------------------------------------------------
+class RetentionJob:
+    def __init__(self, db=get_conn, hot_s=LOCS_HOT_S, archive_s=LOCS_ARCHIVE_S, archive_dir=ARCHIVE_DIR,
+                 interval_s=RETAIN_INTERVAL_S, eps_m=RETAIN_DP_EPS_M, max_gap_s=RETAIN_MAX_GAP_S):
+        self.db = db
+        self.hot_s, self.archive_s = hot_s, archive_s
+        self.archive_dir = archive_dir
+        self.interval_s = interval_s
+        self.eps_m, self.max_gap_s = eps_m, max_gap_s
+        self._stop = threading.Event()
+        self._started = False
+        self.last_run = None
+
+    def start(self):
+        if self._started or self.interval_s <= 0:
+            return
+        self._started = True
+        threading.Thread(target=self._run, name="locs-retention", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s if self.last_run else 30):
+            try:
+                self.run_once()
+            except Exception as e:
+                print("[ERR] locs retention failed:", e)
+
+    def run_once(self, now=None):
+        now = int(time.time()) if now is None else int(now)
+        t0 = time.perf_counter()
+        archived = self.archive(now - self.archive_s)
+        dropped = self.downsample(now - self.hot_s)
+        freed = self.vacuum()
+        self.last_run = {"at": now, "archived": archived, "downsampled_away": dropped,
+                         "pages_freed": freed, "seconds": round(time.perf_counter() - t0, 2)}
+        print(f"[DB] retention: {self.last_run}", flush=True)
+        return self.last_run
+
+    def _users(self, conn, before):
+        return [r[0] for r in conn.execute("SELECT DISTINCT user FROM locs WHERE ts < ?", (before,))]
+
+    def archive(self, before):
+        """Move rows older than `before` to per-user/day npz files; returns rows moved."""
+        moved = 0
+        with self.db() as conn:
+            users = self._users(conn, before)
+        for user in users:
+            while True:
+                with self.db() as conn:
+                    rows = conn.execute("SELECT id, ts, lat, lon, acc FROM locs WHERE user=? AND ts < ? "
+                                        "ORDER BY ts LIMIT ?", (user, before, RETAIN_CHUNK)).fetchall()
+                if not rows:
+                    break
+                r = np.asarray(rows, dtype=np.float64)
+                ids, ts = r[:, 0].astype(np.int64), r[:, 1].astype(np.int64)
+                days = np.array([_day(t) for t in ts])
+                for day in np.unique(days):
+                    m = days == day
+                    _write_day(os.path.join(_user_dir(user, self.archive_dir), f"{day}.npz"),
+                               ts[m], r[m, 2], r[m, 3], np.nan_to_num(r[m, 4]))
+                # files are durable before the rows go
+                with self.db() as conn:
+                    conn.executemany("DELETE FROM locs WHERE id=?", [(int(i),) for i in ids])
+                moved += len(ids)
+                if len(rows) < RETAIN_CHUNK:
+                    break
+        return moved
+
+    def downsample(self, before):
+        """Simplify each user's fixes between its watermark and `before`; returns rows dropped."""
+        dropped = 0
+        with self.db() as conn:
+            users = self._users(conn, before)
+            marks = dict(conn.execute("SELECT user, compacted_until FROM locs_compaction").fetchall())
+        for user in users:
+            since = marks.get(user, 0)
+            with self.db() as conn:
+                # one fix of overlap so the simplified track joins the previous run's output
+                rows = conn.execute(
+                    "SELECT id, ts, lat, lon FROM locs WHERE user=? AND ts >= ? AND ts < ? ORDER BY ts",
+                    (user, since, before)).fetchall()
+            if len(rows) >= 3:
+                r = np.asarray(rows, dtype=np.float64)
+                keep = downsample_mask(r[:, 1].astype(np.int64), r[:, 2], r[:, 3], self.eps_m, self.max_gap_s)
+                gone = r[~keep, 0].astype(np.int64)
+                with self.db() as conn:
+                    for i in range(0, len(gone), RETAIN_CHUNK):
+                        conn.executemany("DELETE FROM locs WHERE id=?", [(int(x),) for x in gone[i:i + RETAIN_CHUNK]])
+                dropped += len(gone)
+            last_ts = int(rows[-1][1]) if rows else since
+            with self.db() as conn:
+                conn.execute("INSERT INTO locs_compaction(user, compacted_until) VALUES(?, ?) "
+                             "ON CONFLICT(user) DO UPDATE SET compacted_until=excluded.compacted_until",
+                             (user, max(last_ts, since)))
+        return dropped
+
+    def vacuum(self):
+        """
+        Return freed pages to the filesystem in VACUUM_STEP-page transactions, so
+        /sos and /loc writers never wait long for the lock. Never runs a full
+        VACUUM: a database created before incremental mode is left alone until
+        tools/compact_locs.py --enable-incremental-vacuum is run offline.
+        """
+        conn = self.db()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print("[DB] auto_vacuum is not INCREMENTAL; freed pages are reused but not returned "
+                  "(run tools/compact_locs.py --enable-incremental-vacuum with the server stopped)", flush=True)
+            return 0
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        left = min(before, VACUUM_PAGES)
+        while left > 0 and not self._stop.is_set():
+            with conn:
+                conn.execute(f"PRAGMA incremental_vacuum({min(VACUUM_STEP, left)})")
+            left -= VACUUM_STEP
+            time.sleep(0.05)        # let queued writers in between steps
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def enable_incremental_vacuum(path=DB_PATH):
+    """
+    Offline, one-off: switch a database created before incremental auto_vacuum
+    to it. The full VACUUM rewrites the file under an exclusive lock, so the
+    server must not be running. Returns the resulting auto_vacuum mode.
+    """
+    import sqlite3
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    finally:
+        conn.close()
@@ -0,0 +1,47 @@
+# spatial.py: proximity queries over latest user positions and alert locations
+# Both tables are mirrored into SQLite R*Trees by triggers (storage migration 7);
+# the R*Tree answers the bbox, haversine trims it to the exact radius.
+import time
+import numpy as np
+from utils.geo import bbox_around, haversine_to_many
+
+def users_within(conn, lat, lon, radius_m, max_age_s=None, exclude=None, limit=200):
+    """Users whose latest fix is within radius_m, nearest first: [{user, ts, lat, lon, acc, dist_m}]."""
+    s, w, n, e = bbox_around(lat, lon, radius_m)
+    sql = ("SELECT p.user, p.ts, p.lat, p.lon, p.acc FROM latest_pos_rtree r JOIN latest_pos p ON p.id = r.id "
+           "WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?")
+    args = [n, s, e, w]
+    if max_age_s is not None:
+        sql += " AND p.ts >= ?"
+        args.append(int(time.time() - max_age_s))
+    rows = [r for r in conn.execute(sql, args).fetchall() if r[0] != exclude]
+    if not rows:
+        return []
+    d = haversine_to_many(lat, lon, [r[2] for r in rows], [r[3] for r in rows])
+    order = np.argsort(d)
+    return [{"user": rows[i][0], "ts": rows[i][1], "lat": rows[i][2], "lon": rows[i][3],
+             "acc": rows[i][4], "dist_m": round(float(d[i]), 1)}
+            for i in order[:limit] if d[i] <= radius_m]
+
+def alerts_in_bbox(conn, south, west, north, east, start=None, end=None, types=None, limit=1000):
+    """Alerts with a location inside the bbox (and optional ts range / types), newest first."""
+    # the R*Tree stores float32 boxes rounded outward; the exact bbox is re-checked
+    # on the alerts row in SQL so LIMIT only counts alerts that are really inside
+    sql = ("SELECT a.id, a.user, a.ts, a.type, a.summary, a.reason, a.lat, a.lon, a.incident_id "
+           "FROM alerts_rtree r JOIN alerts a ON a.id = r.id "
+           "WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ? "
+           "AND a.lat BETWEEN ? AND ? AND a.lon BETWEEN ? AND ?")
+    args = [north, south, east, west, south, north, west, east]
+    if start is not None:
+        sql += " AND a.ts >= ?"
+        args.append(int(start))
+    if end is not None:
+        sql += " AND a.ts <= ?"
+        args.append(int(end))
+    if types:
+        sql += f" AND a.type IN ({','.join('?' * len(types))})"
+        args += list(types)
+    sql += " ORDER BY a.ts DESC LIMIT ?"
+    args.append(int(limit))
+    cols = ("id", "user", "ts", "type", "summary", "reason", "lat", "lon", "incident_id")
+    return [dict(zip(cols, r)) for r in conn.execute(sql, args).fetchall()]
@@ -0,0 +1,185 @@
+# storage.py: pooled SQLite access + schema migrations for events.db
+import os, sqlite3, threading
+
+DB_PATH = os.getenv("SHE_DB_PATH",
+                    os.path.join(os.path.dirname(__file__), "..", "database", "events.db"))
+DB_PATH = os.path.abspath(DB_PATH)
+
+BUSY_TIMEOUT_MS = int(os.getenv("SHE_DB_BUSY_MS", "5000"))
+CACHE_KIB       = int(os.getenv("SHE_DB_CACHE_KIB", "16384"))   # page cache per connection
+
+# Ordered schema migrations; PRAGMA user_version records the last one applied.
+# Append new steps at the end, never edit an applied one.
+MIGRATIONS = [
+    # 1: original tables
+    """
+    CREATE TABLE IF NOT EXISTS locs(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user TEXT, ts INTEGER, lat REAL, lon REAL, acc REAL
+    );
+    CREATE TABLE IF NOT EXISTS alerts(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user TEXT, ts INTEGER, type TEXT,
+        summary TEXT, reason TEXT, evidence TEXT
+    );
+    """,
+    # 2: (user, ts) lookups for recent-history and last-location queries
+    """
+    CREATE INDEX IF NOT EXISTS idx_locs_user_ts ON locs(user, ts DESC);
+    CREATE INDEX IF NOT EXISTS idx_alerts_user_ts ON alerts(user, ts DESC);
+    CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts(ts);
+    """,
+    # 3: persisted POI tile counts (utils/poi_cache.py)
+    """
+    CREATE TABLE IF NOT EXISTS poi_cache(
+        tile_deg REAL, iy INTEGER, ix INTEGER, radius INTEGER,
+        count INTEGER, fetched_at INTEGER,
+        PRIMARY KEY(tile_deg, iy, ix, radius)
+    ) WITHOUT ROWID;
+    """,
+    # 4: durable notification outbox (agents/notifier_agent.py)
+    """
+    CREATE TABLE IF NOT EXISTS outbox(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id TEXT, text TEXT, created_at REAL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL, sent_at REAL, last_error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+    """,
+    # 5: per-user incidents that coalesce repeated alerts (agents/incident_agent.py)
+    """
+    CREATE TABLE IF NOT EXISTS incidents(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user TEXT NOT NULL, state TEXT NOT NULL,
+        opened_at INTEGER, updated_at INTEGER, last_notified_at INTEGER,
+        trigger_count INTEGER NOT NULL DEFAULT 0,
+        reason TEXT, evidence TEXT,
+        resolved_at INTEGER, resolved_reason TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_incidents_user_state ON incidents(user, state);
+    ALTER TABLE alerts ADD COLUMN incident_id INTEGER;
+    """,
+    # 6: per-user watermark of the locs compaction job (utils/retention.py)
+    """
+    CREATE TABLE IF NOT EXISTS locs_compaction(
+        user TEXT PRIMARY KEY, compacted_until INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    """,
+    # 7: spatial indexes (utils/spatial.py): latest position per user and alert
+    #    locations, each mirrored into an R*Tree by triggers so every insert path
+    #    (single, batch, agents) keeps them current
+    """
+    CREATE TABLE IF NOT EXISTS latest_pos(
+        id INTEGER PRIMARY KEY,
+        user TEXT NOT NULL UNIQUE, ts INTEGER, lat REAL, lon REAL, acc REAL
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS latest_pos_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+    CREATE TRIGGER IF NOT EXISTS latest_pos_ai AFTER INSERT ON latest_pos BEGIN
+        INSERT INTO latest_pos_rtree VALUES(NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon);
+    END;
+    CREATE TRIGGER IF NOT EXISTS latest_pos_au AFTER UPDATE OF lat, lon ON latest_pos BEGIN
+        UPDATE latest_pos_rtree SET min_lat=NEW.lat, max_lat=NEW.lat, min_lon=NEW.lon, max_lon=NEW.lon
+        WHERE id=NEW.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS locs_latest_ai AFTER INSERT ON locs BEGIN
+        INSERT INTO latest_pos(user, ts, lat, lon, acc) VALUES(NEW.user, NEW.ts, NEW.lat, NEW.lon, NEW.acc)
+        ON CONFLICT(user) DO UPDATE SET ts=excluded.ts, lat=excluded.lat, lon=excluded.lon, acc=excluded.acc
+        WHERE excluded.ts >= latest_pos.ts;
+    END;
+    INSERT OR IGNORE INTO latest_pos(user, ts, lat, lon, acc)
+        SELECT user, MAX(ts), lat, lon, acc FROM locs GROUP BY user;
+
+    ALTER TABLE alerts ADD COLUMN lat REAL;
+    ALTER TABLE alerts ADD COLUMN lon REAL;
+    CREATE VIRTUAL TABLE IF NOT EXISTS alerts_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+    CREATE TRIGGER IF NOT EXISTS alerts_rtree_ai AFTER INSERT ON alerts
+    WHEN NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL BEGIN
+        INSERT INTO alerts_rtree VALUES(NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon);
+    END;
+    CREATE TRIGGER IF NOT EXISTS alerts_rtree_ad AFTER DELETE ON alerts BEGIN
+        DELETE FROM alerts_rtree WHERE id=OLD.id;
+    END;
+    """,
+    # 8: outbox priority lane (0 = SOS, delivered ahead of everything else)
+    """
+    ALTER TABLE outbox ADD COLUMN priority INTEGER NOT NULL DEFAULT 1;
+    CREATE INDEX IF NOT EXISTS idx_outbox_lane ON outbox(status, priority, next_attempt_at);
+    """,
+]
+
+_local = threading.local()
+_all_conns = []
+_lock = threading.Lock()
+_migrated_path = None
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+    # only takes effect on a new (empty) file; retention.vacuum() then returns
+    # freed pages with small incremental_vacuum steps instead of a full VACUUM
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")      # safe with WAL, avoids fsync per commit
+    conn.execute(f"PRAGMA cache_size=-{CACHE_KIB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+def migrate(conn):
+    """Apply pending MIGRATIONS in order; returns the resulting schema version."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    # executescript() commits first and then autocommits each statement, so the
+    # script and its version bump go in one explicit transaction: a migration
+    # that fails half-way (e.g. after an ALTER TABLE) leaves nothing behind
+    level, conn.isolation_level = conn.isolation_level, None
+    try:
+        for i, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            try:
+                conn.executescript(f"BEGIN IMMEDIATE;\n{script};\nPRAGMA user_version={i};\nCOMMIT;")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            print(f"[DB] migrated schema to v{i}")
+    finally:
+        conn.isolation_level = level
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def init_db(path=None):
+    global _migrated_path
+    path = path or DB_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _lock:
+        if _migrated_path == path:
+            return
+        conn = _connect(path)
+        try:
+            migrate(conn)
+        finally:
+            conn.close()
+        _migrated_path = path
+
+def get_conn():
+    """
+    Per-thread persistent connection. Use as `with get_conn() as conn:` -
+    the context manager commits/rolls back but does NOT close the connection.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        init_db()
+        conn = _connect(DB_PATH)
+        _local.conn = conn
+        with _lock:
+            _all_conns.append(conn)
+    return conn
+
+def close_all():
+    with _lock:
+        while _all_conns:
+            try:
+                _all_conns.pop().close()
+            except Exception:
+                pass
+    _local.__dict__.pop("conn", None)
@@ -0,0 +1,146 @@
+# streaming.py: incremental MFCC + sliding-window scoring for audio that arrives in chunks
+from functools import lru_cache
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from utils.features import CLIP_SECONDS, TOP_DB
+
+N_FFT, HOP, N_MELS = 2048, 512, 128     # librosa.feature.mfcc defaults
+
+@lru_cache(maxsize=None)
+def mel_basis(sr, n_fft=N_FFT, n_mels=N_MELS):
+    """librosa's mel filterbank, built once per (sr, n_fft, n_mels) and shared by every stream."""
+    import librosa
+    m = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).astype(np.float32)
+    m.setflags(write=False)
+    return m
+
+@lru_cache(maxsize=None)
+def _center_pad_mode():
+    # what mfcc_stats() pads its centred STFT with ("constant" since librosa 0.10)
+    import inspect, librosa
+    return inspect.signature(librosa.feature.melspectrogram).parameters["pad_mode"].default
+
+class StreamingMfcc:
+    """
+    Keeps log-mel frames for audio pushed so far; each STFT frame is computed
+    exactly once. window_stats() reproduces mfcc_stats() on the same samples:
+    librosa centres its frames and pads the clip edges, so the few frames that
+    overlap a window's edges are recomputed from the retained samples with the
+    same padding, and only the interior frames come from the shared cache.
+    """
+    def __init__(self, sr, n_mfcc, n_fft=N_FFT, hop=HOP, n_mels=N_MELS):
+        if (n_fft // 2) % hop:
+            raise ValueError("n_fft/2 must be a multiple of hop")
+        self.sr, self.n_mfcc, self.n_fft, self.hop = sr, n_mfcc, n_fft, hop
+        self.mel_basis = mel_basis(sr, n_fft, n_mels)
+        self.pad_mode = _center_pad_mode()
+        n = np.arange(n_fft)
+        self.win = (0.5 - 0.5 * np.cos(2 * np.pi * n / n_fft)).astype(np.float32)   # periodic Hann
+        self._buf = np.zeros(0, dtype=np.float32)     # samples not yet fully consumed
+        self._db = np.zeros((0, n_mels), dtype=np.float32)
+        self._db_offset = 0                           # absolute index of _db[0]
+        self._raw = np.zeros(0, dtype=np.float32)     # samples from _raw_offset on, for edge frames
+        self._raw_offset = 0
+        self.frames_total = 0
+        self.samples_total = 0
+
+    def _log_mel(self, frames):
+        power = np.abs(np.fft.rfft(frames * self.win, axis=-1)) ** 2
+        mel = power.astype(np.float32) @ self.mel_basis.T
+        return 10.0 * np.log10(np.maximum(mel, 1e-10))
+
+    def push(self, y):
+        y = np.asarray(y, dtype=np.float32)
+        self._raw = np.concatenate([self._raw, y])
+        self.samples_total += len(y)
+        self._buf = np.concatenate([self._buf, y])
+        if len(self._buf) < self.n_fft:
+            return 0
+        n = (len(self._buf) - self.n_fft) // self.hop + 1
+        frames = sliding_window_view(self._buf, self.n_fft)[::self.hop][:n]
+        self._db = np.concatenate([self._db, self._log_mel(frames)])
+        self._buf = self._buf[n * self.hop:]
+        self.frames_total += n
+        return n
+
+    def window_stats(self, start, n_samples):
+        """
+        [mean|std|min|max] MFCC stats of the n_samples starting at absolute frame
+        `start` (sample start*hop), equal to mfcc_stats() of those samples.
+        Needs samples_total >= start*hop + n_samples.
+        """
+        from scipy.fft import dct
+        half, hop = self.n_fft // 2, self.hop
+        a = start * hop - self._raw_offset
+        y = self._raw[a:a + n_samples]
+        n_out = 1 + n_samples // hop                  # librosa's centred frame count
+        # centred frame t spans [t*hop - half, t*hop + half) of the window; it is
+        # cached as un-centred frame start + t - half/hop when it lies inside
+        first, last = half // hop, (n_samples - half) // hop
+        head = np.pad(y[:self.n_fft], (half, 0), mode=self.pad_mode)
+        tail = np.pad(y[-self.n_fft:], (0, half), mode=self.pad_mode)
+        t0 = n_samples - self.n_fft                   # window offset of tail[0], before padding
+        left = [head[t * hop:t * hop + self.n_fft] for t in range(first)]
+        right = [tail[t * hop - half - t0:t * hop - half - t0 + self.n_fft] for t in range(last + 1, n_out)]
+        i = start - first - self._db_offset
+        S = np.concatenate([self._log_mel(np.reshape(left, (-1, self.n_fft))), self._db[i + first:i + last + 1],
+                            self._log_mel(np.reshape(right, (-1, self.n_fft)))])
+        S = np.maximum(S, S.max() - TOP_DB)           # power_to_db(top_db=80), per window
+        mfcc = dct(S, axis=-1, type=2, norm="ortho")[:, :self.n_mfcc].T
+        return np.hstack([mfcc.mean(1), mfcc.std(1), mfcc.min(1), mfcc.max(1)])
+
+    def drop_before(self, frame):
+        k = frame - self._db_offset
+        if k > 0:
+            self._db = self._db[k:]
+            self._db_offset = frame
+        k = frame * self.hop - self._raw_offset
+        if k > 0:
+            self._raw = self._raw[k:]
+            self._raw_offset = frame * self.hop
+
+class VoiceStream:
+    """
+    Scores overlapping CLIP_SECONDS windows every `step_s` seconds as audio arrives.
+    score_fn((k, F) features) -> (k,) probabilities.
+    """
+    def __init__(self, sr, n_mfcc, score_fn, window_s=CLIP_SECONDS, step_s=1.0):
+        self.mfcc = StreamingMfcc(sr, n_mfcc)
+        self.score_fn = score_fn
+        self.sr = sr
+        self.win_samples = int(window_s * sr)
+        if self.win_samples < N_FFT:
+            raise ValueError("window shorter than one STFT frame")
+        self.step_frames = max(1, int(round(step_s * sr / HOP)))
+        self.next_start = 0
+        self.windows = []              # [(t_start_s, prob), ...]
+
+    @property
+    def samples(self):
+        return self.mfcc.samples_total
+
+    def push(self, y):
+        """Add samples; returns the newly scored windows."""
+        self.mfcc.push(y)
+        starts = []
+        while self.next_start * HOP + self.win_samples <= self.samples:
+            starts.append(self.next_start)
+            self.next_start += self.step_frames
+        if not starts:
+            return []
+        feats = np.vstack([self.mfcc.window_stats(s, self.win_samples) for s in starts])
+        self.mfcc.drop_before(self.next_start)
+        probs = self.score_fn(feats)
+        new = [(round(s * HOP / self.sr, 3), float(p)) for s, p in zip(starts, probs)]
+        self.windows.extend(new)
+        return new
+
+    def finish(self):
+        """Streams shorter than one window are zero-padded to a single window, like /voice_score."""
+        if self.windows:
+            return []
+        return self.push(np.zeros(max(0, self.win_samples - self.samples), dtype=np.float32))
+
+    @property
+    def max_prob(self):
+        return max((p for _, p in self.windows), default=None)
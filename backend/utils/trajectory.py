@@ -0,0 +1,119 @@
+# trajectory.py: in-memory per-user GPS ring buffers with running dwell state
+import os, threading
+from collections import OrderedDict
+import numpy as np
+from utils.geo import haversine
+
+TRAJ_CAPACITY = 64       # recent fixes kept per user
+DWELL_RADIUS_M = 15      # fixes within this radius of the anchor count as "not moved"
+TRAJ_MAX_USERS = int(os.getenv("TRAJ_MAX_USERS", "20000"))   # buffers kept in memory (LRU)
+
+class Trajectory:
+    """
+    Fixed-size ring buffer of (ts, lat, lon) plus an anchor point.
+    The anchor is the first fix of the current stay; every new fix either stays
+    inside DWELL_RADIUS_M of it (dwell grows) or becomes the new anchor.
+    append() and dwell_seconds() are O(1).
+    """
+    __slots__ = ("ts", "lat", "lon", "head", "size", "radius_m",
+                 "anchor_ts", "anchor_lat", "anchor_lon", "last_ts")
+
+    def __init__(self, capacity=TRAJ_CAPACITY, radius_m=DWELL_RADIUS_M):
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.lat = np.zeros(capacity, dtype=np.float64)
+        self.lon = np.zeros(capacity, dtype=np.float64)
+        self.head = 0           # next write slot
+        self.size = 0
+        self.radius_m = radius_m
+        self.anchor_ts = self.anchor_lat = self.anchor_lon = None
+        self.last_ts = None
+
+    def append(self, ts, lat, lon):
+        """Add a fix; out-of-order (older than the newest) fixes are ignored."""
+        if self.last_ts is not None and ts < self.last_ts:
+            return False
+        i = self.head
+        self.ts[i], self.lat[i], self.lon[i] = ts, lat, lon
+        self.head = (i + 1) % len(self.ts)
+        self.size = min(self.size + 1, len(self.ts))
+        self.last_ts = ts
+        if self.anchor_ts is None or \
+                haversine(self.anchor_lat, self.anchor_lon, lat, lon) >= self.radius_m:
+            self.anchor_ts, self.anchor_lat, self.anchor_lon = ts, lat, lon
+        return True
+
+    def dwell_seconds(self):
+        if self.anchor_ts is None:
+            return 0
+        return int(self.last_ts - self.anchor_ts)
+
+    def last(self):
+        if not self.size:
+            return None
+        i = (self.head - 1) % len(self.ts)
+        return int(self.ts[i]), float(self.lat[i]), float(self.lon[i])
+
+    def arrays(self):
+        """Return (ts, lat, lon) copies in ascending time order."""
+        n, cap = self.size, len(self.ts)
+        idx = (np.arange(self.head - n, self.head) % cap)
+        return self.ts[idx], self.lat[idx], self.lon[idx]
+
+class TrajectoryStore:
+    """
+    Thread-safe user -> Trajectory map, bounded to the max_users most recently
+    seen users (least recently used buffers are dropped).
+    loader(user, n) -> [(ts, lat, lon), ...] ascending; used to warm a user's
+    buffer from the DB the first time we see them after a restart or eviction.
+    """
+    def __init__(self, loader=None, capacity=TRAJ_CAPACITY, radius_m=DWELL_RADIUS_M,
+                 max_users=TRAJ_MAX_USERS):
+        self.loader = loader
+        self.capacity = capacity
+        self.radius_m = radius_m
+        self.max_users = max_users
+        self._trajs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user):
+        with self._lock:
+            tr = self._trajs.get(user)
+            if tr is not None:
+                self._trajs.move_to_end(user)
+                return tr
+        tr = Trajectory(self.capacity, self.radius_m)
+        if self.loader is not None:
+            try:
+                for ts, lat, lon in self.loader(user, self.capacity):
+                    tr.append(int(ts), float(lat), float(lon))
+            except Exception as e:
+                print("[WARN] trajectory warm-up failed:", user, e)
+        with self._lock:
+            tr = self._trajs.setdefault(user, tr)
+            self._trajs.move_to_end(user)
+            while len(self._trajs) > self.max_users:
+                self._trajs.popitem(last=False)
+            return tr
+
+    def __len__(self):
+        with self._lock:
+            return len(self._trajs)
+
+    def append(self, user, ts, lat, lon):
+        tr = self.get(user)
+        with self._lock:
+            return tr.append(ts, lat, lon)
+
+    def dwell_seconds(self, user):
+        tr = self.get(user)
+        with self._lock:
+            return tr.dwell_seconds()
+
+    def last(self, user):
+        tr = self.get(user)
+        with self._lock:
+            return tr.last()
+
+    def forget(self, user):
+        with self._lock:
+            self._trajs.pop(user, None)
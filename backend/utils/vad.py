@@ -0,0 +1,70 @@
+# vad.py: cheap energy / zero-crossing voice-activity gate run before MFCC + model
+import os
+from collections import namedtuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+VAD_ENABLED      = os.getenv("VAD_ENABLED", "1") == "1"
+VAD_FRAME_MS     = float(os.getenv("VAD_FRAME_MS", "25"))
+VAD_HOP_MS       = float(os.getenv("VAD_HOP_MS", "10"))
+VAD_MIN_DBFS     = float(os.getenv("VAD_MIN_DBFS", "-50"))   # frames quieter than this are never speech
+VAD_SNR_DB       = float(os.getenv("VAD_SNR_DB", "6"))       # ... nor frames this close to the noise floor
+VAD_ZCR_MAX      = float(os.getenv("VAD_ZCR_MAX", "0.35"))   # hiss / rustle crosses zero far more often
+VAD_MIN_ACTIVE_S = float(os.getenv("VAD_MIN_ACTIVE_S", "0.2"))
+VAD_HANGOVER_MS  = float(os.getenv("VAD_HANGOVER_MS", "200")) # bridge short gaps between syllables
+
+# reason: ok | silent | no_voice_activity | too_short ; start/end in samples
+VadResult = namedtuple("VadResult", "active reason start end active_s peak_dbfs noise_dbfs")
+
+def frame_features(y, sr, frame_ms=VAD_FRAME_MS, hop_ms=VAD_HOP_MS):
+    """(F,) RMS level in dBFS and (F,) zero-crossing rate per frame, plus the hop in samples."""
+    y = np.asarray(y, dtype=np.float32)
+    n = max(1, int(sr * frame_ms / 1000))
+    hop = max(1, int(sr * hop_ms / 1000))
+    if len(y) < n:
+        y = np.pad(y, (0, n - len(y)))
+    frames = sliding_window_view(y, n)[::hop]                      # strided view, no copy
+    rms = np.sqrt(np.einsum("ij,ij->i", frames, frames) / n)
+    db = 20 * np.log10(rms + 1e-10)
+    s = np.signbit(frames)
+    zcr = np.count_nonzero(s[:, 1:] != s[:, :-1], axis=1) / (n - 1 if n > 1 else 1)
+    return db, zcr, hop
+
+def detect(y, sr, min_dbfs=VAD_MIN_DBFS, snr_db=VAD_SNR_DB, zcr_max=VAD_ZCR_MAX,
+           min_active_s=VAD_MIN_ACTIVE_S, hangover_ms=VAD_HANGOVER_MS,
+           frame_ms=VAD_FRAME_MS, hop_ms=VAD_HOP_MS):
+    """Speech-like activity in a mono clip; start/end bound the active region."""
+    if len(y) < int(sr * frame_ms / 1000):
+        return VadResult(False, "too_short", 0, len(y), 0.0, None, None)
+    db, zcr, hop = frame_features(y, sr, frame_ms, hop_ms)
+    peak, noise = float(db.max()), float(np.percentile(db, 10))
+    if peak < min_dbfs:
+        return VadResult(False, "silent", 0, len(y), 0.0, peak, noise)
+    speech = (db >= max(min_dbfs, noise + snr_db)) & (zcr <= zcr_max)
+    k = int(hangover_ms / hop_ms)
+    if k > 0 and speech.any():
+        speech = np.convolve(speech, np.ones(2 * k + 1, dtype=int), mode="same") > 0
+    active_s = float(np.count_nonzero(speech) * hop / sr)
+    if active_s < min_active_s:
+        return VadResult(False, "no_voice_activity", 0, len(y), active_s, peak, noise)
+    idx = np.flatnonzero(speech)
+    n_frame = int(sr * frame_ms / 1000)
+    start, end = int(idx[0] * hop), min(len(y), int(idx[-1] * hop + n_frame))
+    return VadResult(True, "ok", start, end, active_s, peak, noise)
+
+def select_window(y, sr, seconds, vad=None):
+    """
+    The part of y the model should see: the active region if it fits in
+    `seconds`, otherwise the most energetic `seconds`-long window inside it.
+    Without activity it falls back to the first `seconds` (old behaviour).
+    """
+    n = int(sr * seconds)
+    vad = vad or detect(y, sr)
+    if not vad.active:
+        return y[:n]
+    region = y[vad.start:vad.end]
+    if len(region) <= n:
+        return region
+    e = np.concatenate([[0.0], np.cumsum(np.square(region, dtype=np.float64))])
+    best = int(np.argmax(e[n:] - e[:-n]))
+    return region[best:best + n]
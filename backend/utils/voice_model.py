@@ -0,0 +1,39 @@
+# voice_model.py: load a voice classifier artifact and score MFCC feature rows
+import os
+import numpy as np
+
+class VoiceModel:
+    """Uniform predict_proba over the CUSTOM sklearn pipeline, the CREMA-D Keras net and compiled exports."""
+    def __init__(self, flag, model, scaler=None, n_mfcc=20, sr=16000, engine=None):
+        self.flag, self.model, self.scaler = flag, model, scaler
+        self.n_mfcc, self.sr = n_mfcc, sr
+        self.engine = engine or ("sklearn" if flag == "CUSTOM" else "keras")
+        self.spec = None      # load_voice_model() kwargs, so worker processes can load the same artifact
+
+    def predict_proba(self, feats):
+        """(N, F) features -> (N,) distress probabilities."""
+        feats = np.asarray(feats)
+        if self.engine == "compiled":
+            return self.model.predict_proba(feats)     # scaler already folded into the weights
+        if self.flag == "CUSTOM":
+            return self.model.predict_proba(feats)[:, 1].astype(float)
+        return self.model.predict(self.scaler.transform(feats), verbose=0)[:, 0].astype(float)
+
+def load_voice_model(flag, model_path, scaler_path=None, n_mfcc=20, sr=16000):
+    if model_path.endswith(".npz"):
+        # exported by voice_model/train_voice.py; pure NumPy, no joblib / TensorFlow
+        from utils.compiled_model import CompiledModel
+        vm = VoiceModel(flag, CompiledModel(model_path), None, n_mfcc, sr, engine="compiled")
+        vm.spec = {"flag": flag, "model_path": model_path, "scaler_path": None, "n_mfcc": n_mfcc, "sr": sr}
+        return vm
+    import joblib
+    if flag == "CUSTOM":
+        model = joblib.load(model_path)
+    else:
+        from tensorflow.keras.models import load_model
+        model = load_model(model_path)
+    scaler = joblib.load(scaler_path) if scaler_path and os.path.exists(scaler_path) else None
+    vm = VoiceModel(flag, model, scaler, n_mfcc, sr)
+    vm.spec = {"flag": flag, "model_path": model_path, "scaler_path": scaler_path,
+               "n_mfcc": n_mfcc, "sr": sr}
+    return vm
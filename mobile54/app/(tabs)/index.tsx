@@ -8,6 +8,17 @@ const BACKEND = "http://10.20.69.174:5000"; // ✅ Flask backend IP
 
 type Coords = { latitude: number; longitude: number; accuracy?: number };
 
+// Server-chosen reporting cadence (the "report" field of /loc and /sos replies):
+// send again after interval_s, or earlier once moved min_distance_m.
+type Report = { tier?: string; interval_s: number; min_distance_m: number };
+const DEFAULT_REPORT: Report = { interval_s: 15, min_distance_m: 10 }; // until the server answers
+
+function metersBetween(a: { latitude: number; longitude: number }, b: { latitude: number; longitude: number }) {
+  return (
+    Math.sqrt(Math.pow(a.latitude - b.latitude, 2) + Math.pow(a.longitude - b.longitude, 2)) * 111139
+  );
+}
+
 export default function Home() {
   const [coords, setCoords] = useState<Coords | null>(null);
   const [tracking, setTracking] = useState(false);
@@ -15,6 +26,100 @@ export default function Home() {
   const [lastCoords, setLastCoords] = useState<Coords | null>(null);
   const [lastMoveTime, setLastMoveTime] = useState<number>(Date.now());
   const watchRef = useRef<Location.LocationSubscription | null>(null);
+  const reportRef = useRef<Report>(DEFAULT_REPORT);
+  const latestRef = useRef<Coords | null>(null);
+  const lastSentRef = useRef<{ t: number; latitude: number; longitude: number } | null>(null);
+  const heartbeatRef = useRef<ReturnType<typeof setInterval> | null>(null);
+
+  // ---------------------------
+  // Adaptive reporting
+  // ---------------------------
+  function dueToSend(c: Coords) {
+    const last = lastSentRef.current;
+    const r = reportRef.current;
+    if (!last) return true;
+    if (Date.now() - last.t >= r.interval_s * 1000) return true;
+    return r.min_distance_m > 0 && metersBetween(last, c) >= r.min_distance_m;
+  }
+
+  function applyReport(r?: Report, resubscribe = false) {
+    if (!r || !r.interval_s) return;
+    const cur = reportRef.current;
+    reportRef.current = r;
+    // re-subscribe when the cadence changed (or the server just rejected ours)
+    if (watchRef.current && (resubscribe || r.interval_s !== cur.interval_s || r.min_distance_m !== cur.min_distance_m)) {
+      watch(r);
+    }
+  }
+
+  async function postFix(c: Coords) {
+    lastSentRef.current = { t: Date.now(), latitude: c.latitude, longitude: c.longitude };
+    try {
+      const res = await fetch(`${BACKEND}/loc`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          user: "prakriti",
+          lat: c.latitude,
+          lon: c.longitude,
+          acc: c.accuracy,
+          ts: Math.floor(Date.now() / 1000),
+        }),
+      });
+      const j = await res.json().catch(() => null);
+      console.log("Location response:", res.status, j);
+      if (res.status === 429) {
+        // too early for the server's cadence: adopt its report like on a 200 and
+        // send again exactly when it will be accepted, not a full interval later
+        applyReport(j?.report, true);
+        const wait = Number(res.headers.get("Retry-After") ?? j?.retry_after);
+        if (Number.isFinite(wait)) {
+          const t = Date.now() - (reportRef.current.interval_s - wait) * 1000;
+          lastSentRef.current = { t, latitude: c.latitude, longitude: c.longitude };
+        }
+        setMessage(`⏳ loc too early, next in ${Number.isFinite(wait) ? wait : "?"}s`);
+      } else {
+        applyReport(j?.report);
+        const r = reportRef.current;
+        setMessage(`📡 loc sent: ${res.status} (${r.tier ?? "default"}, every ${r.interval_s}s)`);
+      }
+    } catch (e: any) {
+      console.log("❌ Failed to send location:", e?.message || e);
+      setMessage(`❌ loc error: ${e?.message || e}`);
+    }
+  }
+
+  function onPosition(pos: Location.LocationObject) {
+    const { latitude, longitude, accuracy } = pos.coords;
+    const c = { latitude, longitude, accuracy: accuracy ?? undefined };
+    setCoords(c);
+    latestRef.current = c;
+
+    // --- Detect movement
+    if (lastCoords) {
+      const dist = metersBetween({ latitude, longitude }, lastCoords);
+      if (dist > 10) {
+        setLastMoveTime(Date.now()); // moved more than 10 meters
+      }
+    }
+    setLastCoords({ latitude, longitude });
+
+    // --- Send location to backend (only as often as the server asked)
+    if (dueToSend(c)) postFix(c);
+  }
+
+  async function watch(r: Report) {
+    watchRef.current?.remove();
+    watchRef.current = await Location.watchPositionAsync(
+      {
+        // sparse tiers don't need a GPS-grade fix; saves battery
+        accuracy: r.interval_s >= 60 ? Location.Accuracy.Balanced : Location.Accuracy.High,
+        timeInterval: r.interval_s * 1000,
+        distanceInterval: r.min_distance_m,
+      },
+      onPosition
+    );
+  }
 
   // ---------------------------
   // Start location tracking
@@ -26,53 +131,21 @@ export default function Home() {
       return;
     }
 
-    const sub = await Location.watchPositionAsync(
-      { accuracy: Location.Accuracy.High, timeInterval: 3000, distanceInterval: 2 },
-      async (pos) => {
-        const { latitude, longitude, accuracy } = pos.coords;
-        setCoords({ latitude, longitude, accuracy });
-
-        // --- Detect movement
-        if (lastCoords) {
-          const dist =
-            Math.sqrt(
-              Math.pow(latitude - lastCoords.latitude, 2) +
-                Math.pow(longitude - lastCoords.longitude, 2)
-            ) * 111139; // degrees to meters
-          if (dist > 10) {
-            setLastMoveTime(Date.now()); // moved more than 10 meters
-          }
-        }
-        setLastCoords({ latitude, longitude });
-
-        // --- Send location to backend
-        try {
-          const res = await fetch(`${BACKEND}/loc`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-              user: "prakriti",
-              lat: latitude,
-              lon: longitude,
-              acc: accuracy,
-              ts: Math.floor(Date.now() / 1000),
-            }),
-          });
-          const text = await res.text();
-          console.log("Location response:", res.status, text);
-          setMessage(`📡 loc sent: ${res.status}`);
-        } catch (e: any) {
-          console.log("❌ Failed to send location:", e?.message || e);
-          setMessage(`❌ loc error: ${e?.message || e}`);
-        }
-      }
-    );
-
-    watchRef.current = sub;
+    await watch(reportRef.current);
+    // a phone that isn't moving may not fire the watcher at all (distance filter):
+    // resend the latest fix once the interval is up so the server still sees the dwell
+    heartbeatRef.current = setInterval(() => {
+      const c = latestRef.current;
+      if (c && dueToSend(c)) postFix(c);
+    }, 1000);
     setTracking(true);
   }
 
   function stopTracking() {
+    if (heartbeatRef.current) {
+      clearInterval(heartbeatRef.current);
+      heartbeatRef.current = null;
+    }
     if (watchRef.current) {
       watchRef.current.remove();
       watchRef.current = null;
@@ -94,6 +167,9 @@ export default function Home() {
       });
       const text = await res.text();
       console.log("SOS response:", res.status, text);
+      try {
+        applyReport(JSON.parse(text)?.report); // an SOS switches to dense reporting right away
+      } catch {}
       setMessage(`🚨 sos sent: ${res.status}`);
       Alert.alert("🚨 SOS sent!", "Your contacts have been notified.");
     } catch (e: any) {
@@ -19,6 +19,8 @@ def parse_args():
     p.add_argument("--threshold", type=float, default=0.60,
                    help="Decision threshold for distress label (prob >= threshold => distress)")
     p.add_argument("--csv", default="", help="Optional path to save per-file results as CSV")
+    p.add_argument("--batch", type=int, default=0,
+                   help="Send N clips per request to <url>/batch instead of one POST per file (0 = off)")
     return p.parse_args()
 
 def send_one(url, user, lat, lon, path):
@@ -34,6 +36,25 @@ def send_one(url, user, lat, lon, path):
         j = {"ok": False, "raw": r.text}
     return r.status_code, j
 
+def send_batch(url, paths, threshold):
+    handles = [open(p, "rb") for p in paths]
+    try:
+        r = requests.post(
+            url.rstrip("/") + "/batch",
+            files=[("audio", (os.path.basename(p), fh, "audio/wav")) for p, fh in zip(paths, handles)],
+            data={"threshold": str(threshold)}
+        )
+    finally:
+        for fh in handles:
+            fh.close()
+    try:
+        j = r.json()
+    except Exception:
+        j = {"ok": False, "raw": r.text}
+    if r.status_code != 200 or not j.get("ok"):
+        return [(r.status_code, j)] * len(paths)
+    return [(200, res) for res in j["results"]]
+
 def main():
     args = parse_args()
     BASE = args.base
@@ -52,8 +73,13 @@ def main():
     for cname, true_lab in CLASSES:
         files = sorted(glob.glob(os.path.join(BASE, cname, "*.wav")))
         print(f"[{cname.upper()}] {len(files)} files")
-        for p in files:
-            code, j = send_one(URL, USER, LAT, LON, p)
+        if args.batch > 0:
+            replies = []
+            for k in range(0, len(files), args.batch):
+                replies.extend(send_batch(URL, files[k:k + args.batch], THR))
+        else:
+            replies = [send_one(URL, USER, LAT, LON, p) for p in files]
+        for p, (code, j) in zip(files, replies):
             fname = os.path.basename(p)
             if code != 200 or not j.get("ok"):
                 print(f"  - {fname:30s} -> ERROR: {j}")
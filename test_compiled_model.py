@@ -0,0 +1,76 @@
+# test_compiled_model.py
+# The NumPy-only CompiledModel must reproduce the sklearn / Keras model it was
+# exported from (scaler folded into the first layer, every scaler mode).
+#   python test_compiled_model.py      (or: pytest test_compiled_model.py)
+import os, sys, tempfile
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from utils.compiled_model import export_linear, export_keras, CompiledModel, parity
+
+N_FEATURES = 80                      # mfcc_stats: mean|std|min|max of 20 MFCCs
+
+def data(n=400):
+    # MFCC-like scales: large offset / spread on the first coefficients
+    rng = np.random.default_rng(0)
+    X = rng.normal(0, 1, (n, N_FEATURES)) * np.linspace(80, 2, N_FEATURES) + np.linspace(-300, 10, N_FEATURES)
+    # label by a noisy projection of the centred features, split at its median: both classes, ~50/50
+    z = (X - X.mean(axis=0)) / X.std(axis=0)
+    s = z @ rng.normal(0, 1, N_FEATURES) + rng.normal(0, 1, n)
+    y = (s > np.median(s)).astype(int)
+    return X.astype(np.float32), y
+
+def _check(reference, export, X, atol):
+    with tempfile.TemporaryDirectory() as d:
+        path = export(os.path.join(d, "model.npz"))
+        cm = CompiledModel(path)
+        assert cm.n_features == X.shape[1]
+        diff = parity(reference, cm.predict_proba, X)
+    assert diff <= atol, f"max |Δp| = {diff:.2e} > {atol:g}"
+    return diff
+
+def test_linear_matches_sklearn():
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.linear_model import LogisticRegression
+    X, y = data()
+    for with_mean, with_std in ((True, True), (False, True), (True, False), (False, False)):
+        model = make_pipeline(StandardScaler(with_mean=with_mean, with_std=with_std),
+                              LogisticRegression(max_iter=2000)).fit(X, y)
+        _check(lambda X: model.predict_proba(X)[:, 1], lambda p: export_linear(model, p), X, atol=1e-4)
+
+def test_bare_linear_matches_sklearn():
+    from sklearn.linear_model import LogisticRegression
+    X, y = data()
+    model = LogisticRegression(max_iter=2000).fit(X / 100, y)
+    _check(lambda X: model.predict_proba(X)[:, 1], lambda p: export_linear(model, p), X / 100, atol=1e-4)
+
+def test_mlp_matches_keras():
+    tf = pytest.importorskip("tensorflow")
+    from sklearn.preprocessing import StandardScaler
+    X, y = data()
+    scaler = StandardScaler().fit(X)
+    net = tf.keras.Sequential([
+        tf.keras.layers.Input((N_FEATURES,)),
+        tf.keras.layers.Dense(32),
+        tf.keras.layers.BatchNormalization(),
+        tf.keras.layers.Activation("relu"),
+        tf.keras.layers.Dropout(0.2),
+        tf.keras.layers.Dense(16, activation="relu"),
+        tf.keras.layers.Dense(1, activation="sigmoid"),
+    ])
+    net.compile("adam", "binary_crossentropy")
+    net.fit(scaler.transform(X), y, epochs=3, verbose=0)
+    ref = lambda X: net.predict(scaler.transform(X), verbose=0)[:, 0]
+    _check(ref, lambda p: export_keras(net, p, scaler=scaler), X, atol=1e-4)
+    _check(ref, lambda p: export_keras(net, p, scaler=scaler, quantize=True), X, atol=2e-2)
+
+if __name__ == "__main__":
+    test_linear_matches_sklearn()
+    test_bare_linear_matches_sklearn()
+    try:
+        test_mlp_matches_keras()
+    except pytest.skip.Exception as e:
+        print(f"⚠️ skipped Keras parity: {e}")
+    print("✅ compiled model matches sklearn / Keras outputs")
@@ -0,0 +1,38 @@
+# test_feature_batch.py
+# Batched MFCC features must not depend on the other clips in the batch:
+# every row of mfcc_stats_batch equals mfcc_stats of that clip alone.
+#   python test_feature_batch.py      (or: pytest test_feature_batch.py)
+import os, sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from utils.features import mfcc_stats, mfcc_stats_batch, stack_clips
+
+SR, N_MFCC = 16000, 20
+
+def clips():
+    rng = np.random.default_rng(0)
+    t = np.arange(SR * 4) / SR
+    loud = 0.9 * np.sin(2 * np.pi * 440 * t)
+    quiet = 1e-3 * np.sin(2 * np.pi * 220 * t) + 1e-5 * rng.standard_normal(len(t))
+    short = 0.05 * rng.standard_normal(SR // 2)               # zero-padded in the batch
+    return [loud.astype(np.float32), quiet.astype(np.float32), short.astype(np.float32)]
+
+def test_batch_matches_single():
+    ys = clips()
+    batch = mfcc_stats_batch(stack_clips(ys, SR), SR, N_MFCC)
+    for i, y in enumerate(ys):
+        single = mfcc_stats(y, SR, N_MFCC)
+        np.testing.assert_allclose(batch[i], single, rtol=1e-4, atol=1e-3,
+                                   err_msg=f"clip {i} changed when batched")
+
+def test_batch_order_independent():
+    ys = clips()
+    a = mfcc_stats_batch(stack_clips(ys, SR), SR, N_MFCC)
+    b = mfcc_stats_batch(stack_clips(ys[::-1], SR), SR, N_MFCC)[::-1]
+    np.testing.assert_allclose(a, b, rtol=1e-4, atol=1e-3)
+
+if __name__ == "__main__":
+    test_batch_matches_single()
+    test_batch_order_independent()
+    print("✅ batched features match single-clip features")
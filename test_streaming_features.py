@@ -0,0 +1,46 @@
+# test_streaming_features.py
+# Streamed sliding windows must score the same features the model was trained
+# on: every window of VoiceStream equals mfcc_stats of those samples, edges too.
+#   python test_streaming_features.py      (or: pytest test_streaming_features.py)
+import os, sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from utils.features import mfcc_stats
+from utils.streaming import VoiceStream
+
+SR, N_MFCC = 16000, 20
+
+def signal(seconds=9):
+    rng = np.random.default_rng(1)
+    t = np.arange(SR * seconds) / SR
+    y = 0.3 * np.sin(2 * np.pi * 300 * t) * (1 + np.sin(2 * np.pi * 0.7 * t)) + 0.02 * rng.standard_normal(len(t))
+    return y.astype(np.float32)
+
+def stream(y, chunk=3000):
+    feats = []
+    vs = VoiceStream(SR, N_MFCC, lambda F: feats.append(F) or np.zeros(len(F)))
+    for i in range(0, len(y), chunk):
+        vs.push(y[i:i + chunk])
+    vs.finish()
+    return vs, np.vstack(feats)
+
+def test_streamed_windows_match_mfcc_stats():
+    y = signal()
+    vs, feats = stream(y)
+    assert len(vs.windows) > 1
+    for (t, _), f in zip(vs.windows, feats):
+        a = int(round(t * SR))
+        np.testing.assert_allclose(f, mfcc_stats(y[a:a + 4 * SR], SR, N_MFCC), rtol=1e-4, atol=1e-3,
+                                   err_msg=f"window at {t}s differs from mfcc_stats")
+
+def test_short_stream_matches_padded_clip():
+    y = signal()[:SR]
+    vs, feats = stream(y)
+    assert len(vs.windows) == 1
+    np.testing.assert_allclose(feats[0], mfcc_stats(y, SR, N_MFCC), rtol=1e-4, atol=1e-3)
+
+if __name__ == "__main__":
+    test_streamed_windows_match_mfcc_stats()
+    test_short_stream_matches_padded_clip()
+    print("✅ streamed windows match mfcc_stats")
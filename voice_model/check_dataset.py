@@ -1,24 +1,256 @@
-import os
-import librosa
+# check_dataset.py: parallel dataset auditor + manifest for train_voice.py
+#   python check_dataset.py              # headers + hashes (thread pool), nothing is decoded
+#   python check_dataset.py --levels     # + decode samples for the peak / silence / clipping scan
+#   python check_dataset.py --deep       # + levels, decode through the server path and run the VAD gate
+# Each file is read once: the bytes are hashed and their header parsed from
+# memory (soundfile metadata, no librosa). Unchanged files (same size + mtime)
+# are taken from the previous manifest without being read at all.
+import os, io, sys, json, time, hashlib, argparse
 from glob import glob
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import soundfile as sf
 
-# Base directory of your dataset
-BASE = os.path.join(os.path.dirname(__file__), "dataset")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE = os.path.join(BASE_DIR, "dataset")
 CLASSES = ["normal", "distress"]
+MANIFEST_PATH = os.path.join(BASE_DIR, "artifacts", "dataset_manifest.json")
+MANIFEST_VERSION = 1
 
-def analyze_audio(path):
+SILENT_DBFS = -50.0      # peak below this: nothing for the model to hear (matches VAD_MIN_DBFS)
+CLIP_LEVEL  = 0.999      # |sample| at or above this counts as full scale
+CLIP_FRAC   = 0.001      # ... and this share of such samples marks the file clipped
+DUR_BINS    = [0, 1, 2, 4, 8, 16, 32]
+
+def _dbfs(x):
+    return round(float(20 * np.log10(x + 1e-10)), 1)
+
+def _listing(base=BASE):
+    return [(cls, f) for cls in CLASSES for f in sorted(glob(os.path.join(base, cls, "*.wav")))]
+
+# -------------------------------------------------------------------
+# Per-file audit
+# -------------------------------------------------------------------
+def audit_file(job):
+    """One manifest entry. job = (cls, path, levels)."""
+    cls, path, levels = job
+    st = os.stat(path)
+    e = {"path": os.path.relpath(path, BASE_DIR), "class": cls, "size": st.st_size,
+         "mtime_ns": st.st_mtime_ns, "issues": []}
+    with open(path, "rb") as fh:
+        buf = fh.read()
+    # sha1 of the raw bytes: the same key feature_cache uses for its rows
+    e["hash"] = hashlib.sha1(buf).hexdigest()
+    try:
+        info = sf.info(io.BytesIO(buf))
+    except Exception as ex:
+        e["issues"].append(f"corrupt: {ex}".strip())
+        return e
+    e.update({"sr": info.samplerate, "channels": info.channels, "frames": info.frames,
+              "duration": round(info.frames / info.samplerate, 3) if info.samplerate else 0.0,
+              "subtype": info.subtype})
+    if not info.frames or not info.samplerate:
+        e["issues"].append("corrupt: no audio frames")
+        return e
+    if levels:
+        try:
+            y, _ = sf.read(io.BytesIO(buf), dtype="float32", always_2d=True)   # native rate, no resample
+        except Exception as ex:
+            e["issues"].append(f"corrupt: {ex}".strip())
+            return e
+        if len(y) < info.frames:
+            e["issues"].append(f"truncated: {len(y)}/{info.frames} frames")
+        a = np.abs(y)
+        peak = float(a.max()) if a.size else 0.0
+        e["peak_dbfs"] = _dbfs(peak)
+        e["rms_dbfs"] = _dbfs(float(np.sqrt(np.mean(np.square(y, dtype=np.float64)))) if y.size else 0.0)
+        e["clip_frac"] = round(float(np.count_nonzero(a >= CLIP_LEVEL)) / max(a.size, 1), 5)
+        if e["peak_dbfs"] < SILENT_DBFS:
+            e["issues"].append("silent")
+        if e["clip_frac"] >= CLIP_FRAC:
+            e["issues"].append("clipped")
+    return e
+
+def deep_check(job):
+    """Decode as the server/training does and run the VAD gate; (path, fields)."""
+    path, sr = job
+    sys.path.insert(0, os.path.join(BASE_DIR, "..", "backend"))
+    from utils.audio import decode_audio
+    from utils import vad
+    out = {"issues": []}
     try:
-        y, sr = librosa.load(path, sr=None, mono=True)
-        duration = round(len(y) / sr, 2)
-        return os.path.basename(path), sr, duration
-    except Exception as e:
-        return os.path.basename(path), None, f"ERROR: {e}"
+        with open(path, "rb") as fh:
+            y = decode_audio(fh.read(), os.path.splitext(path)[1].lower(), sr)
+    except Exception as ex:
+        out["issues"].append(f"undecodable: {ex}".strip())
+        return path, out
+    r = vad.detect(y, sr)
+    out["vad"] = r.reason
+    out["active_s"] = round(r.active_s, 2)
+    if not r.active:
+        out["issues"].append(f"gated: {r.reason}")
+    return path, out
+
+# -------------------------------------------------------------------
+# Manifest
+# -------------------------------------------------------------------
+def _read_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as fh:
+            m = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return m if m.get("version") == MANIFEST_VERSION else None
+
+def _write_manifest(m, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(m, fh, indent=1)
+    os.replace(path + ".tmp", path)
+
+def mark_duplicates(entries):
+    """Sets duplicate_of on every copy after the first; returns {hash: [entries]} for repeated hashes."""
+    by_hash = defaultdict(list)
+    for e in entries:
+        e.pop("duplicate_of", None)
+        if "hash" in e:
+            by_hash[e["hash"]].append(e)
+    groups = {h: es for h, es in by_hash.items() if len(es) > 1}
+    for es in groups.values():
+        for e in es[1:]:
+            e["duplicate_of"] = es[0]["path"]
+    return groups
+
+def manifest_files(base=BASE, path=MANIFEST_PATH):
+    """
+    (files, labels, hashes) for train_voice.py from a manifest that still
+    matches the dataset on disk (same files, sizes and mtimes), or None.
+    Corrupt files, later copies of duplicates and clips that appear under
+    both labels are left out.
+    """
+    m = _read_manifest(path)
+    if m is None:
+        return None
+    entries = {os.path.abspath(os.path.join(BASE_DIR, e["path"])): e for e in m["files"]}
+    listing = _listing(base)
+    if {os.path.abspath(f) for _, f in listing} != set(entries):
+        return None
+    for f, e in entries.items():
+        st = os.stat(f)
+        if st.st_size != e["size"] or st.st_mtime_ns != e["mtime_ns"]:
+            return None
+    labels = defaultdict(set)
+    for e in entries.values():
+        if "hash" in e:
+            labels[e["hash"]].add(e["class"])
+    files, y, hashes = [], [], {}
+    for cls, f in listing:
+        e = entries[os.path.abspath(f)]
+        if any(i.startswith(("corrupt", "undecodable")) for i in e["issues"]) or e.get("duplicate_of") \
+                or len(labels[e["hash"]]) > 1:
+            continue
+        files.append(f)
+        y.append(CLASSES.index(cls))
+        hashes[f] = e["hash"]
+    return files, y, hashes
+
+# -------------------------------------------------------------------
+# Report
+# -------------------------------------------------------------------
+def _hist(title, counts, width=30):
+    print(f"\n{title}")
+    top = max(counts.values()) if counts else 1
+    for k, n in counts.items():
+        print(f"  {str(k):>12s} {n:6d} {'█' * max(1, round(width * n / top))}")
+
+def report(entries, groups):
+    ok = [e for e in entries if "sr" in e]
+    _hist("Sample rate (Hz)", Counter(sorted(e["sr"] for e in ok)))
+    _hist("Channels", Counter(sorted(e["channels"] for e in ok)))
+    _hist("Subtype", Counter(sorted(e["subtype"] for e in ok)))
+    durs = np.asarray([e["duration"] for e in ok])
+    idx = np.digitize(durs, DUR_BINS[1:])
+    names = [f"{a}-{b}s" for a, b in zip(DUR_BINS, DUR_BINS[1:])] + [f">{DUR_BINS[-1]}s"]
+    _hist("Duration", {names[i]: int(np.count_nonzero(idx == i)) for i in range(len(names))
+                       if np.count_nonzero(idx == i)})
+    if len(durs):
+        print(f"  total {durs.sum() / 3600:.2f} h, median {np.median(durs):.2f}s, max {durs.max():.2f}s")
+
+    issues = defaultdict(list)
+    for e in entries:
+        for i in e["issues"]:
+            issues[i.split(":")[0]].append((e["path"], i))
+    print("\nProblems")
+    if not issues:
+        print("  none")
+    for kind, items in sorted(issues.items()):
+        print(f"  {kind}: {len(items)}")
+        for p, i in items[:10]:
+            print(f"    - {p}  {i if ':' in i else ''}")
+        if len(items) > 10:
+            print(f"    ... {len(items) - 10} more")
+
+    print(f"\nDuplicates: {len(groups)} group(s), {sum(len(es) - 1 for es in groups.values())} redundant file(s)")
+    for h, es in list(groups.items())[:10]:
+        cls = {e["class"] for e in es}
+        tag = "  ⚠️ label conflict" if len(cls) > 1 else ""
+        print(f"  {h[:12]}  " + ", ".join(e["path"] for e in es) + tag)
+
+def main():
+    ap = argparse.ArgumentParser(description="Audit voice_model/dataset and write the training manifest.")
+    ap.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) * 4))
+    ap.add_argument("--levels", action="store_true",
+                    help="Also decode the samples and flag truncated / silent / clipped files")
+    ap.add_argument("--deep", action="store_true",
+                    help="--levels, plus decode via the server path and run the VAD gate")
+    ap.add_argument("--sr", type=int, default=16000, help="Decode rate for --deep")
+    ap.add_argument("--rescan", action="store_true", help="Ignore the previous manifest")
+    ap.add_argument("--manifest", default=MANIFEST_PATH)
+    args = ap.parse_args()
+
+    listing = _listing()
+    if not listing:
+        sys.exit(f"No clips under {BASE}/{{{','.join(CLASSES)}}}")
+    levels = args.levels or args.deep
+    prev = {} if args.rescan else {e["path"]: e for e in (_read_manifest(args.manifest) or {}).get("files", [])}
+
+    t0 = time.perf_counter()
+    entries, jobs = [None] * len(listing), []
+    for i, (cls, f) in enumerate(listing):
+        st = os.stat(f)
+        e = prev.get(os.path.relpath(f, BASE_DIR))
+        if e and e["size"] == st.st_size and e["mtime_ns"] == st.st_mtime_ns and e["class"] == cls \
+                and (not levels or "peak_dbfs" in e or "sr" not in e) and (not args.deep or "vad" in e or "sr" not in e):
+            entries[i] = e
+        else:
+            jobs.append((i, (cls, f, levels)))
+    print(f"🎧 {len(listing)} files: {len(listing) - len(jobs)} unchanged, {len(jobs)} to read "
+          f"({args.workers} threads)")
+    # hashing and libsndfile release the GIL; threads keep the disk busy
+    with ThreadPoolExecutor(max_workers=args.workers) as ex:
+        for (i, _), e in zip(jobs, ex.map(audit_file, [j for _, j in jobs])):
+            entries[i] = e
+
+    if args.deep:
+        todo = [os.path.join(BASE_DIR, e["path"]) for e in entries if "sr" in e and "vad" not in e]
+        if todo:
+            print(f"🔬 deep check: decoding {len(todo)} file(s) at {args.sr} Hz")
+            pos = {os.path.join(BASE_DIR, e["path"]): e for e in entries}
+            with ProcessPoolExecutor() as ex:
+                for path, out in ex.map(deep_check, [(p, args.sr) for p in todo], chunksize=8):
+                    e = pos[path]
+                    e["issues"] = [i for i in e["issues"] if not i.startswith(("undecodable", "gated"))]
+                    e["issues"] += out.pop("issues")
+                    e.update(out)
+
+    groups = mark_duplicates(entries)
+    report(entries, groups)
+    _write_manifest({"version": MANIFEST_VERSION, "created_at": int(time.time()),
+                     "levels": levels, "deep": args.deep, "files": entries}, args.manifest)
+    print(f"\n📝 {os.path.relpath(args.manifest)} written in {time.perf_counter() - t0:.2f}s")
 
 if __name__ == "__main__":
-    print("🎧 Checking dataset quality...\n")
-    for cls in CLASSES:
-        files = sorted(glob(os.path.join(BASE, cls, "*.wav")))
-        print(f"[{cls.upper()}] Total: {len(files)} files")
-        for f in files:
-            name, sr, dur = analyze_audio(f)
-            print(f"  - {name:30s}  SR={sr}  Duration={dur}s")
+    main()
@@ -0,0 +1,65 @@
+# eval_vad.py: how the server's VAD pre-gate treats the labelled dataset
+#   python eval_vad.py                         # current VAD_* settings
+#   python eval_vad.py --snr-db 4,6,10 --min-dbfs -55,-50,-45
+# A distress clip that gets gated is a missed alert; the gate should only ever
+# drop normal / silent clips.
+import os, sys, time, argparse, itertools
+from glob import glob
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+from utils.audio import decode_audio
+from utils import vad
+
+BASE = os.path.join(os.path.dirname(__file__), "dataset")
+CLASSES = ["normal", "distress"]
+
+def floats(s):
+    return [float(x) for x in s.split(",") if x]
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Evaluate the VAD pre-gate on voice_model/dataset.")
+    p.add_argument("--sr", type=int, default=16000)
+    p.add_argument("--min-dbfs", type=floats, default=[vad.VAD_MIN_DBFS])
+    p.add_argument("--snr-db", type=floats, default=[vad.VAD_SNR_DB])
+    p.add_argument("--zcr-max", type=floats, default=[vad.VAD_ZCR_MAX])
+    p.add_argument("--min-active-s", type=floats, default=[vad.VAD_MIN_ACTIVE_S])
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    clips = {}
+    for cls in CLASSES:
+        for f in sorted(glob(os.path.join(BASE, cls, "*.wav"))):
+            try:
+                with open(f, "rb") as fh:
+                    clips[f] = (cls, decode_audio(fh.read(), ".wav", args.sr))
+            except Exception as e:
+                print(f"  ! {os.path.basename(f)}: {e}")
+    if not clips:
+        sys.exit(f"No clips under {BASE}/{{{','.join(CLASSES)}}}")
+    print(f"🎧 {len(clips)} clips: " + ", ".join(f"{c}={sum(1 for v in clips.values() if v[0] == c)}"
+                                               for c in CLASSES) + "\n")
+
+    print(f"{'min_dbfs':>8s} {'snr_db':>6s} {'zcr_max':>7s} {'min_act':>7s}  "
+          f"{'normal_gated':>12s} {'distress_gated':>14s} {'us/clip':>8s}  reasons")
+    for min_dbfs, snr, zcr, act in itertools.product(args.min_dbfs, args.snr_db, args.zcr_max, args.min_active_s):
+        gated, reasons, missed = Counter(), Counter(), []
+        t0 = time.perf_counter()
+        for f, (cls, y) in clips.items():
+            r = vad.detect(y, args.sr, min_dbfs=min_dbfs, snr_db=snr, zcr_max=zcr, min_active_s=act)
+            if not r.active:
+                gated[cls] += 1
+                reasons[r.reason] += 1
+                if cls == "distress":
+                    missed.append(os.path.basename(f))
+        us = (time.perf_counter() - t0) / len(clips) * 1e6
+        n = Counter(c for c, _ in clips.values())
+        pct = lambda c: f"{gated[c]}/{n[c]} ({100 * gated[c] / max(n[c], 1):.1f}%)"
+        print(f"{min_dbfs:8g} {snr:6g} {zcr:7g} {act:7g}  {pct('normal'):>12s} {pct('distress'):>14s} "
+              f"{us:8.0f}  {dict(reasons)}")
+        for m in missed[:5]:
+            print(f"      ⚠️ distress gated: {m}")
+
+if __name__ == "__main__":
+    main()
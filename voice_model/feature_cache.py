@@ -0,0 +1,92 @@
+# feature_cache.py: parallel, content-hash cached featurization for train_voice.py
+# Features come from backend/utils/features.featurize_bytes - the server's own path.
+import os, sys, json, hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, "..", "backend"))
+from utils.features import featurize_bytes
+
+CACHE_DIR = os.path.join(BASE_DIR, "artifacts", "feature_cache")
+# bump when featurize_bytes changes in a way that alters its output
+FEATURE_VERSION = 2
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _featurize_path(args):
+    path, sr, n_mfcc = args
+    with open(path, "rb") as fh:
+        buf = fh.read()
+    return featurize_bytes(buf, os.path.splitext(path)[1].lower(), sr, n_mfcc).astype(np.float32)
+
+def _vad_tag():
+    # featurize_bytes windows clips with the VAD (utils/features.model_window), so
+    # rows computed under other VAD_* settings must not be reused
+    from utils import vad
+    if not vad.VAD_ENABLED:
+        return "vadoff"
+    cfg = json.dumps({k: getattr(vad, k) for k in sorted(dir(vad)) if k.startswith("VAD_")})
+    return "vad" + hashlib.sha1(cfg.encode()).hexdigest()[:8]
+
+def _cache_paths(n_mfcc, sr, cache_dir):
+    tag = f"v{FEATURE_VERSION}_mfcc{n_mfcc}_sr{sr}_{_vad_tag()}"
+    return os.path.join(cache_dir, f"features_{tag}.npy"), os.path.join(cache_dir, f"index_{tag}.json")
+
+def load_features(paths, n_mfcc=20, sr=16000, workers=None, cache_dir=CACHE_DIR, hashes=None):
+    """
+    Feature matrix (len(paths), 4*n_mfcc) for `paths`, in order.
+    Rows are cached per (content hash, n_mfcc, sr, VAD config, FEATURE_VERSION) in a .npy that
+    later runs memory-map; only new or changed files are featurized, across a
+    process pool. `hashes` may supply precomputed content hashes (e.g. from the
+    dataset manifest) to skip re-hashing.
+    """
+    if not paths:
+        return np.zeros((0, 4 * n_mfcc), dtype=np.float32)
+    os.makedirs(cache_dir, exist_ok=True)
+    mat_path, idx_path = _cache_paths(n_mfcc, sr, cache_dir)
+    index, cached = {}, None
+    if os.path.exists(mat_path) and os.path.exists(idx_path):
+        with open(idx_path, encoding="utf-8") as fh:
+            index = json.load(fh)
+        cached = np.load(mat_path, mmap_mode="r")
+        if len(index) != len(cached):
+            print("⚠️ feature cache index mismatch; rebuilding")
+            index, cached = {}, None
+
+    keys = [hashes.get(p) if hashes else None for p in paths]
+    keys = [k or file_hash(p) for k, p in zip(keys, paths)]
+    todo = [(p, k) for p, k in zip(paths, keys) if k not in index]
+    todo = list({k: p for p, k in todo}.items())          # dedupe identical clips
+    print(f"🧮 features: {len(paths) - len(todo)} cached, {len(todo)} to compute "
+          f"(n_mfcc={n_mfcc}, sr={sr})")
+
+    if todo:
+        jobs = [(p, sr, n_mfcc) for _, p in todo]
+        if workers == 1 or len(jobs) == 1:
+            rows = [_featurize_path(j) for j in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                rows = list(ex.map(_featurize_path, jobs, chunksize=4))
+        n_old = 0 if cached is None else len(cached)
+        new = np.lib.format.open_memmap(mat_path + ".tmp", mode="w+", dtype=np.float32,
+                                        shape=(n_old + len(rows), 4 * n_mfcc))
+        if n_old:
+            new[:n_old] = cached
+        new[n_old:] = np.vstack(rows)
+        new.flush()
+        del new, cached
+        for i, (k, _) in enumerate(todo):
+            index[k] = n_old + i
+        os.replace(mat_path + ".tmp", mat_path)
+        with open(idx_path + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump(index, fh)
+        os.replace(idx_path + ".tmp", idx_path)
+        cached = np.load(mat_path, mmap_mode="r")
+
+    return np.asarray(cached[[index[k] for k in keys]], dtype=np.float32)
@@ -1,57 +1,118 @@
-import os, numpy as np
+import os, argparse, numpy as np
 from glob import glob
-import librosa, joblib
+import joblib
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import classification_report, confusion_matrix
+from feature_cache import load_features
+from check_dataset import manifest_files
+from utils.compiled_model import export_linear, export_keras, CompiledModel, parity
 
 BASE_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.join(BASE_DIR, "dataset")
 OUT_DIR  = os.path.join(BASE_DIR, "artifacts")
-os.makedirs(OUT_DIR, exist_ok=True)
 
 LABELS = {"normal":0, "distress":1}
 
-def featurize(path, sr_target=16000, n_mfcc=20):
-    y, sr = librosa.load(path, sr=sr_target, mono=True)
-    # pad/trim to 4 seconds for consistent features
-    target_len = sr * 4
-    if len(y) < target_len:
-        y = np.pad(y, (0, target_len - len(y)))
-    else:
-        y = y[:target_len]
-    # MFCCs + simple stats (mean/std/min/max)
-    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=n_mfcc)
-    feats = np.hstack([mfcc.mean(axis=1), mfcc.std(axis=1), mfcc.min(axis=1), mfcc.max(axis=1)])
-    return feats
-
-X, y = [], []
-for cls, lab in LABELS.items():
-    files = glob(os.path.join(DATA_DIR, cls, "*.wav"))
-    for f in files:
-        X.append(featurize(f))
-        y.append(lab)
-
-X = np.asarray(X, dtype=np.float32)
-y = np.asarray(y, dtype=np.int64)
-
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.25, random_state=42, stratify=y
-)
-
-model = Pipeline([
-    ("scaler", StandardScaler()),
-    ("clf", LogisticRegression(max_iter=300))
-])
-model.fit(X_train, y_train)
-
-y_pred  = model.predict(X_test)
-print("\nConfusion matrix:\n", confusion_matrix(y_test, y_pred))
-print("\nReport:\n", classification_report(y_test, y_pred, target_names=["normal","distress"]))
-
-# Save artifacts
-joblib.dump(model, os.path.join(OUT_DIR, "voice_clf.joblib"))
-np.save(os.path.join(OUT_DIR, "feat_cfg.npy"), np.array([20, 16000], dtype=np.int32))
-print("\n✅ Saved: voice_model/artifacts/voice_clf.joblib (and feat_cfg.npy)")
+def parse_args():
+    p = argparse.ArgumentParser(description="Train the CUSTOM voice distress classifier.")
+    p.add_argument("--n-mfcc", type=int, default=20)
+    p.add_argument("--sr", type=int, default=16000)
+    p.add_argument("--workers", type=int, default=None, help="Featurization processes (default: all cores)")
+    p.add_argument("--export-crema", action="store_true",
+                   help="Only export the CREMA-D .h5 + scaler to a NumPy artifact (needs TensorFlow once)")
+    p.add_argument("--int8", action="store_true", help="Quantize exported CREMA-D weights to int8")
+    p.add_argument("--check", action="store_true", help="Only re-run parity checks for existing exports")
+    return p.parse_args()
+
+def dataset_files():
+    """(files, labels, hashes); hashes come from check_dataset.py's manifest when it is current."""
+    m = manifest_files(DATA_DIR)
+    if m is not None:
+        print(f"📋 using dataset manifest ({len(m[0])} clean files)")
+        return m
+    files, y = [], []
+    for cls, lab in LABELS.items():
+        for f in sorted(glob(os.path.join(DATA_DIR, cls, "*.wav"))):
+            files.append(f)
+            y.append(lab)
+    return files, y, None
+
+def check_parity(name, reference, path, X, atol):
+    """Compiled artifact vs the original model on real feature rows."""
+    cm = CompiledModel(path)
+    diff = parity(reference, cm.predict_proba, X)
+    ok = diff <= atol
+    print(f"{'✅' if ok else '❌'} parity {name}: max |Δp| = {diff:.2e} over {len(X)} rows (tolerance {atol:g})")
+    if not ok:
+        raise SystemExit(1)
+
+def parity_rows(args, n_features):
+    files, _, hashes = dataset_files()
+    if files:
+        return load_features(files, n_mfcc=args.n_mfcc, sr=args.sr, workers=args.workers, hashes=hashes)
+    # no dataset on this machine: wide random rows still exercise every weight
+    print("⚠️ no dataset found; checking parity on random feature rows")
+    return np.random.default_rng(0).normal(0, 50, (512, n_features)).astype(np.float32)
+
+def export_crema(args):
+    import tensorflow as tf
+    h5 = os.path.join(OUT_DIR, "voice_clf_final_v3.h5")
+    scaler = joblib.load(os.path.join(OUT_DIR, "scaler_final_v3.joblib"))
+    net = tf.keras.models.load_model(h5)
+    out = os.path.join(OUT_DIR, "voice_clf_final_v3.npz")
+    export_keras(net, out, scaler=scaler, quantize=args.int8,
+                 meta={"flag": "CREMA-D", "n_mfcc": args.n_mfcc, "sr": args.sr, "source": os.path.basename(h5)})
+    X = parity_rows(args, scaler.mean_.shape[0])
+    check_parity("CREMA-D", lambda X: net.predict(scaler.transform(X), verbose=0)[:, 0], out, X,
+                 atol=2e-2 if args.int8 else 1e-4)
+    print(f"✅ Saved: {out}")
+
+def main():
+    args = parse_args()
+    os.makedirs(OUT_DIR, exist_ok=True)
+
+    if args.export_crema:
+        return export_crema(args)
+    if args.check:
+        model = joblib.load(os.path.join(OUT_DIR, "voice_clf.joblib"))
+        X = parity_rows(args, model.n_features_in_)
+        return check_parity("CUSTOM", lambda X: model.predict_proba(X)[:, 1],
+                            os.path.join(OUT_DIR, "voice_clf.npz"), X, atol=1e-5)
+
+    files, y, hashes = dataset_files()
+
+    # MFCC stats via the server's featurize_bytes; cached per file content + (n_mfcc, sr)
+    X = load_features(files, n_mfcc=args.n_mfcc, sr=args.sr, workers=args.workers, hashes=hashes)
+    y = np.asarray(y, dtype=np.int64)
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.25, random_state=42, stratify=y
+    )
+
+    model = Pipeline([
+        ("scaler", StandardScaler()),
+        ("clf", LogisticRegression(max_iter=300))
+    ])
+    model.fit(X_train, y_train)
+
+    y_pred  = model.predict(X_test)
+    print("\nConfusion matrix:\n", confusion_matrix(y_test, y_pred))
+    print("\nReport:\n", classification_report(y_test, y_pred, target_names=["normal","distress"]))
+
+    # Save artifacts
+    joblib.dump(model, os.path.join(OUT_DIR, "voice_clf.joblib"))
+    np.save(os.path.join(OUT_DIR, "feat_cfg.npy"), np.array([args.n_mfcc, args.sr], dtype=np.int32))
+    print("\n✅ Saved: voice_model/artifacts/voice_clf.joblib (and feat_cfg.npy)")
+
+    # flat NumPy export the server prefers (no sklearn/joblib at inference time);
+    # written after the joblib so the registry sees it as fresh
+    npz = export_linear(model, os.path.join(OUT_DIR, "voice_clf.npz"),
+                        meta={"flag": "CUSTOM", "n_mfcc": args.n_mfcc, "sr": args.sr, "source": "voice_clf.joblib"})
+    check_parity("CUSTOM", lambda X: model.predict_proba(X)[:, 1], npz, X, atol=1e-5)
+    print("✅ Saved: voice_model/artifacts/voice_clf.npz")
+
+if __name__ == "__main__":
+    main()